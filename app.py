@@ -1,17 +1,28 @@
 import streamlit as st
-from PIL import Image
 from modules.menu import menu
-from modules.modules import run_assistant, convert_image_to_text, extract_score_from_feedback
+from modules.modules import transcribe_files
+from modules.llm_backends import get_backend
+from modules.grading import EssayGrading, load_previous_grading
+from modules.profile_cache import update_user_doc
+from modules.text_analysis import analyze_text, display_analysis
 from modules.vocabvan import vocabvan_interface
-from firebase_setup import db
-from extra_pages.organization_dashboard import show_org_dashboard, full_org_dashboard
+from modules.resources import get_db
+from modules.profiler import profile_rerun, profiled, span
+from modules.run_supervisor import RunError
+from modules.routing import get_router, get_plan, choose_grading_route, choose_transcription_route
+from modules.session_memory import track_session
+from modules.score_sketch import record_score
+from modules.essay_search import index_submission
 from extra_pages.auth_page import show_auth_page  # Import auth functions
 from datetime import datetime
+from itertools import takewhile
+import logging
 import uuid 
 
+logger = logging.getLogger(__name__)
 
-# Define the assistant ID for the main part of the app
-HINOTAMA_ID = st.secrets.hinotama_id
+# Puts back anything spilled while the session was idle, before it is read
+track_session()
 
 # Session state initialization for user and organization
 if 'user' not in st.session_state:
@@ -20,34 +31,57 @@ if 'organization' not in st.session_state:
     st.session_state.organization = None
 if 'txt' not in st.session_state:
     st.session_state.txt = ""
-if 'transcription_done' not in st.session_state:
-    st.session_state.transcription_done = False
+if 'transcribed_files' not in st.session_state:
+    st.session_state.transcribed_files = ()
 if 'feedback' not in st.session_state:
     st.session_state.feedback = None
+if 'transcription_route' not in st.session_state:
+    st.session_state.transcription_route = None
 
-# Helper function to collect user input
+# Helper function to collect user input. It is a fragment, so typing in the
+# text area or uploading files only reruns this panel, not the whole page.
+@st.fragment
 def get_input():
+    track_session()
     st.subheader("作文（さくぶん）")
-    st.session_state.txt = st.text_area("こちらに文章を入力してください", height=220, value=st.session_state.txt)
-    st.info(f'現在の文字数: {len(st.session_state.txt)} 文字')
+    # Filled in below, after any upload has been transcribed into the text
+    text_panel = st.container()
 
-    uploaded_file = st.file_uploader(
-        "ファイルをアップロードしてください",
+    uploaded_files = st.file_uploader(
+        "ファイルをアップロードしてください（複数ページの場合はページ順に選択）",
         type=["pdf", "jpg", "jpeg", "png"],
+        accept_multiple_files=True,
         help="手書きの文章やPDFファイルを評価するためにご利用ください"
     )
-    
-    if uploaded_file is not None and not st.session_state.transcription_done:
-        # Transcribe the uploaded file
+    file_ids = tuple(f.file_id for f in uploaded_files)
+
+    if uploaded_files and file_ids != st.session_state.transcribed_files:
+        # Transcribe all pages at once, showing them in order as they finish
+        pages = [None] * len(uploaded_files)
+        preview = st.empty()
         with st.spinner("読み込み中..."):
             try:
-                result = convert_image_to_text(uploaded_file)
-                st.session_state.txt = result  # Update session state
-                st.session_state.transcription_done = True
-                st.success("読み込みが完了しました!")
-                st.rerun()
+                route = choose_transcription_route(uploaded_files, get_plan(st.session_state.user))
+                with span("openai: transcription"), get_router().track(route):
+                    for done, (index, text) in enumerate(transcribe_files(uploaded_files, route['model']), start=1):
+                        pages[index] = text
+                        ready = takewhile(lambda page: page is not None, pages)
+                        preview.text_area(f"読み込み結果 ({done}/{len(pages)} ページ)", "\n\n".join(ready), height=220, disabled=True)
+
+                st.session_state.txt = "\n\n".join(pages)  # Update session state
+                st.session_state.transcribed_files = file_ids
+                st.session_state.transcription_route = route
+                preview.success("読み込みが完了しました!")
             except Exception as e:
-                st.error(f"エラーが発生しました: {str(e)}")
+                preview.error(f"エラーが発生しました: {str(e)}")
+
+    with text_panel:
+        # Keyed on session state, so the text is current even when only another panel reruns
+        st.text_area("こちらに文章を入力してください", height=220, key="txt")
+        st.info(f'現在の文字数: {len(st.session_state.txt)} 文字')
+        if st.session_state.txt.strip():
+            with span("render: text analysis"):
+                display_analysis(analyze_text(st.session_state.txt))  # Local stats, no API call
 
 # Display AI feedback
 def display_feedback():
@@ -63,17 +97,15 @@ def display_feedback():
         """, unsafe_allow_html=True)
 
 # Save the submission to Firestore
-def save_submission():
+@profiled("firestore: save_submission")
+def save_submission(grading_record, route, score):
     try:
         # Reference to the submissions collection
-        submissions_ref = db.collection('submissions')
+        submissions_ref = get_db().collection('submissions')
 
         # Generate a unique submission ID
         submission_id = str(uuid.uuid4())
 
-        # Extract score from feedback (placeholder for now)
-        score = extract_score_from_feedback(st.session_state.feedback)
-
         # Add a new submission to the collection
         submissions_ref.document(submission_id).set({
             'submission_id': submission_id,            # Unique ID for the submission
@@ -81,14 +113,106 @@ def save_submission():
             'submission_text': st.session_state.txt,   # Text of the submission
             'submitAt': datetime.now(),                # Timestamp of submission
             'feedback_text': st.session_state.feedback,  # AI feedback text
-            'score': score                             # Extracted score (currently None)
+            'score': score,                            # Score from this grading's score pass
+            'analysis': analyze_text(st.session_state.txt),  # Local text statistics
+            'route': route,                            # Which backend/model graded it, and why
+            'transcription_route': st.session_state.transcription_route if st.session_state.transcribed_files else None,
+            **grading_record                           # Per-paragraph feedback for re-grading
         })
 
+        # Add the score to the organization's weekly distribution; the
+        # submission is already saved, so a failure here is only logged
+        if score is not None:
+            try:
+                record_score(st.session_state.user.get('org_code'), score)
+            except Exception:
+                logger.exception("Could not record score for %s", submission_id)
+
+        # Make the essay searchable from the organization's dashboard
+        org_code = st.session_state.user.get('org_code')
+        if org_code:
+            try:
+                index_submission(org_code, submission_id, st.session_state.user['id'], st.session_state.txt)
+            except Exception:
+                logger.exception("Could not index %s", submission_id)
+
+        # Remember this submission so the next one only regrades what changed
+        user_id = st.session_state.user['id']
+        update_user_doc(user_id, {'last_submission_id': submission_id})
+        st.session_state.last_grading = {
+            'user_id': user_id,
+            'feedback': st.session_state.feedback,
+            **grading_record
+        }
+
         return True, submission_id  # Return the generated submission ID for later use
 
     except Exception as e:
         return False, f"Error saving submission: {e}"
 
+@st.fragment
+def vocabvan_panel():
+    track_session()
+    with st.popover("🧠 AIに質問"):
+        vocabvan_interface()
+
+# Submit button, grading and feedback. Clicking submit only reruns this panel;
+# the essay text comes from session state, which get_input keeps up to date.
+@st.fragment
+def feedback_panel(user):
+    track_session()
+    # 提出ボタン
+    submit_button = st.button("採点する🚀", type="primary")
+
+    # Handle the evaluation and feedback display
+    if submit_button:
+        if user.get('status') == 'Active':
+            # Reset feedback state
+            st.session_state.feedback = None
+
+            with st.expander("入力内容", expanded=False):
+                st.write("**提出した作文**:")
+
+                # Use markdown to display the text in a styled box
+                box_content = st.session_state.txt.replace('\n', '<br>')
+                st.markdown(f"""
+                    <div style="border: 1px solid #ccc; padding: 10px; border-radius: 5px; background-color: #f9f9f9;">
+                        {box_content}
+                    </div>
+                """, unsafe_allow_html=True)
+
+                st.write(f'文字数: {len(st.session_state.txt)} 文字')
+
+            # Pick the grading backend for this essay, then grade it,
+            # regrading only paragraphs changed since the last submission
+            hint = 'handwritten' if st.session_state.transcribed_files else 'typed'
+            route = choose_grading_route(st.session_state.txt, hint, get_plan(user))
+            grading = EssayGrading(
+                get_backend(route['backend']),
+                st.session_state.txt,
+                previous=load_previous_grading(user['id'])
+            )
+            streaming = st.empty()
+            try:
+                with streaming, st.spinner('One moment...'), span("openai: grading"), get_router().track(route):
+                    st.write_stream(grading.stream())
+            except RunError as e:
+                streaming.empty()
+                st.error(f"採点に失敗しました。もう一度お試しください。({e})")
+                return
+            streaming.empty()
+            st.session_state.feedback = grading.feedback
+
+            # Save submission
+            # The score comes from this grading, never from a section reused from an earlier one
+            save_submission(grading.record(), route, grading.score)
+
+        else:
+            st.error("Your account is inactive. You cannot submit evaluations.")
+
+    # Display AI feedback
+    display_feedback()
+
 # Main app function to display content
 def main():
     if st.session_state.user is None and st.session_state.organization is None:
@@ -97,6 +221,9 @@ def main():
     else:
         # Check if an organization is logged in
         if st.session_state.organization:
+            # Imported here so the login page never loads pandas
+            from extra_pages.organization_dashboard import show_org_dashboard, full_org_dashboard
+
             org = st.session_state.organization
             if org.get('full_dashboard', False):
                 full_org_dashboard(org)  # Show full organization dashboard
@@ -122,52 +249,15 @@ def main():
                 2. 「採点する」ボタンをクリックして、AIによる評価を受けてください。
                 """)
 
-            # Chatbot Button and Popover
-            with st.popover("🧠 AIに質問"):
-                vocabvan_interface()
+            # Chatbot Button and Popover (a fragment: chatting doesn't rerun the page)
+            vocabvan_panel()
 
             # Get user input
             get_input()
-            information = f"Writing: {st.session_state.txt}"
             
-            # 提出ボタン
-            submit_button = st.button("採点する🚀", type="primary")
-
-            # Handle the evaluation and feedback display
-            if submit_button:
-                if user.get('status') == 'Active':
-                    # Reset transcription_done and feedback states
-                    st.session_state.transcription_done = False  
-                    st.session_state.feedback = None
-
-                    with st.expander("入力内容", expanded=False):
-                        st.write("**提出した作文**:")
-                        
-                        # Use markdown to display the text in a styled box
-                        box_content = st.session_state.txt.replace('\n', '<br>')
-                        st.markdown(f"""
-                            <div style="border: 1px solid #ccc; padding: 10px; border-radius: 5px; background-color: #f9f9f9;">
-                                {box_content}
-                            </div>
-                        """, unsafe_allow_html=True)
-                        
-                        st.write(f'文字数: {len(st.session_state.txt)} 文字')
-
-                    # Run the AI assistant and get feedback
-                    st.session_state.feedback = run_assistant(
-                        assistant_id=HINOTAMA_ID,  # Use Hinotama assistant ID for evaluation
-                        txt=information,
-                        return_content=True,
-                        display_chat=False
-                    )
-                    # Save submission
-                    save_submission()
-
-                else:
-                    st.error("Your account is inactive. You cannot submit evaluations.")
-
-            # Display AI feedback
-            display_feedback()
+            # Submit button, grading and feedback rerun on their own
+            feedback_panel(user)
+
 
 if __name__ == "__main__":
     # Page configuration for the main app
@@ -177,4 +267,5 @@ if __name__ == "__main__":
     #     page_icon=fc,
     #     layout="wide"
     # )
-    main()
+    with profile_rerun("app.main"):
+        main()
@@ -1,7 +1,8 @@
 import streamlit as st
-from firebase_admin import firestore
-import bcrypt
-from firebase_setup import db
+from modules.resources import get_db
+from modules.profile_cache import get_user_doc, set_user_doc, update_user_doc, get_org_doc
+from modules.passwords import hash_password, verify_password, needs_rehash, get_login_throttle
+from modules.profiler import profiled
 from datetime import datetime
 import pytz
 import uuid
@@ -13,24 +14,22 @@ ACTIVE_PERIOD_DAYS = 30
 def register_user(user_id, email, password, reason_for_studying, org_code, user_timezone):
     try:
         # Check if user ID already exists
-        user_ref = db.collection('users').document(user_id).get()
-        if user_ref.exists:
+        if get_user_doc(user_id) is not None:
             return None, "User with this ID already exists"
 
         # Hash the password using bcrypt
-        hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        hashed_password = hash_password(password)
 
         # Validate if org_code exists
         if org_code:
-            org_ref = db.collection('organizations').document(org_code).get()
-            if not org_ref.exists:
+            if get_org_doc(org_code) is None:
                 return None, "Invalid organization code provided."
 
         # Use UTC timezone-aware datetime for registration timestamp
         register_at = datetime.now(pytz.utc)
 
         # Create a new user document in Firestore
-        db.collection('users').document(user_id).set({
+        set_user_doc(user_id, {
             'email': email,
             'password': hashed_password,
             'reason_for_studying': reason_for_studying,
@@ -58,17 +57,28 @@ def register_user(user_id, email, password, reason_for_studying, org_code, user_
     except Exception as e:
         return None, f"Registration failed: {str(e)}"
 
+@profiled("auth: login_user")
 def login_user(user_id, password):
     try:
-        # Fetch user data from Firestore
-        user_ref = db.collection('users').document(user_id).get()
-        if not user_ref.exists:
+        # Limit password checks per ID so one account can't tie up the hashing pool
+        throttle = get_login_throttle()
+        allowed, retry_after = throttle.allow(user_id)
+        if not allowed:
+            return None, f"Too many login attempts. Please try again in {retry_after} seconds."
+
+        # Fetch user data (cached read-through from Firestore)
+        user_data = get_user_doc(user_id)
+        if user_data is None:
             return None, "Invalid ID or password"
-
-        user_data = user_ref.to_dict()
         
         # Check if the provided password matches the stored hashed password
-        if bcrypt.checkpw(password.encode(), user_data['password'].encode()):
+        if verify_password(password, user_data['password']):
+            throttle.reset(user_id)
+
+            # Upgrade the stored hash if the configured work factor has changed
+            if needs_rehash(user_data['password']):
+                update_user_doc(user_id, {'password': hash_password(password)})
+
             register_at = user_data.get('registerAt')
 
             # Handle missing registerAt field
@@ -83,7 +93,7 @@ def login_user(user_id, password):
 
             # Update Firestore if the user status has changed
             if status != user_data['status']:
-                db.collection('users').document(user_id).update({'status': status})
+                update_user_doc(user_id, {'status': status})
 
             # Log the login event
             log_login_event(user_id)
@@ -120,11 +130,10 @@ def logout_user():
 
 def login_organization(org_code, password):
     try:
-        org_ref = db.collection('organizations').document(org_code).get()
-        if not org_ref.exists:
+        org_data = get_org_doc(org_code)
+        if org_data is None:
             return None, "Invalid organization code or password"
 
-        org_data = org_ref.to_dict()
         # Direct comparison as password is stored in plain text (since orgs are added manually)
         if org_data['password'] == password:
             return {
@@ -206,7 +215,7 @@ def log_login_event(user_id):
         browser = st.session_state.get("browser", "Unknown - JS detection failed")
 
         login_event_id = str(uuid.uuid4())
-        db.collection('login_events').document(login_event_id).set({
+        get_db().collection('login_events').document(login_event_id).set({
             'user_id': user_id,
             'timestamp': datetime.now(pytz.utc),
             'device_type': device_type,
@@ -218,7 +227,7 @@ def log_login_event(user_id):
 # Function to log issues with missing registration dates
 def log_missing_register_at(user_id):
     try:
-        db.collection('user_issues').add({
+        get_db().collection('user_issues').add({
             'user_id': user_id,
             'issue': 'Missing registerAt',
             'timestamp': datetime.now(pytz.utc)
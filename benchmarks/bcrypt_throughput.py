@@ -0,0 +1,66 @@
+"""
+Login throughput benchmark for password verification.
+
+Simulates a classroom login burst: `--logins` password checks submitted at
+once, first inline on one thread (the old behaviour) and then through a
+process pool like modules.passwords uses. Reports logins/sec overall and per
+core for each bcrypt work factor.
+
+Usage:
+    python benchmarks/bcrypt_throughput.py [--rounds 10 12] [--workers 4] [--logins 40]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.passwords import _checkpw, _hashpw  # noqa: E402
+
+PASSWORD = b"correct horse battery staple"
+
+
+def run_inline(hashed, logins):
+    start = time.perf_counter()
+    for _ in range(logins):
+        _checkpw(PASSWORD, hashed)
+    return time.perf_counter() - start
+
+
+def run_pool(pool, hashed, logins):
+    start = time.perf_counter()
+    futures = [pool.submit(_checkpw, PASSWORD, hashed) for _ in range(logins)]
+    for future in futures:
+        future.result()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 12])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--logins", type=int, default=40)
+    args = parser.parse_args()
+
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    # Warm the pool so worker start-up isn't counted
+    list(pool.map(_hashpw, [PASSWORD] * args.workers, [4] * args.workers))
+
+    print(f"{'rounds':>6} {'mode':>10} {'cores':>5} {'logins/s':>10} {'per core':>10}")
+    for rounds in args.rounds:
+        hashed = _hashpw(PASSWORD, rounds).encode()
+        for mode, cores, elapsed in (
+            ("inline", 1, run_inline(hashed, args.logins)),
+            ("pool", args.workers, run_pool(pool, hashed, args.logins)),
+        ):
+            rate = args.logins / elapsed
+            print(f"{rounds:>6} {mode:>10} {cores:>5} {rate:>10.1f} {rate / cores:>10.1f}")
+
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
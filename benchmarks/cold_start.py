@@ -0,0 +1,115 @@
+"""
+Cold-start benchmark for the login page.
+
+Measures, in fresh interpreters:
+  1. the import cost of each heavy dependency on its own, and
+  2. time-to-first-paint of app.py for an unauthenticated visitor, rendered
+     with Streamlit's AppTest. The "eager" variant pre-imports the libraries
+     the login page used to load at import time (pandas via the org dashboard,
+     firebase_admin/Firestore, OpenAI, PIL), which reproduces the old cold start.
+
+Usage:
+    python benchmarks/cold_start.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = [
+    "pandas",
+    "plotly.express",
+    "firebase_admin",
+    "google.cloud.firestore",
+    "openai",
+    "PIL.Image",
+]
+
+# Libraries the login page pulled in before the resource layer was lazy
+EAGER_MODULES = ["pandas", "firebase_admin", "google.cloud.firestore", "openai", "PIL.Image"]
+
+IMPORT_SNIPPET = """
+import importlib, json, time
+t0 = time.perf_counter()
+importlib.import_module({module!r})
+print(json.dumps({{"seconds": time.perf_counter() - t0}}))
+"""
+
+LOGIN_PAGE_SNIPPET = """
+import importlib, json, sys, time
+t0 = time.perf_counter()
+for module in {preload!r}:
+    importlib.import_module(module)
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=60)
+at.secrets["hinotama_id"] = "asst_benchmark"
+at.secrets["vocabvan_JP"] = "asst_benchmark"
+at.secrets["api_key"] = "sk-benchmark"
+at.run()
+elapsed = time.perf_counter() - t0
+loaded = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "loaded": loaded, "errors": [str(e.value) for e in at.exception]}}))
+"""
+
+
+def run_snippet(snippet):
+    result = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_imports(runs):
+    rows = []
+    for module in HEAVY_MODULES:
+        try:
+            samples = [run_snippet(IMPORT_SNIPPET.format(module=module))["seconds"] for _ in range(runs)]
+        except subprocess.CalledProcessError:
+            rows.append((module, None))
+            continue
+        rows.append((module, statistics.median(samples)))
+    return rows
+
+
+def measure_login_page(runs, preload):
+    samples = []
+    loaded = []
+    for _ in range(runs):
+        result = run_snippet(LOGIN_PAGE_SNIPPET.format(preload=preload, heavy=HEAVY_MODULES))
+        if result["errors"]:
+            raise RuntimeError(f"Login page raised: {result['errors']}")
+        samples.append(result["seconds"])
+        loaded = result["loaded"]
+    return statistics.median(samples), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    args = parser.parse_args()
+
+    print("Import time per module (median, fresh interpreter)")
+    for module, seconds in measure_imports(args.runs):
+        value = "not installed" if seconds is None else f"{seconds * 1000:8.1f} ms"
+        print(f"  {module:<24} {value}")
+
+    lazy_seconds, lazy_loaded = measure_login_page(args.runs, preload=[])
+    eager_seconds, _ = measure_login_page(args.runs, preload=EAGER_MODULES)
+
+    print("\nLogin page time-to-first-paint (median, includes interpreter start of Streamlit)")
+    print(f"  before (eager imports)   {eager_seconds * 1000:8.1f} ms")
+    print(f"  after  (lazy resources)  {lazy_seconds * 1000:8.1f} ms")
+    print(f"  speedup                  {eager_seconds / lazy_seconds:8.2f}x")
+    print(f"  heavy modules loaded by the login page now: {', '.join(lazy_loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Storage and read volume of submissions with and without cold storage.
+
+Seeds a synthetic dataset of Japanese essays with feedback, spread evenly
+over `--years`, then archives everything older than `--days` the way
+modules.archive does: the hot document keeps metadata and score, and the
+body becomes a zstd blob, with and without a dictionary trained on the
+still-hot submissions. Sizes are JSON-encoded bytes, a close stand-in for
+Firestore's document size.
+
+Reported:
+  storage     - hot documents + blobs (+ dictionary)
+  scan read   - bytes downloaded by a dashboard pass over every submission
+                for counts and scores
+  open read   - bytes downloaded to open one archived submission
+
+Usage:
+    python benchmarks/cold_storage.py [--submissions 5000] [--days 180] [--years 3]
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.archive import (  # noqa: E402
+    ARCHIVED_FIELDS, DICTIONARY_SAMPLES, compress_body, decompress_body, encode_body, train_dictionary
+)
+
+SENTENCES = [
+    "私の夢は日本で働くことです。", "大学で日本語を勉強しています。", "去年の夏休みに東京へ行きました。",
+    "電車がとても便利で、町がきれいでした。", "日本人の友達と一緒にラーメンを食べました。",
+    "週末はよく図書館で本を読みます。", "将来は通訳になりたいと思っています。", "日本の文化にとても興味があります。",
+    "毎朝七時に起きて、朝ご飯を食べます。", "アルバイトで日本語を使う機会が増えました。",
+    "環境問題について考えることは大切だと思います。", "初めて着物を着たとき、とても感動しました。",
+]
+FEEDBACK = [
+    "文法はおおむね正確です。", "助詞の使い方に注意しましょう。", "語彙の選び方が自然です。",
+    "文末表現が統一されていて読みやすいです。", "段落の構成をもう少し工夫すると、主張が伝わりやすくなります。",
+    "具体例を加えると説得力が増します。", "漢字の誤りがいくつかあります。",
+]
+
+
+def make_submission(i, submit_at, rng):
+    paragraphs = ["".join(rng.choices(SENTENCES, k=rng.randint(3, 7))) for _ in range(rng.randint(2, 5))]
+    unit_feedback = [" ".join(rng.choices(FEEDBACK, k=3)) for _ in paragraphs]
+    score = rng.randint(40, 95)
+    return {
+        'submission_id': f"sub-{i:06d}",
+        'user_id': f"user-{rng.randint(0, 300):03d}",
+        'submitAt': submit_at.isoformat(),
+        'score': score,
+        'essay_hash': f"{rng.getrandbits(256):064x}",
+        'submission_text': "\n".join(paragraphs),
+        'feedback_text': "".join(f"【第{n + 1}段落】\n\n{f}\n\n" for n, f in enumerate(unit_feedback)) + f"スコア: {score}",
+        'paragraphs': [{'hash': f"{rng.getrandbits(256):064x}", 'feedback': f} for f in unit_feedback],
+    }
+
+
+def doc_bytes(doc):
+    return len(encode_body(doc))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    span = timedelta(days=365 * args.years)
+    submissions = [make_submission(i, now - span * rng.random(), rng) for i in range(args.submissions)]
+    cutoff = (now - timedelta(days=args.days)).isoformat()
+    cold = [s for s in submissions if s['submitAt'] < cutoff]
+    hot = [s for s in submissions if s['submitAt'] >= cutoff]
+
+    bodies = [{field: s[field] for field in ARCHIVED_FIELDS} for s in cold]
+    metadata = [{k: v for k, v in s.items() if k not in ARCHIVED_FIELDS} | {'archived': True} for s in cold]
+    dictionary = train_dictionary([{field: s[field] for field in ARCHIVED_FIELDS}
+                                   for s in hot[:DICTIONARY_SAMPLES]] or bodies[:DICTIONARY_SAMPLES])
+
+    plain_blobs = [compress_body(body) for body in bodies]
+    dict_blobs = [compress_body(body, dictionary) for body in bodies]
+    assert decompress_body(dict_blobs[0], dictionary) == bodies[0]
+
+    before = sum(doc_bytes(s) for s in submissions)
+    hot_after = sum(doc_bytes(s) for s in hot) + sum(doc_bytes(m) for m in metadata)
+    raw_bodies = sum(doc_bytes(b) for b in bodies)
+    plain_total = hot_after + sum(map(len, plain_blobs))
+    dict_total = hot_after + sum(map(len, dict_blobs)) + len(dictionary)
+
+    mb = 2 ** 20
+    print(f"{len(submissions)} submissions, {len(cold)} older than {args.days} days archived")
+    print(f"archived bodies: {raw_bodies / mb:.2f} MB -> zstd {sum(map(len, plain_blobs)) / mb:.2f} MB "
+          f"({raw_bodies / sum(map(len, plain_blobs)):.1f}x), with dictionary {sum(map(len, dict_blobs)) / mb:.2f} MB "
+          f"({raw_bodies / sum(map(len, dict_blobs)):.1f}x)")
+    print()
+    print(f"{'':<24} {'storage MB':>11} {'scan read MB':>13} {'open read KB':>13}")
+    print(f"{'inline (before)':<24} {before / mb:>11.2f} {before / mb:>13.2f} "
+          f"{sum(doc_bytes(s) for s in cold) / len(cold) / 1024:>13.2f}")
+    print(f"{'archived, zstd':<24} {plain_total / mb:>11.2f} {hot_after / mb:>13.2f} "
+          f"{(sum(doc_bytes(m) for m in metadata) + sum(map(len, plain_blobs))) / len(cold) / 1024:>13.2f}")
+    print(f"{'archived, zstd + dict':<24} {dict_total / mb:>11.2f} {hot_after / mb:>13.2f} "
+          f"{(sum(doc_bytes(m) for m in metadata) + sum(map(len, dict_blobs))) / len(cold) / 1024:>13.2f}")
+    print(f"\nstorage -{1 - dict_total / before:.0%}, dashboard scan read -{1 - hot_after / before:.0%}")
+
+
+if __name__ == "__main__":
+    main()
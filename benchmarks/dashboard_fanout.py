@@ -0,0 +1,72 @@
+"""
+Org dashboard load time, per-user Firestore queries serial vs fanned out.
+
+get_user_data and fetch_submission_data read one submissions subcollection
+per student. This times `--users` such reads against a stand-in for
+Firestore where each query takes `--latency` seconds plus a long-tailed
+jitter, run one after another (the old code) and through
+firestore_fanout.fan_out at several concurrency limits. The slowest single
+query is the floor that a fully concurrent load can approach.
+`--fail` makes that share of queries raise, to check they are reported per
+query while the rest still load.
+
+Usage:
+    python benchmarks/dashboard_fanout.py [--users 60] [--latency 0.05] [--fail 0.02]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.firestore_fanout import fan_out  # noqa: E402
+
+
+def make_query(user_id, latency, fail):
+    def query():
+        time.sleep(latency)
+        if fail:
+            raise RuntimeError(f"deadline exceeded reading users/{user_id}/submissions")
+        return [{'user_id': user_id, 'score': 80}]
+    return query
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05, help="median seconds per query")
+    parser.add_argument("--fail", type=float, default=0.02, help="share of queries that fail")
+    parser.add_argument("--concurrency", default="4,16,64")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    latencies = {f"user{i:04d}": args.latency * rng.lognormvariate(0, 0.5) for i in range(args.users)}
+    failing = {user_id for user_id in latencies if rng.random() < args.fail}
+    queries = {user_id: make_query(user_id, latency, user_id in failing) for user_id, latency in latencies.items()}
+
+    start = time.perf_counter()
+    serial_errors = 0
+    for query in queries.values():
+        try:
+            query()
+        except RuntimeError:
+            serial_errors += 1
+    serial = time.perf_counter() - start
+
+    print(f"{args.users} users, slowest query {max(latencies.values()) * 1000:.0f} ms, "
+          f"{len(failing)} failing")
+    print(f"{'':<16} {'seconds':>8} {'loaded':>7} {'errors':>7}")
+    print(f"{'serial':<16} {serial:>8.2f} {args.users - serial_errors:>7} {serial_errors:>7}")
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        start = time.perf_counter()
+        results, errors = fan_out(queries, concurrency, threading.BoundedSemaphore(concurrency))
+        seconds = time.perf_counter() - start
+        assert set(errors) == failing
+        print(f"{f'fan-out x{concurrency}':<16} {seconds:>8.2f} {len(results):>7} {len(errors):>7}")
+
+
+if __name__ == "__main__":
+    main()
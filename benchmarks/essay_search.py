@@ -0,0 +1,93 @@
+"""
+Bigram index search latency and size over an organization's essays.
+
+Generates `--essays` synthetic Japanese essays (common sentences mixed with
+words drawn from a few thousand kanji, so the bigram vocabulary is
+realistic), seals them into segments of SEGMENT_DOCS as the app does,
+round-trips every segment through its stored blob, and times in-memory
+queries (OrgIndex.search, i.e. everything after the index is loaded)
+for common, rare, multi-term and one-character queries: all matches, and
+the newest MAX_CANDIDATES that the dashboard asks for.
+
+Usage:
+    python benchmarks/essay_search.py [--essays 100000] [--runs 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.essay_search import MAX_CANDIDATES, SEGMENT_DOCS, OrgIndex, Segment  # noqa: E402
+
+SENTENCES = [
+    "私の夢は日本で働くことです。", "大学で日本語を勉強しています。", "去年の夏休みに東京へ行きました。",
+    "電車がとても便利で、町がきれいでした。", "週末はよく図書館で本を読みます。", "将来は通訳になりたいと思っています。",
+    "雨が降っていたにもかかわらず、試合は続けられた。", "日本に来てから、もう三年が経ちました。",
+]
+PARTICLES = "はがをにでとものへやか"
+QUERIES = ["夏休み", "にもかかわらず", "日本語 勉強", "猫", "存在しない表現"]
+
+
+def make_essay(rng, kanji):
+    parts = []
+    for _ in range(rng.randint(8, 20)):
+        if rng.random() < 0.5:
+            parts.append(rng.choice(SENTENCES))
+        else:
+            words = ["".join(rng.choices(kanji, k=rng.randint(1, 3))) + rng.choice(PARTICLES) for _ in range(4)]
+            parts.append("".join(words) + "ます。")
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--essays", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    kanji = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+    tracemalloc.start()
+    index = OrgIndex("BENCH")
+    start = time.perf_counter()
+    stored = text_bytes = largest = 0
+    for first in range(0, args.essays, SEGMENT_DOCS):
+        essays = [{'submission_id': f"sub-{n:07d}", 'user_id': f"user-{n % 3000:04d}", 'submitAt': None,
+                   'text': make_essay(rng, kanji)} for n in range(first, min(first + SEGMENT_DOCS, args.essays))]
+        text_bytes += sum(len(e['text'].encode('utf-8')) for e in essays)
+        blob = Segment.build(essays).to_blob()
+        stored += len(blob)
+        largest = max(largest, len(blob))
+        index.segments.append(Segment.from_blob(blob))
+    build = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    mb = 2 ** 20
+    print(f"{args.essays} essays in {len(index.segments)} segments, built in {build:.0f}s")
+    print(f"essay text {text_bytes / mb:.0f} MB, stored index {stored / mb:.0f} MB "
+          f"(largest segment {largest / 1024:.0f} KB), "
+          f"in memory {memory / mb:.0f} MB")
+    print()
+    print(f"{'query':<18} {'matches':>8} {'all p50 ms':>11} {'dashboard p50 ms':>17} {'max ms':>8}")
+    for query in QUERIES:
+        terms = query.split()
+        row = []
+        for limit in (None, MAX_CANDIDATES):
+            times = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                hits = index.search(terms, limit)
+                times.append((time.perf_counter() - start) * 1000)
+            row.append((len(hits), statistics.median(times), max(times)))
+        (matches, all_p50, _), (_, p50, worst) = row
+        print(f"{query:<18} {matches:>8} {all_p50:>11.1f} {p50:>17.1f} {worst:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+In-process stand-ins for the OpenAI client used by the benchmarks.
+
+FakeOpenAIClient implements the small surface the app calls: the Assistants
+thread/message/run endpoints and streaming chat completions. Every call
+sleeps `rtt` seconds; runs complete `run_seconds` after creation and chat
+streams emit their first chunk after `ttft` seconds, then one chunk every
+`chunk_seconds`.
+"""
+import itertools
+import threading
+import time
+from types import SimpleNamespace
+
+DEFAULT_REPLY = "文法はおおむね正確です。助詞の使い方に注意しましょう。\n\nスコア: 78"
+
+
+class FakeOpenAIClient:
+    def __init__(self, rtt=0.1, run_seconds=1.5, ttft=0.4, chunk_seconds=0.02, chunk_size=8, reply=DEFAULT_REPLY):
+        self.rtt = rtt
+        self.run_seconds = run_seconds
+        self.ttft = ttft
+        self.chunk_seconds = chunk_seconds
+        self.chunk_size = chunk_size
+        self.reply = reply
+        self.calls = 0
+        self._ids = itertools.count()
+        self._runs = {}
+        self._lock = threading.Lock()
+        self.beta = SimpleNamespace(
+            assistants=SimpleNamespace(retrieve=self._retrieve_assistant),
+            threads=SimpleNamespace(
+                create=self._create_thread,
+                messages=SimpleNamespace(create=self._create_message, list=self._list_messages),
+                runs=SimpleNamespace(create=self._create_run, retrieve=self._retrieve_run, cancel=self._cancel_run),
+            ),
+        )
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.rtt)
+
+    def _reply_for(self, text):
+        return self.reply(text) if callable(self.reply) else self.reply
+
+    # -- Assistants -------------------------------------------------------
+    def _retrieve_assistant(self, assistant_id):
+        self._call()
+        return SimpleNamespace(id=assistant_id)
+
+    def _create_thread(self):
+        self._call()
+        return SimpleNamespace(id=f"thread_{next(self._ids)}")
+
+    def _create_message(self, thread_id, role, content):
+        self._call()
+        self._last_message = content
+
+    def _create_run(self, thread_id, assistant_id, **options):
+        self._call()
+        run_id = f"run_{next(self._ids)}"
+        duration = self.run_seconds() if callable(self.run_seconds) else self.run_seconds
+        self._runs[run_id] = {"done_at": time.monotonic() + duration, "status": "in_progress",
+                              "text": getattr(self, "_last_message", "")}
+        return SimpleNamespace(id=run_id, status="queued")
+
+    def _retrieve_run(self, thread_id, run_id):
+        self._call()
+        run = self._runs[run_id]
+        if run["status"] == "in_progress" and time.monotonic() >= run["done_at"]:
+            run["status"] = "completed"
+        return SimpleNamespace(id=run_id, status=run["status"], last_error=None)
+
+    def _cancel_run(self, thread_id, run_id):
+        self._call()
+        self._runs[run_id]["status"] = "cancelled"
+        return SimpleNamespace(id=run_id, status="cancelling")
+
+    def _list_messages(self, thread_id, run_id=None, order="desc", **options):
+        self._call()
+        text = SimpleNamespace(value=self._reply_for(self._runs.get(run_id, {}).get("text", "")))
+        return SimpleNamespace(data=[SimpleNamespace(role="assistant", content=[SimpleNamespace(text=text)])])
+
+    # -- Chat completions ---------------------------------------------------
+    def _create_chat_completion(self, model, messages, stream=False, **options):
+        self._call()
+        reply = self._reply_for(messages[-1]["content"])
+        if not stream:
+            time.sleep(self.ttft + self.chunk_seconds * (len(reply) // self.chunk_size))
+            message = SimpleNamespace(content=reply)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        return self._stream(reply)
+
+    def _stream(self, reply):
+        time.sleep(self.ttft)
+        for i in range(0, len(reply), self.chunk_size):
+            if i:
+                time.sleep(self.chunk_seconds)
+            delta = SimpleNamespace(content=reply[i:i + self.chunk_size])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
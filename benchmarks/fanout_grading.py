@@ -0,0 +1,88 @@
+"""
+Wall-clock time of fan-out grading vs a single grading run, by essay length.
+
+The fake backend's latency grows linearly with the text it is asked to
+grade (`--base` seconds plus `--per-char` seconds per character), like a
+model generating feedback proportional to the essay. The score pass only
+produces one line, so it is charged the much smaller `--prefill-per-char`.
+
+Usage:
+    python benchmarks/fanout_grading.py [--lengths 500 2000 4000 8000] [--parallelism 4]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.grading import EssayGrading, SCORE_PROMPT  # noqa: E402
+from modules.llm_backends import FakeBackend  # noqa: E402
+
+SENTENCES = [
+    "私は毎朝七時に起きて、駅まで歩いて行きます。",
+    "電車の中では日本語の単語を覚えるようにしています。",
+    "会社に着いたら、まずメールを確認します。",
+    "昼ごはんは同僚と近くの食堂で食べることが多いです。",
+    "週末には友達と映画を見たり、料理をしたりします。",
+]
+
+
+class LinearLatencyBackend(FakeBackend):
+    def __init__(self, base, per_char, prefill_per_char):
+        super().__init__(reply="よく書けています。\n\nスコア: 75")
+        self.base = base
+        self.per_char = per_char
+        self.prefill_per_char = prefill_per_char
+
+    def stream_reply(self, conversation, text):
+        score_only = text.startswith(SCORE_PROMPT.split("{")[0])
+        time.sleep(self.base + (self.prefill_per_char if score_only else self.per_char) * len(text))
+        yield from super().stream_reply(conversation, text)
+
+    def cache_key(self):
+        # Measure the model calls, not the shared feedback cache
+        return None
+
+
+def make_essay(length, sentences_per_paragraph=6):
+    sentences, total = [], 0
+    while total < length:
+        sentence = SENTENCES[len(sentences) % len(SENTENCES)]
+        sentences.append(sentence)
+        total += len(sentence)
+    paragraphs = ["".join(sentences[i:i + sentences_per_paragraph])
+                  for i in range(0, len(sentences), sentences_per_paragraph)]
+    return "\n".join(paragraphs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[500, 2000, 4000, 8000])
+    parser.add_argument("--parallelism", type=int, default=4)
+    parser.add_argument("--base", type=float, default=0.5)
+    parser.add_argument("--per-char", type=float, default=0.002)
+    parser.add_argument("--prefill-per-char", type=float, default=0.0001)
+    args = parser.parse_args()
+
+    backend = LinearLatencyBackend(args.base, args.per_char, args.prefill_per_char)
+
+    print(f"{'chars':>6} {'single s':>9} {'fan-out s':>10} {'requests':>9} {'speedup':>8}")
+    for length in args.lengths:
+        essay = make_essay(length)
+
+        start = time.perf_counter()
+        backend.reply(backend.start_conversation(), f"Writing: {essay}")
+        single = time.perf_counter() - start
+
+        grading = EssayGrading(backend, essay, parallelism=args.parallelism)
+        start = time.perf_counter()
+        for _chunk in grading.stream():
+            pass
+        fanout = time.perf_counter() - start
+
+        print(f"{len(essay):>6} {single:>9.2f} {fanout:>10.2f} {grading.model_calls:>9} {single / fanout:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Grading tail latency with and without hedged requests.
+
+A fake backend answers most requests after a log-normal latency around
+`--median` seconds, but `--stall-rate` of them stall for `--stall` seconds
+(a stuck Assistants run). The same request stream is sent through the bare
+backend and through HedgedBackend, `--concurrency` at a time; hedging
+re-sends a request once it is slower than the learned percentile and
+takes whichever copy answers first.
+
+Latencies are in seconds; `--scale` shrinks them all so the run is quick.
+
+Usage:
+    python benchmarks/hedged_grading.py [--requests 400] [--stall-rate 0.05] [--budget 0.1] [--scale 0.02]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.llm_backends import FakeBackend, HedgedBackend  # noqa: E402
+
+
+class HeavyTailBackend(FakeBackend):
+    def __init__(self, median, sigma, stall_rate, stall, scale, seed):
+        super().__init__(reply="よく書けています。\n\nスコア: 75")
+        self.median = median
+        self.sigma = sigma
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.scale = scale
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.calls = 0
+
+    def stream_reply(self, conversation, text):
+        with self.random_lock:
+            self.calls += 1
+            stalled = self.random.random() < self.stall_rate
+            latency = self.stall if stalled else self.median * math.exp(self.random.gauss(0, self.sigma))
+        # A cancelled hedge loser stops waiting, like a cancelled run
+        cancel = conversation.get("cancel") or threading.Event()
+        if cancel.wait(latency * self.scale):
+            return
+        yield from super().stream_reply(conversation, text)
+
+    def cache_key(self):
+        return None
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run(backend, requests, concurrency, scale):
+    def grade(i):
+        start = time.perf_counter()
+        backend.reply(backend.start_conversation(), f"Writing: essay {i}")
+        return (time.perf_counter() - start) / scale
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(grade, range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--median", type=float, default=4.0)
+    parser.add_argument("--sigma", type=float, default=0.35)
+    parser.add_argument("--stall-rate", type=float, default=0.05)
+    parser.add_argument("--stall", type=float, default=60.0)
+    parser.add_argument("--percentile", type=int, default=95)
+    parser.add_argument("--budget", type=float, default=0.1)
+    parser.add_argument("--scale", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def make_backend():
+        return HeavyTailBackend(args.median, args.sigma, args.stall_rate, args.stall, args.scale, args.seed)
+
+    plain = make_backend()
+    baseline = run(plain, args.requests, args.concurrency, args.scale)
+
+    inner = make_backend()
+    hedged = HedgedBackend(inner, percentile=args.percentile, max_hedge_fraction=args.budget,
+                           min_delay=0.5 * args.scale)
+    with_hedging = run(hedged, args.requests, args.concurrency, args.scale)
+
+    print(f"{'':>10} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7} {'model calls':>12}")
+    for name, samples, calls in [("plain", baseline, plain.calls), ("hedged", with_hedging, inner.calls)]:
+        print(f"{name:>10} {percentile(samples, 50):>7.2f} {percentile(samples, 95):>7.2f} "
+              f"{percentile(samples, 99):>7.2f} {max(samples):>7.2f} {calls:>12}")
+    stats = hedged.stats()
+    print(f"\nhedged {stats['hedged']}/{stats['requests']} requests ({stats['hedged'] / stats['requests']:.1%}), "
+          f"hedge won {stats['hedge_wins']}, final hedge delay {(stats['hedge_delay'] or 0) / args.scale:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
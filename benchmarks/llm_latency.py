@@ -0,0 +1,77 @@
+"""
+Side-by-side grading latency of the LLM backends.
+
+Grades the same essay with the Assistants engine and the streaming
+chat-completions engine and reports time to first chunk and total time.
+By default both run against benchmarks.fakes.FakeOpenAIClient; with --live
+they use the real API, reading `api_key` and `hinotama_id` from
+.streamlit/secrets.toml.
+
+Usage:
+    python benchmarks/llm_latency.py [--essays 5] [--live] [--model gpt-4o-mini]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.llm_backends as llm_backends  # noqa: E402
+import modules.modules as assistant_api  # noqa: E402
+from benchmarks.fakes import FakeOpenAIClient  # noqa: E402
+
+ESSAY = (
+    "私の夢は日本で働くことです。大学で日本語を勉強してから、日本の会社でエンジニアとして働きたいと思っています。\n\n"
+    "去年の夏休みに東京へ行きました。電車がとても便利で、町がきれいでした。"
+    "日本人の友達と一緒にラーメンを食べて、たくさん話しました。\n\n"
+    "これからも毎日日本語を勉強して、夢をかなえたいです。"
+)
+
+
+def measure(backend, essays):
+    first_chunk, total = [], []
+    for _ in range(essays):
+        start = time.perf_counter()
+        first = None
+        for _chunk in backend.stream_reply(backend.start_conversation(), f"Writing: {ESSAY}"):
+            if first is None:
+                first = time.perf_counter() - start
+        total.append(time.perf_counter() - start)
+        first_chunk.append(first)
+    return statistics.median(first_chunk), statistics.median(total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--essays", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="Call the real OpenAI API")
+    parser.add_argument("--model", default=llm_backends.DEFAULT_CHAT_MODEL)
+    args = parser.parse_args()
+
+    if args.live:
+        import streamlit as st
+        assistant_id = st.secrets.hinotama_id
+    else:
+        # Simulated latencies: runs take as long as generating the whole reply,
+        # while the chat stream starts after the time-to-first-token
+        client = FakeOpenAIClient(rtt=0.1, run_seconds=4.0, ttft=0.6, chunk_seconds=0.03)
+        assistant_api.get_openai_client = lambda: client
+        llm_backends.get_openai_client = lambda: client
+        assistant_id = "asst_benchmark"
+
+    backends = {
+        "assistants": llm_backends.AssistantsBackend(assistant_id),
+        "chat": llm_backends.ChatCompletionsBackend(args.model, llm_backends.load_prompt("prompts/hinotama_rubric.md")),
+        "fake": llm_backends.FakeBackend(),
+    }
+
+    print(f"{'engine':<12} {'first chunk s':>14} {'total s':>9}")
+    for name, backend in backends.items():
+        first, total = measure(backend, args.essays)
+        print(f"{name:<12} {first:>14.3f} {total:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+End-to-end load test: how many students can submit at once per replica?
+
+Each simulated session is a Streamlit AppTest of app.py that logs in,
+submits an essay, waits for the feedback and asks VocabVan one question.
+Sessions run concurrently on threads in this process, so they share the
+process-wide resources (Firestore client, OpenAI client, hashing pool,
+caches) exactly as sessions on one replica do.
+
+Dependencies are local:
+  - OpenAI: benchmarks/mock_openai_server.py, started in-process with the
+    latency options below (or --openai-url for one already running)
+  - Firestore: the emulator, which must be running with
+    FIRESTORE_EMULATOR_HOST set, e.g.
+        gcloud emulators firestore start --host-port=127.0.0.1:8080
+        export FIRESTORE_EMULATOR_HOST=127.0.0.1:8080
+
+For each concurrency level it reports p50/p95/p99 time-to-feedback,
+throughput, error rate and memory per session, then names the knee: the
+first level whose p95 exceeds `--knee-factor` times the single-session p95,
+or where throughput stops growing.
+
+Usage:
+    python benchmarks/load_harness.py [--levels 1 2 4 8 16 32] [--rounds 3] [--engine assistants]
+                                   [--run-seconds 3] [--ttft 0.5] [--jitter 0.3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+from benchmarks.mock_openai_server import MockOpenAI, start_server  # noqa: E402
+
+PROJECT_ID = "hinotama-loadtest"
+PASSWORD = "loadtest-password"
+ESSAY = (
+    "私の夢は日本で働くことです。大学で日本語を勉強してから、日本の会社でエンジニアとして働きたいと思っています。\n\n"
+    "去年の夏休みに東京へ行きました。電車がとても便利で、町がきれいでした。\n\n"
+    "これからも毎日日本語を勉強して、夢をかなえたいです。"
+)
+QUESTION = "「とても楽しかった」をもっと自然に言いたいです。"
+
+
+def seed_users(count, bcrypt_rounds):
+    """Create `count` active students in the emulator, all with PASSWORD."""
+    import bcrypt
+    from google.cloud import firestore
+
+    db = firestore.Client(project=PROJECT_ID)
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=bcrypt_rounds)).decode("utf-8")
+    batch = db.batch()
+    for i in range(count):
+        batch.set(db.collection("users").document(f"loadtest_{i}"), {
+            "email": f"loadtest_{i}@example.com",
+            "password": hashed,
+            "reason_for_studying": "load test",
+            "org_code": None,
+            "registerAt": datetime.now(timezone.utc),
+            "timezone": "UTC",
+            "status": "Active",
+        })
+    batch.commit()
+
+
+def make_secrets(args, openai_url):
+    engines = {"hinotama_id": "prompts/hinotama_rubric.md", "vocabvan_JP": "prompts/vocabvan.md"}
+    return {
+        "hinotama_id": "asst_loadtest",
+        "vocabvan_JP": "asst_loadtest_vocab",
+        "api_key": "sk-loadtest",
+        "openai_base_url": openai_url,
+        "bcrypt_rounds": args.bcrypt_rounds,
+        "firebase": {"project_id": PROJECT_ID},
+        "llm_backends": {
+            key: {"engine": args.engine, "prompt": prompt} if args.engine == "chat" else {"engine": args.engine}
+            for key, prompt in engines.items()
+        },
+    }
+
+
+def rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def run_session(user_id, secrets, timeout):
+    """Login -> submit -> feedback -> VocabVan. Returns (app_test, timings or None, error or None)."""
+    at = AppTest.from_file("app.py", default_timeout=timeout)
+    for key, value in secrets.items():
+        at.secrets[key] = value
+    timings = {}
+    try:
+        at.run()
+        start = time.perf_counter()
+        next(t for t in at.text_input if t.label == "ユーザーID (User ID)").input(user_id)
+        next(t for t in at.text_input if t.label == "パスワード (Password)").input(PASSWORD)
+        button(at, "ログイン (Login)").click()
+        at.run()
+        timings["login"] = time.perf_counter() - start
+        if not at.session_state["user"]:
+            raise RuntimeError("login failed")
+
+        at.text_area(key="txt").input(ESSAY)
+        button(at, "採点する🚀").click()
+        start = time.perf_counter()
+        at.run()
+        timings["feedback"] = time.perf_counter() - start
+        if at.exception or not at.session_state["feedback"]:
+            raise RuntimeError(at.exception[0].value if at.exception else "no feedback")
+
+        start = time.perf_counter()
+        at.chat_input[0].set_value(QUESTION).run()
+        timings["vocabvan"] = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        return at, timings, None
+    except Exception as e:
+        return at, None, f"{type(e).__name__}: {e}" if str(e) else traceback.format_exc(limit=1)
+
+
+def percentile(samples, p):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run_level(level, rounds, secrets, timeout):
+    sessions = level * rounds
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=level) as pool:
+        results = list(pool.map(
+            lambda i: run_session(f"loadtest_{i % level}", secrets, timeout),
+            range(sessions)
+        ))
+    elapsed = time.perf_counter() - start
+    # All AppTests (and their session state) are still referenced here
+    memory_per_session = (rss_bytes() - rss_before) / sessions
+
+    feedback = [timings["feedback"] for _at, timings, _err in results if timings]
+    errors = [err for _at, _timings, err in results if err]
+    return {
+        "level": level,
+        "sessions": sessions,
+        "p50": percentile(feedback, 50),
+        "p95": percentile(feedback, 95),
+        "p99": percentile(feedback, 99),
+        "login_p50": statistics.median([t["login"] for _at, t, _e in results if t] or [float("nan")]),
+        "vocabvan_p50": statistics.median([t["vocabvan"] for _at, t, _e in results if t] or [float("nan")]),
+        "throughput": len(feedback) / elapsed * 60,
+        "error_rate": len(errors) / sessions,
+        "errors": errors,
+        "memory_mb": memory_per_session / 2**20,
+    }
+
+
+def find_knee(rows, factor):
+    baseline = rows[0]["p95"]
+    for previous, row in zip(rows, rows[1:]):
+        if row["p95"] > factor * baseline:
+            return row["level"], f"p95 {row['p95']:.2f}s > {factor}x single-session {baseline:.2f}s"
+        if row["throughput"] < previous["throughput"] * 1.1:
+            return row["level"], f"throughput {row['throughput']:.1f}/min barely above {previous['throughput']:.1f}/min"
+    return None, "not reached; try higher --levels"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--rounds", type=int, default=3, help="Sessions per concurrent slot at each level")
+    parser.add_argument("--engine", choices=["assistants", "chat"], default="assistants")
+    parser.add_argument("--openai-url", help="Use a mock server that is already running")
+    parser.add_argument("--run-seconds", type=float, default=3.0)
+    parser.add_argument("--ttft", type=float, default=0.5)
+    parser.add_argument("--chunk-seconds", type=float, default=0.03)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--knee-factor", type=float, default=1.5)
+    args = parser.parse_args()
+
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        parser.error("FIRESTORE_EMULATOR_HOST is not set; start the Firestore emulator first")
+
+    os.chdir(REPO_ROOT)
+    openai_url = args.openai_url
+    if not openai_url:
+        mock = MockOpenAI(args.run_seconds, args.ttft, args.chunk_seconds, jitter=args.jitter)
+        _server, openai_url = start_server(mock)
+    seed_users(max(args.levels), args.bcrypt_rounds)
+    secrets = make_secrets(args, openai_url)
+
+    print(f"{'sessions':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'login':>7} {'vocab':>7} "
+          f"{'per min':>8} {'errors':>7} {'MB/sess':>8}")
+    rows = []
+    for level in args.levels:
+        row = run_level(level, args.rounds, secrets, args.timeout)
+        rows.append(row)
+        print(f"{level:>8} {row['p50']:>7.2f} {row['p95']:>7.2f} {row['p99']:>7.2f} {row['login_p50']:>7.2f} "
+              f"{row['vocabvan_p50']:>7.2f} {row['throughput']:>8.1f} {row['error_rate']:>7.1%} {row['memory_mb']:>8.2f}")
+        for error in sorted(set(row["errors"]))[:3]:
+            print(f"{'':>8} error: {error}")
+
+    knee, reason = find_knee(rows, args.knee_factor)
+    print(f"\nLatency degrades at {knee} concurrent sessions: {reason}" if knee else f"\nKnee {reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+A local HTTP server that answers the OpenAI endpoints the app calls.
+
+Point the app at it with `openai_base_url = "http://127.0.0.1:8765/v1"` in
+secrets. It serves the Assistants thread/message/run endpoints, streaming
+and non-streaming chat completions (grading, VocabVan, transcription), with
+configurable latency:
+
+  --run-seconds   how long an Assistants run stays in progress
+  --ttft          delay before the first streamed chunk / non-streamed reply
+  --chunk-seconds delay between streamed chunks
+  --jitter        log-normal spread (sigma) applied to run-seconds and ttft
+
+Usage:
+    python benchmarks/mock_openai_server.py [--port 8765] [--run-seconds 3] [--ttft 0.5] [--jitter 0.3]
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "文法はおおむね正確です。助詞の使い方に注意しましょう。\n\nスコア: 78"
+
+
+class MockOpenAI:
+    """State and latency model shared by all request handlers."""
+
+    def __init__(self, run_seconds=3.0, ttft=0.5, chunk_seconds=0.03, chunk_size=8, jitter=0.0, reply=DEFAULT_REPLY):
+        self.run_seconds = run_seconds
+        self.ttft = ttft
+        self.chunk_seconds = chunk_seconds
+        self.chunk_size = chunk_size
+        self.jitter = jitter
+        self.reply = reply
+        self.requests = 0
+        self._ids = itertools.count()
+        self._runs = {}
+        self._last_message = {}
+        self._lock = threading.Lock()
+
+    def sample(self, median):
+        """`median` seconds, spread log-normally by `jitter`."""
+        return median * math.exp(random.gauss(0, self.jitter)) if self.jitter else median
+
+    def new_id(self, prefix):
+        return f"{prefix}_{next(self._ids)}"
+
+    def create_run(self, thread_id):
+        run_id = self.new_id("run")
+        with self._lock:
+            self._runs[run_id] = {
+                "thread_id": thread_id,
+                "done_at": time.monotonic() + self.sample(self.run_seconds),
+                "status": "in_progress",
+                "text": self._last_message.get(thread_id, ""),
+            }
+        return run_id
+
+    def run_status(self, run_id):
+        with self._lock:
+            run = self._runs[run_id]
+            if run["status"] == "in_progress" and time.monotonic() >= run["done_at"]:
+                run["status"] = "completed"
+            return run["status"]
+
+
+def run_object(run_id, thread_id, status):
+    return {"id": run_id, "object": "thread.run", "thread_id": thread_id, "status": status, "last_error": None}
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, body, status=200):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            with mock._lock:
+                mock.requests += 1
+            path = self.path.split("?")[0]
+            if m := re.fullmatch(r"/v1/assistants/([^/]+)", path):
+                return self._json({"id": m[1], "object": "assistant"})
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/runs/([^/]+)", path):
+                return self._json(run_object(m[2], m[1], mock.run_status(m[2])))
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/messages", path):
+                run_id = (re.search(r"run_id=([^&]+)", self.path) or [None, None])[1]
+                text = mock._runs.get(run_id, {}).get("text", "")
+                reply = mock.reply(text) if callable(mock.reply) else mock.reply
+                message = {
+                    "id": mock.new_id("msg"), "object": "thread.message", "thread_id": m[1], "run_id": run_id,
+                    "role": "assistant", "content": [{"type": "text", "text": {"value": reply, "annotations": []}}],
+                }
+                return self._json({"object": "list", "data": [message], "has_more": False})
+            self._json({"error": {"message": f"Unknown path {path}"}}, status=404)
+
+        def do_POST(self):
+            with mock._lock:
+                mock.requests += 1
+            path = self.path.split("?")[0]
+            body = self._body()
+            if path == "/v1/threads":
+                return self._json({"id": mock.new_id("thread"), "object": "thread"})
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/messages", path):
+                with mock._lock:
+                    mock._last_message[m[1]] = body.get("content", "")
+                return self._json({"id": mock.new_id("msg"), "object": "thread.message", "thread_id": m[1],
+                                   "role": "user", "content": []})
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/runs", path):
+                return self._json(run_object(mock.create_run(m[1]), m[1], "queued"))
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/runs/([^/]+)/cancel", path):
+                with mock._lock:
+                    mock._runs[m[2]]["status"] = "cancelled"
+                return self._json(run_object(m[2], m[1], "cancelling"))
+            if path == "/v1/chat/completions":
+                return self._chat(body)
+            self._json({"error": {"message": f"Unknown path {path}"}}, status=404)
+
+        def _chat(self, body):
+            content = body["messages"][-1]["content"]
+            reply = mock.reply(content) if callable(mock.reply) else mock.reply
+            time.sleep(mock.sample(mock.ttft))
+            if not body.get("stream"):
+                return self._json({
+                    "id": mock.new_id("chatcmpl"), "object": "chat.completion", "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                })
+
+            # Server-sent events; the connection is closed after [DONE]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            completion_id = mock.new_id("chatcmpl")
+            for i in range(0, len(reply), mock.chunk_size):
+                if i:
+                    time.sleep(mock.chunk_seconds)
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": {"content": reply[i:i + mock.chunk_size]}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+
+    return Handler
+
+
+def start_server(mock, host="127.0.0.1", port=0):
+    """Serve `mock` on a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(mock))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--run-seconds", type=float, default=3.0)
+    parser.add_argument("--ttft", type=float, default=0.5)
+    parser.add_argument("--chunk-seconds", type=float, default=0.03)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockOpenAI(args.run_seconds, args.ttft, args.chunk_seconds, jitter=args.jitter)
+    server, base_url = start_server(mock, args.host, args.port)
+    print(f"Mock OpenAI API at {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
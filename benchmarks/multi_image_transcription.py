@@ -0,0 +1,68 @@
+"""
+Multi-page transcription time: one page after another vs transcribe_files.
+
+Each page is a fake upload whose transcription sleeps for a random latency
+between `--min` and `--max` seconds (the vision call is stubbed out), so the
+concurrent total should approach the slowest page rather than the sum.
+
+Usage:
+    python benchmarks/multi_image_transcription.py [--pages 5] [--min 3] [--max 8]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.modules as transcription  # noqa: E402
+from modules.shared_cache import MemoryBackend, SharedCache  # noqa: E402
+
+
+class FakeUpload(io.BytesIO):
+    def __init__(self, index, latency):
+        super().__init__(f"page {index}".encode())
+        self.name = f"page{index}.jpg"
+        self.type = "image/jpeg"
+        self.latency = latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--min", type=float, default=3.0)
+    parser.add_argument("--max", type=float, default=8.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    latencies = [random.uniform(args.min, args.max) for _ in range(args.pages)]
+    uploads = [FakeUpload(i, latency) for i, latency in enumerate(latencies)]
+    latency_by_content = {f"page {i}".encode(): latency for i, latency in enumerate(latencies)}
+
+    def fake_transcribe_image(image_bytes, mime_type="image/jpeg", max_tokens=None, model=None):
+        time.sleep(latency_by_content[image_bytes])
+        return image_bytes.decode()
+
+    transcription.transcribe_image = fake_transcribe_image
+    # A fresh cache per file, so both passes really transcribe every page
+    transcription.get_shared_cache = lambda: SharedCache(MemoryBackend())
+
+    start = time.perf_counter()
+    for upload in uploads:
+        transcription.convert_image_to_text(upload)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    order = [index for index, _text in transcription.transcribe_files(uploads)]
+    concurrent = time.perf_counter() - start
+
+    print(f"pages: {args.pages}  slowest page: {max(latencies):.2f}s  sum of pages: {sum(latencies):.2f}s")
+    print(f"sequential:  {sequential:.2f}s")
+    print(f"concurrent:  {concurrent:.2f}s  (completion order {order})")
+
+
+if __name__ == "__main__":
+    main()
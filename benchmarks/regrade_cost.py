@@ -0,0 +1,83 @@
+"""
+Resubmission cost of diff-aware grading.
+
+Grades a first draft (one request, as a whole), resubmits the full essay
+(graded by paragraph, nothing to reuse yet), then resubmits it with 0..N
+paragraphs edited, reusing the previous grading record like app.main does.
+A fake backend charges `--latency-per-char` seconds per prompt character, so
+time and characters sent should scale with the size of the edit. Each
+resubmission's saved score must come from its own score pass, never from
+a section reused from an earlier report.
+
+Usage:
+    python benchmarks/regrade_cost.py [--paragraphs 8] [--latency-per-char 0.0005]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.grading import EssayGrading  # noqa: E402
+from modules.modules import extract_score_from_feedback  # noqa: E402
+from modules.llm_backends import FakeBackend  # noqa: E402
+
+PARAGRAPH = "週末に友達と公園へ行って、写真をたくさん撮りました。天気がよくて、とても楽しい一日でした。"
+
+
+class MeteredBackend(FakeBackend):
+    def __init__(self, latency_per_char):
+        # Every submission's score pass gives a new score; paragraph replies carry a stray one
+        self.scores = iter(range(60, 100))
+        super().__init__(reply=self.answer)
+        self.latency_per_char = latency_per_char
+        self.chars_sent = 0
+
+    def answer(self, text):
+        if text.startswith("Writing:") or "総合点" in text:
+            return f"全体のコメント。\n\nスコア: {next(self.scores)}"
+        return "自然な文章です。\n\nスコア: 50"
+
+    def stream_reply(self, conversation, text):
+        self.chars_sent += len(text)
+        time.sleep(self.latency_per_char * len(text))
+        yield from super().stream_reply(conversation, text)
+
+
+def grade(backend, text, previous):
+    grading = EssayGrading(backend, text, previous)
+    start = time.perf_counter()
+    for _chunk in grading.stream():
+        pass
+    elapsed = time.perf_counter() - start
+    # What save_submission stores, and what a reader of the report would parse
+    assert grading.score is not None and extract_score_from_feedback(grading.feedback) == grading.score
+    assert grading.feedback.count("スコア") == 1
+    return grading, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=8)
+    parser.add_argument("--latency-per-char", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    paragraphs = [f"{i + 1}. {PARAGRAPH}" for i in range(args.paragraphs)]
+    backend = MeteredBackend(args.latency_per_char)
+    print(f"{'edited':>6} {'model calls':>12} {'chars sent':>11} {'seconds':>8}")
+    previous = None
+    for label, text in (("draft", "\n".join(paragraphs[:-1])), ("full", "\n".join(paragraphs))):
+        backend.chars_sent = 0
+        grading, seconds = grade(backend, text, previous)
+        previous = {"feedback": grading.feedback, **grading.record()}
+        print(f"{label:>6} {grading.model_calls:>12} {backend.chars_sent:>11} {seconds:>8.3f}")
+    for edited in range(args.paragraphs + 1):
+        revised = [p + "（改）" if i < edited else p for i, p in enumerate(paragraphs)]
+        backend.chars_sent = 0
+        grading, seconds = grade(backend, "\n".join(revised), previous)
+        print(f"{edited:>6} {grading.model_calls:>12} {backend.chars_sent:>11} {seconds:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Rerun time per interaction on the student page, whole script vs fragment.
+
+Without fragments, every widget interaction reran all of app.py. With
+them, only the panel that owns the widget reruns. This drives both with
+Streamlit's AppTest for a logged-in student (LLM backends set to the
+local fake engine, so no network is used):
+
+  whole page  - AppTest of app.py, rerun after editing the essay text
+  fragment    - AppTest of the input panel alone, i.e. what a fragment
+                rerun executes after the same edit
+
+Usage:
+    python benchmarks/rerun_timing.py [--runs 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+ESSAY = "私の夢は日本で働くことです。大学で日本語を勉強しています。\n去年の夏休みに東京へ行きました。" * 6
+
+SECRETS = {
+    "hinotama_id": "asst_benchmark",
+    "vocabvan_JP": "asst_benchmark",
+    "api_key": "sk-benchmark",
+    "llm_backends": {"hinotama_id": {"engine": "fake"}, "vocabvan_JP": {"engine": "fake"}},
+}
+USER = {"id": "benchmark", "email": "bench@example.com", "status": "Active", "timezone": "UTC", "days_left": 30}
+
+
+def input_panel_script():
+    import app
+    app.get_input()
+
+
+def prepare(at):
+    for key, value in SECRETS.items():
+        at.secrets[key] = value
+    at.session_state["user"] = USER
+    at.session_state["organization"] = None
+    at.run()
+    return at
+
+
+def time_edits(at, runs):
+    samples = []
+    for i in range(runs):
+        at.text_area(key="txt").input(f"{ESSAY}{i}")
+        start = time.perf_counter()
+        at.run()
+        samples.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    whole = time_edits(prepare(AppTest.from_file("app.py", default_timeout=30)), args.runs)
+    fragment = time_edits(prepare(AppTest.from_function(input_panel_script, default_timeout=30)), args.runs)
+
+    print("Median rerun after editing the essay")
+    print(f"  whole page (before)   {whole * 1000:8.1f} ms")
+    print(f"  input fragment only   {fragment * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
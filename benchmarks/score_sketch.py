@@ -0,0 +1,79 @@
+"""
+Score distribution from weekly KLL sketches vs scanning submissions.
+
+Generates `--orgs` organizations with `--per-week` scores each over
+`--weeks` weeks, adds each score to a random one of SKETCH_SHARDS shards of
+its (org, week) sketch as save_submission would, round-trips them through
+their stored form, and answers the
+dashboard questions (quartiles and histogram) for one organization and for
+all of them over the whole range. Reported: documents and bytes read,
+merge time, and the rank error of each quartile against the exact scores.
+
+Usage:
+    python benchmarks/score_sketch.py [--orgs 50] [--weeks 26] [--per-week 300]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from bisect import bisect_left, bisect_right
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.score_sketch import SKETCH_SHARDS, KLLSketch, merge_sketches  # noqa: E402
+
+# Bytes of a submission document a scan would download, essay and feedback included
+SUBMISSION_BYTES = 4000
+
+
+def rank_errors(sketch, exact):
+    exact = sorted(exact)
+    errors = []
+    for q in (0.25, 0.5, 0.75):
+        estimate = sketch.quantile(q)
+        # Scores are integers, so the estimate covers a range of ranks; no error if q is inside it
+        low, high = bisect_left(exact, estimate) / len(exact), bisect_right(exact, estimate) / len(exact)
+        errors.append(max(low - q, q - high, 0))
+    return max(errors)
+
+
+def report(label, docs, exact):
+    start = time.perf_counter()
+    sketch = merge_sketches(docs)
+    summary, _histogram = sketch.summary(), sketch.histogram()
+    ms = (time.perf_counter() - start) * 1000
+    read_kb = sum(len(json.dumps(doc)) for doc in docs) / 1024
+    print(f"{label:<14} {len(docs):>6} {read_kb:>9.0f} {len(exact):>9} {len(exact) * SUBMISSION_BYTES / 2 ** 20:>10.0f} "
+          f"{ms:>9.1f} {rank_errors(sketch, exact):>9.1%}   median {summary['median']}, Q1 {summary['q1']}, Q3 {summary['q3']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orgs", type=int, default=50)
+    parser.add_argument("--weeks", type=int, default=26)
+    parser.add_argument("--per-week", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    docs, scores = {}, {}
+    for org in range(args.orgs):
+        level = rng.gauss(68, 6)
+        for week in range(args.weeks):
+            shards = [KLLSketch() for _ in range(SKETCH_SHARDS)]
+            for _ in range(rng.randint(args.per_week // 2, args.per_week * 3 // 2)):
+                score = min(100, max(0, round(rng.gauss(level + week * 0.2, 11))))
+                rng.choice(shards).update(score)
+                scores.setdefault(org, []).append(score)
+            for shard, sketch in enumerate(shards):
+                if sketch.n:
+                    docs[org, week, shard] = json.loads(json.dumps(sketch.to_dict()))
+
+    print(f"{'':<14} {'docs':>6} {'read KB':>9} {'scores':>9} {'scan MB':>10} {'merge ms':>9} {'rank err':>9}")
+    report("one org", [doc for (org, _, _), doc in docs.items() if org == 0], scores[0])
+    report("all orgs", list(docs.values()), [s for org_scores in scores.values() for s in org_scores])
+
+
+if __name__ == "__main__":
+    main()
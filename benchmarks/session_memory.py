@@ -0,0 +1,123 @@
+"""
+Memory held by student sessions, before and after idle reclamation.
+
+Builds `--sessions` session states the way app.py fills them (an essay,
+its feedback, the last grading with per-paragraph feedback, a VocabVan
+chat), marks `--idle` of them as idle and runs one SessionMemory sweep,
+spilling to a temporary SQLite file. Memory is measured with tracemalloc,
+and cross-checked against SessionMemory.report(). Optionally also shows
+what one OpenAI client per session would have cost (when openai is
+installed); the app keeps a single one per process.
+
+Usage:
+    python benchmarks/session_memory.py [--sessions 500] [--idle 0.8]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.session_memory import SPILL_NAMESPACE, SPILL_TTL, SessionMemory  # noqa: E402
+from modules.shared_cache import SharedCache, SQLiteBackend  # noqa: E402
+
+SENTENCES = [
+    "私の夢は日本で働くことです。", "大学で日本語を勉強しています。", "去年の夏休みに東京へ行きました。",
+    "電車がとても便利で、町がきれいでした。", "週末はよく図書館で本を読みます。", "将来は通訳になりたいと思っています。",
+]
+
+
+def make_state(rng):
+    paragraphs = ["".join(rng.choices(SENTENCES, k=rng.randint(4, 8))) for _ in range(rng.randint(3, 6))]
+    feedback = "".join(f"【第{n + 1}段落】\n\n助詞の使い方に注意しましょう。" * 3 for n in range(len(paragraphs)))
+    chat = [{"role": role, "content": "".join(rng.choices(SENTENCES, k=4))}
+            for _ in range(rng.randint(0, 10)) for role in ("user", "assistant")]
+    return {
+        'user': {'id': f"user-{rng.getrandbits(32):08x}", 'status': 'Active', 'timezone': 'Asia/Tokyo'},
+        'organization': None,
+        'txt': "\n\n".join(paragraphs),
+        'transcribed_files': (),
+        'feedback': feedback + "\n\nスコア: 80",
+        'transcription_route': None,
+        'last_grading': {
+            'user_id': 'x', 'feedback': feedback, 'essay_hash': f"{rng.getrandbits(256):064x}",
+            'paragraphs': [{'hash': f"{rng.getrandbits(256):064x}", 'feedback': feedback[:200]} for _ in paragraphs],
+        },
+        'vocabvan_history': chat,
+        'vocabvan_conversation': {'messages': list(chat)},
+    }
+
+
+def traced_bytes():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--idle", type=float, default=0.8, help="share of sessions that have gone idle")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    tmpdir = tempfile.mkdtemp(prefix="hinotama-sessions-")
+    store = SharedCache(SQLiteBackend(os.path.join(tmpdir, "spill.db")), ttls={SPILL_NAMESPACE: SPILL_TTL})
+    memory = SessionMemory(store, idle_seconds=60, sweep_interval=0, is_active=lambda session_id: True)
+
+    tracemalloc.start()
+    empty = traced_bytes()
+    states = {f"session-{i:05d}": make_state(rng) for i in range(args.sessions)}
+    for session_id, state in states.items():
+        memory.touch(session_id, state, state)
+    before = traced_bytes() - empty
+    report_before = memory.report()
+
+    # Age the idle ones past the threshold, then sweep
+    idle = rng.sample(sorted(states), int(args.sessions * args.idle))
+    with memory._lock:
+        for session_id in idle:
+            memory._sessions[session_id].last_seen -= 3600
+    start = time.perf_counter()
+    memory.sweep()
+    sweep_seconds = time.perf_counter() - start
+    after = traced_bytes() - empty
+    report_after = memory.report()
+
+    # One idle session comes back; its fields must be as they were
+    session_id = idle[0]
+    start = time.perf_counter()
+    memory.touch(session_id, states[session_id], states[session_id])
+    restore_ms = (time.perf_counter() - start) * 1000
+    assert 'feedback' in states[session_id] and 'vocabvan_history' in states[session_id]
+    tracemalloc.stop()
+
+    kb = 1024
+    print(f"{args.sessions} sessions, {len(idle)} idle")
+    print(f"{'':<16} {'traced KB':>10} {'per session KB':>15} {'report KB/session':>18}")
+    print(f"{'before sweep':<16} {before / kb:>10.0f} {before / args.sessions / kb:>15.1f} "
+          f"{report_before['mean_bytes'] / kb:>18.1f}")
+    print(f"{'after sweep':<16} {after / kb:>10.0f} {after / args.sessions / kb:>15.1f} "
+          f"{report_after['mean_bytes'] / kb:>18.1f}")
+    print(f"\nsweep {sweep_seconds * 1000:.0f} ms, restore one session {restore_ms:.1f} ms, "
+          f"metrics {report_after['metrics']}")
+
+    try:
+        import openai
+    except ImportError:
+        return
+    tracemalloc.start()
+    base = traced_bytes()
+    clients = [openai.OpenAI(api_key="sk-benchmark") for _ in range(50)]
+    per_client = (traced_bytes() - base) / len(clients)
+    tracemalloc.stop()
+    print(f"one OpenAI client: {per_client / kb:.0f} KB, i.e. {per_client * args.sessions / kb / kb:.1f} MB "
+          f"if every session had its own")
+
+
+if __name__ == "__main__":
+    main()
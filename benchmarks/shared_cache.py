@@ -0,0 +1,86 @@
+"""
+Shared cache across replicas: hit rate and latency per backend.
+
+Two "replicas" (separate SharedCache objects, as two app processes would
+have) serve the same stream of requests, alternating between them. Each
+request asks for one of `--keys` expensive results (a dashboard aggregate
+taking `--compute` seconds), drawn with a Zipf-like skew. With a memory
+backend every replica computes its own copy; with SQLite or Redis the
+second replica reuses what the first computed.
+
+Redis uses `--redis-url` if given, otherwise fakeredis when installed.
+
+Usage:
+    python benchmarks/shared_cache.py [--requests 2000] [--keys 200] [--compute 0.005]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.shared_cache import MemoryBackend, RedisBackend, SQLiteBackend, SharedCache  # noqa: E402
+
+
+def replica_pairs(args, tmpdir):
+    yield "memory", [SharedCache(MemoryBackend()), SharedCache(MemoryBackend())]
+
+    path = os.path.join(tmpdir, "cache.db")
+    yield "sqlite", [SharedCache(SQLiteBackend(path)), SharedCache(SQLiteBackend(path))]
+
+    if args.redis_url:
+        yield "redis", [SharedCache(RedisBackend.from_url(args.redis_url)) for _ in range(2)]
+        return
+    try:
+        import fakeredis
+    except ImportError:
+        print("redis: skipped (no --redis-url and fakeredis is not installed)")
+        return
+    server = fakeredis.FakeServer()
+    yield "redis (fake)", [SharedCache(RedisBackend(fakeredis.FakeRedis(server=server))) for _ in range(2)]
+
+
+def run(replicas, keys, compute_seconds):
+    computed = 0
+
+    def aggregate(key):
+        nonlocal computed
+        computed += 1
+        time.sleep(compute_seconds)
+        return {"key": key, "rows": list(range(100))}
+
+    start = time.perf_counter()
+    for i, key in enumerate(keys):
+        replica = replicas[i % len(replicas)]
+        replica.get_or_compute("dashboard", ("aggregate", key), lambda: aggregate(key))
+    elapsed = time.perf_counter() - start
+
+    hits = sum(r.hits["dashboard"] for r in replicas)
+    return hits / len(keys), computed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--keys", type=int, default=200)
+    parser.add_argument("--compute", type=float, default=0.005)
+    parser.add_argument("--redis-url")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    weights = [1 / (rank + 1) for rank in range(args.keys)]
+    keys = random.choices(range(args.keys), weights=weights, k=args.requests)
+
+    print(f"{'backend':<14} {'hit rate':>9} {'computed':>9} {'seconds':>8} {'ms/request':>11}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, replicas in replica_pairs(args, tmpdir):
+            hit_rate, computed, elapsed = run(replicas, keys, args.compute)
+            print(f"{name:<14} {hit_rate:>9.1%} {computed:>9} {elapsed:>8.2f} {elapsed / len(keys) * 1000:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
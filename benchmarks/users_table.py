@@ -0,0 +1,79 @@
+"""
+Active-users table render cost as the organization grows.
+
+The old table styled every user with a pandas Styler (left alignment plus
+highlight_max on total_submission) and sent the whole styled table to the
+browser. The paged table filters and sorts the row dicts on the server and
+styles only the visible page. Both are timed up to the styled HTML, which
+is what Streamlit serializes for a Styler, and the HTML size stands in for
+what reaches the browser.
+
+Usage:
+    python benchmarks/users_table.py [--sizes 100,1000,5000,20000] [--page-size 50] [--runs 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+from modules.paged_table import filter_rows, page_of, sort_rows, style_page  # noqa: E402
+
+
+def make_users(n, rng):
+    return [{
+        'User ID': f"student{i:06d}@example.ac.jp",
+        'registerAt': f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'Expiration Date': f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'total_submission': rng.randint(0, 200),
+        'todays_submission': rng.randint(0, 5),
+    } for i in range(n)]
+
+
+def full_table(users):
+    df = pd.DataFrame(users)
+    return df.style.set_properties(**{'text-align': 'left'}).highlight_max(
+        subset=['total_submission'], color='#e6f3ff').to_html()
+
+
+def paged(users, page_size, query=''):
+    matching = sort_rows(filter_rows(users, 'User ID', query), 'total_submission', descending=True)
+    max_values = {'total_submission': max(row['total_submission'] for row in matching)}
+    visible, _page, _pages = page_of(matching, 1, page_size)
+    return style_page(pd.DataFrame(visible), ['total_submission'], max_values).to_html()
+
+
+def timed(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        html = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), len(html)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,5000,20000")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'users':>7} {'full ms':>9} {'full KB':>9} {'paged ms':>9} {'paged KB':>9} {'filtered ms':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        users = make_users(size, rng)
+        full_s, full_bytes = timed(lambda: full_table(users), args.runs)
+        paged_s, paged_bytes = timed(lambda: paged(users, args.page_size), args.runs)
+        filtered_s, _ = timed(lambda: paged(users, args.page_size, query='00001'), args.runs)
+        print(f"{size:>7} {full_s * 1000:>9.1f} {full_bytes / 1024:>9.0f} {paged_s * 1000:>9.1f} "
+              f"{paged_bytes / 1024:>9.0f} {filtered_s * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+VocabVan first-question vs follow-up latency.
+
+Runs the Assistants flow against an in-process fake client that sleeps
+`--rtt` seconds per API call and completes each run after `--run-seconds`.
+Compares the old per-question flow (retrieve assistant + new thread every
+time) with a first question (new thread) and a follow-up on the session's
+existing thread.
+
+Usage:
+    python benchmarks/vocabvan_followup.py [--rtt 0.12] [--run-seconds 1.5] [--questions 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.modules as assistant_api  # noqa: E402
+from benchmarks.fakes import FakeOpenAIClient  # noqa: E402
+
+
+def old_flow(client):
+    # Previous behaviour: every question retrieved the assistant and made a thread
+    client.beta.assistants.retrieve("asst_vocabvan")
+    assistant_api.ask_assistant("asst_vocabvan", assistant_api.create_thread(), "質問")
+
+
+def timed(fn, client):
+    calls_before = client.calls
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start, client.calls - calls_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt", type=float, default=0.12, help="Seconds per API round trip")
+    parser.add_argument("--run-seconds", type=float, default=1.5, help="Model time per run")
+    parser.add_argument("--questions", type=int, default=5)
+    args = parser.parse_args()
+
+    client = FakeOpenAIClient(rtt=args.rtt, run_seconds=args.run_seconds)
+    assistant_api.get_openai_client = lambda: client
+
+    results = {"old (per question)": [], "first question": [], "follow-up": []}
+    for _ in range(args.questions):
+        results["old (per question)"].append(timed(lambda: old_flow(client), client))
+
+        thread_id = {}
+
+        def first():
+            thread_id["id"] = assistant_api.create_thread()
+            assistant_api.ask_assistant("asst_vocabvan", thread_id["id"], "質問", max_context_messages=20)
+
+        results["first question"].append(timed(first, client))
+        results["follow-up"].append(timed(
+            lambda: assistant_api.ask_assistant("asst_vocabvan", thread_id["id"], "続きの質問", max_context_messages=20),
+            client,
+        ))
+
+    print(f"{'flow':<20} {'median s':>9} {'API calls':>10}")
+    for flow, samples in results.items():
+        print(f"{flow:<20} {statistics.median(s for s, _ in samples):>9.3f} {statistics.median(c for _, c in samples):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
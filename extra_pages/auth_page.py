@@ -104,9 +104,14 @@ def show_org_auth():
             org_data, message = login_organization(org_code, org_password)
             if org_data:
                 st.session_state.organization = org_data
+                # Start loading the dashboard now, so it is (partly) ready after the rerun
+                from extra_pages.organization_dashboard import prefetch_dashboard_data
+                prefetch_dashboard_data(org_data)
                 st.success(message)
                 st.rerun()  # Rerun to load the org dashboard
             elif org_code == "MKT":
+                from modules.marketing_data import prefetch_marketing_data
+                prefetch_marketing_data()
                 st.switch_page("pages/marketing_dashboard.py")
             else:
                 st.error(message)
\ No newline at end of file
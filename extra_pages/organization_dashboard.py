@@ -1,10 +1,17 @@
 import streamlit as st
+import os
 import pandas as pd
 from datetime import datetime, timedelta
-from firebase_setup import db
+from modules.resources import get_db
+from modules.profile_cache import invalidate_user_doc
+from modules.shared_cache import cached
+from modules.profiler import profiled
+from modules.prefetch import get_prefetcher
+from modules.paged_table import paged_table
+from modules.firestore_fanout import fan_out, fan_out_all, FanOutError
+from modules.score_sketch import score_distribution_panel
 import pytz
 from auth import logout_org
-from firebase_admin import firestore
 
 if 'organization' not in st.session_state:
     st.session_state.organization = None
@@ -57,46 +64,40 @@ def todays_total_submissions(data, timezone):
     st.metric(label="You received", value=todays_total_submissions, delta="tests today")
     st.metric(label="from", value=todays_total_users, delta="students")
 
+@profiled("firestore: fetch_submission_data")
 def fetch_submission_data(users_data):
-    """Fetch submission data for users."""
-    submissions = []
-    for user in users_data:
-        user_id = user['User ID']
-        try:
-            submission_ref = db.collection('users').document(user_id).collection('submissions').stream()
-            for submission in submission_ref:
-                sub_data = submission.to_dict()
-                sub_data.update({
-                    'user_id': user_id,
-                    'timestamp': sub_data.get('submit_time'),
-                    'date': sub_data.get('submit_time').date() if sub_data.get('submit_time') else None
-                })
-                submissions.append(sub_data)
-        except Exception as e:
-            st.error(f"Error fetching submissions for user {user_id}: {str(e)}")
-    return pd.DataFrame(submissions)
-
-
-def display_detailed_user_info(user_data):
-    """Display detailed user information with a clickable submission history."""
-    st.subheader("Active Users")
-    df = pd.DataFrame(user_data)
-    
-    selected_user_id = st.selectbox("Select User ID to View Submission History", df['User ID'].tolist())
-    
-    if selected_user_id:
-        st.write(f"Selected User: {selected_user_id}")
-    
-    st.dataframe(df.style.set_properties(**{'text-align': 'left'}), use_container_width=True)
-    
-    return selected_user_id
+    """
+    Fetch submission data for users, querying them concurrently.
+    Returns the submissions and a dict of user ID -> error for users whose query failed.
+    """
+    def user_submissions(user_id):
+        submissions = []
+        for submission in get_db().collection('users').document(user_id).collection('submissions').stream():
+            sub_data = submission.to_dict()
+            sub_data.update({
+                'user_id': user_id,
+                'timestamp': sub_data.get('submit_time'),
+                'date': sub_data.get('submit_time').date() if sub_data.get('submit_time') else None
+            })
+            submissions.append(sub_data)
+        return submissions
+
+    user_ids = [user['User ID'] for user in users_data]
+    results, errors = fan_out({user_id: lambda user_id=user_id: user_submissions(user_id) for user_id in user_ids})
+    # In the users' order, as when they were read one by one
+    submissions = [sub for user_id in user_ids for sub in results.get(user_id, [])]
+    return pd.DataFrame(submissions), errors
+
 
+@profiled("firestore: display_submission_history")
 def display_submission_history(user_id):
+    from google.cloud.firestore import Query
+
     st.subheader(f"Submission History for {user_id}")
     
     try:
-        submissions_ref = db.collection('users').document(user_id).collection('submissions')
-        submissions = submissions_ref.order_by('submit_time', direction=firestore.Query.DESCENDING).stream()
+        submissions_ref = get_db().collection('users').document(user_id).collection('submissions')
+        submissions = submissions_ref.order_by('submit_time', direction=Query.DESCENDING).stream()
 
         university = ""
         program = ""
@@ -127,8 +128,14 @@ def display_submission_history(user_id):
 
 
 
+@profiled("firestore: get_user_data")
+@cached('org_dashboard')
 def get_user_data(org_code):
-    """Fetch user data, calculate metrics, and update user statuses if necessary."""
+    """
+    Fetch user data, calculate metrics, and update user statuses if necessary.
+    Shared between replicas for the org_dashboard TTL, so statuses refresh at most that late.
+    """
+    db = get_db()
     users_ref = db.collection('users').where('org_code', '==', org_code)
     users = users_ref.stream()
     
@@ -137,7 +144,10 @@ def get_user_data(org_code):
     active_users = 0
     user_data = []
     batch = db.batch()  # Initialize Firestore batch for updates
+    updated_user_ids = []
 
+    today = current_date.date()  # Today's date in UTC
+    active = []
     for user in users:
         user_dict = user.to_dict()
         user_id = user.id
@@ -158,36 +168,44 @@ def get_user_data(org_code):
         if status != user_dict.get('status'):
             user_ref = db.collection('users').document(user_id)
             batch.update(user_ref, {'status': status})
+            updated_user_ids.append(user_id)
 
         # Only add active users to the data list
         if status == 'Active':
             active_users += 1
-
-            # Calculate total submissions and today's submissions
-            submission_ref = db.collection('users').document(user_id).collection('submissions').stream()
-            total_submissions = 0
-            todays_submissions = 0
-            today = datetime.now(pytz.utc).date()  # Today's date in UTC
-
-            for submission in submission_ref:
-                sub_data = submission.to_dict()
-                submit_time = sub_data.get('submit_time')
-                if submit_time:
-                    submit_time = submit_time.replace(tzinfo=pytz.utc)
-                    total_submissions += 1
-                    if submit_time.date() == today:
-                        todays_submissions += 1
-
-            user_data.append({
-                'User ID': user_id,
-                'registerAt': register_at.strftime('%Y-%m-%d') if register_at else 'Unknown',
-                'Expiration Date': expiration_date.strftime('%Y-%m-%d') if expiration_date else 'Unknown',
-                'total_submission': total_submissions,
-                'todays_submission': todays_submissions,
-            })
+            active.append((user_id, register_at, expiration_date))
+
+    def count_submissions(user_id):
+        """(total submissions, today's submissions) of one user."""
+        total_submissions = 0
+        todays_submissions = 0
+        for submission in db.collection('users').document(user_id).collection('submissions').stream():
+            submit_time = submission.to_dict().get('submit_time')
+            if submit_time:
+                submit_time = submit_time.replace(tzinfo=pytz.utc)
+                total_submissions += 1
+                if submit_time.date() == today:
+                    todays_submissions += 1
+        return total_submissions, todays_submissions
+
+    # One query per active user, run concurrently. Any failure fails the whole
+    # call, so incomplete counts never reach the shared cache.
+    counts = fan_out_all({user_id: lambda user_id=user_id: count_submissions(user_id) for user_id, _, _ in active})
+
+    for user_id, register_at, expiration_date in active:
+        total_submissions, todays_submissions = counts[user_id]
+        user_data.append({
+            'User ID': user_id,
+            'registerAt': register_at.strftime('%Y-%m-%d') if register_at else 'Unknown',
+            'Expiration Date': expiration_date.strftime('%Y-%m-%d') if expiration_date else 'Unknown',
+            'total_submission': total_submissions,
+            'todays_submission': todays_submissions,
+        })
 
     # Commit all updates to Firestore at once
     batch.commit()
+    for user_id in updated_user_ids:
+        invalidate_user_doc(user_id)
 
     return user_data, registrations_this_month, active_users
 
@@ -234,65 +252,195 @@ def display_full_metrics(registrations_this_month, active_users, todays_submissi
             </div>
             """, unsafe_allow_html=True)
 
+@profiled("render: display_active_users_table")
 def display_active_users_table(user_data):
     st.subheader("Active Users")
-    df = pd.DataFrame(user_data)
-    
-    if df.empty:
-        st.info("No users found.")
-    else:
-        st.dataframe(df.style.set_properties(**{'text-align': 'left'}).highlight_max(subset=['total_submission'], color='#e6f3ff'), use_container_width=True)
+    # Sorted, filtered and paged on the server; only the visible page is styled
+    paged_table(
+        user_data, key="active_users", filter_column='User ID',
+        sort_columns=['User ID', 'registerAt', 'Expiration Date', 'total_submission', 'todays_submission'],
+        highlight_max=['total_submission'], empty_message="No users found."
+    )
+
+
+# Picking a user only reruns this viewer, not the dashboard's data loading
+@st.fragment
+def submission_history_viewer(user_ids):
+    selected_user_id = st.selectbox("Select User ID to View Submission History", user_ids)
+    if selected_user_id:
+        display_submission_history(selected_user_id)
 
 
+@st.fragment
+def essay_search_panel(organization):
+    """Find essays by words or grammar points, e.g. 夏休み or にもかかわらず."""
+    from modules.essay_search import search_essays, MAX_CANDIDATES
+
+    st.subheader("Search Essays")
+    query = st.text_input("Words or phrases (separate several with spaces)", key="essay_search")
+    if not query.strip():
+        return
+
+    try:
+        results, candidates, seconds = search_essays(organization['org_code'], query)
+    except Exception as e:
+        st.error(f"Search failed: {str(e)}")
+        return
+
+    more = "+" if candidates >= MAX_CANDIDATES else ""
+    st.caption(f"{len(results)} shown of {candidates}{more} candidates ({seconds * 1000:.0f} ms in the index)")
+    if not results:
+        st.info("No essays found.")
+        return
+    df = pd.DataFrame(results)[['submitAt', 'user_id', 'snippet']]
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+
+@st.fragment
+def export_panel(organization):
+    """Download every submission of the organization as CSV or Parquet."""
+    import tempfile
+    from modules.export import export_submissions, EXPORT_FIELDS, EXPORT_FORMATS, DEFAULT_MAX_DOWNLOAD_MB
+
+    with st.expander("Export Submissions"):
+        col1, col2 = st.columns(2)
+        start_date = col1.date_input("From", value=None, key="export_start")
+        end_date = col2.date_input("To", value=None, key="export_end")
+        fields = st.multiselect("Fields", EXPORT_FIELDS, default=EXPORT_FIELDS, key="export_fields")
+        fmt = st.radio("Format", EXPORT_FORMATS, horizontal=True, key="export_format")
+
+        if st.button("Prepare Export", key="export") and fields:
+            tz = pytz.timezone(organization['timezone'])
+            start = tz.localize(datetime.combine(start_date, datetime.min.time())) if start_date else None
+            end = tz.localize(datetime.combine(end_date, datetime.max.time())) if end_date else None
+
+            progress = st.empty()
+            file_name = f"{organization['org_code']}_submissions.{fmt}"
+            max_bytes = int(st.secrets.get('export_max_download_mb', DEFAULT_MAX_DOWNLOAD_MB)) * 2 ** 20
+            # The file only lives until its bytes are read, whether or not the export succeeds
+            with tempfile.TemporaryDirectory(prefix="hinotama-export-") as directory:
+                path = os.path.join(directory, file_name)
+                try:
+                    rows, seconds, rate = export_submissions(
+                        organization['org_code'], path, fmt, start, end, fields,
+                        on_progress=lambda n: progress.write(f"{n} rows exported...")
+                    )
+                except Exception as e:
+                    st.error(f"Export failed: {str(e)}")
+                    return
+
+                size = os.path.getsize(path)
+                if size > max_bytes:
+                    progress.error(
+                        f"The export is {size / 2 ** 20:.0f} MB, over the {max_bytes // 2 ** 20} MB download limit. "
+                        f"Choose a shorter date range or fewer fields, or run "
+                        f"`python -m modules.export {organization['org_code']} --out FILE`."
+                    )
+                    return
+                with open(path, 'rb') as f:
+                    data = f.read()
+
+            progress.success(f"Exported {rows} rows in {seconds:.1f}s ({rate:.0f} rows/sec).")
+            st.download_button("Download", data, file_name=file_name, key="export_download")
+
+
+def load_dashboard_data(org_code, full):
+    """Everything the dashboard needs from Firestore, in one call that can run in the background."""
+    user_data, registrations_this_month, active_users = get_user_data(org_code)
+    submissions_df, submission_errors = fetch_submission_data(user_data) if full else (None, {})
+    return user_data, registrations_this_month, active_users, submissions_df, submission_errors
+
+
+def prefetch_dashboard_data(organization):
+    """Start loading (or join the load of) the organization's dashboard data; returns its future."""
+    full = organization.get('full_dashboard', False)
+    return get_prefetcher().submit(
+        ('org_dashboard', organization['org_code'], full), load_dashboard_data, organization['org_code'], full
+    )
+
+
+def wait_for(future, message):
+    """The future's result, or None after showing which queries failed."""
+    try:
+        if not future.done():
+            with st.spinner(message):
+                return future.result()
+        return future.result()
+    except FanOutError as e:
+        show_query_errors(e.errors)
+        return None
 
-def show_org_dashboard(organization):
-    """Basic Organization Dashboard."""
-    apply_custom_css()
-    display_org_header(organization)
-    
-    # Fetch user data and update statuses
-    user_data, registrations_this_month, active_users = get_user_data(organization['org_code'])
 
-    # Display metrics
-    display_metrics(registrations_this_month, active_users)
+def show_query_errors(errors):
+    for user_id, error in errors.items():
+        st.error(f"Error fetching submissions for user {user_id}: {str(error)}")
 
-    # Display user table
-    display_active_users_table(user_data)
 
-    # Logout button
+def logout_button():
     if st.button("Logout", key="logout", help="Click to log out"):
-        logout_message = logout_org()  # No need to manually delete session state here
+        logout_message = logout_org()
         st.success(logout_message)
         st.rerun()
 
+
+@profiled()
+def show_org_dashboard(organization):
+    """Basic Organization Dashboard."""
+    apply_custom_css()
+    display_org_header(organization)
+
+    # Usually already started at login; the rest of the page is drawn while it loads
+    future = prefetch_dashboard_data(organization)
+    data_area = st.container()
+    logout_button()
+
+    with data_area:
+        data = wait_for(future, "Loading your students...")
+        if data is None:
+            return
+        user_data, registrations_this_month, active_users, _, _ = data
+        display_metrics(registrations_this_month, active_users)
+        display_active_users_table(user_data)
+        score_distribution_panel([organization['org_code']], key="org_scores")
+
+@profiled()
 def full_org_dashboard(organization):
     apply_custom_css()
     display_org_header(organization)
-    
-    user_data, registrations_this_month, active_users = get_user_data(organization['org_code'])
-    submissions_df = fetch_submission_data(user_data)
 
-    todays_submissions = len(submissions_df[submissions_df['date'] == datetime.now(pytz.timezone(organization['timezone'])).date()])
-    todays_users = submissions_df[submissions_df['date'] == datetime.now(pytz.timezone(organization['timezone'])).date()]['user_id'].nunique()
+    # Usually already started at login; the parts that don't need it are drawn first
+    future = prefetch_dashboard_data(organization)
+    data_area = st.container()
+    st.markdown("---")
+    export_panel(organization)
+    st.markdown("---")
+    logout_button()
 
-    display_full_metrics(registrations_this_month, active_users, todays_submissions, todays_users)
+    with data_area:
+        data = wait_for(future, "Loading your students and submissions...")
+        if data is None:
+            return
+        user_data, registrations_this_month, active_users, submissions_df, submission_errors = data
+        show_query_errors(submission_errors)
 
-    st.markdown("---")
+        today = datetime.now(pytz.timezone(organization['timezone'])).date()
+        todays_submissions = len(submissions_df[submissions_df['date'] == today])
+        todays_users = submissions_df[submissions_df['date'] == today]['user_id'].nunique()
 
-    display_active_users_table(user_data)
+        display_full_metrics(registrations_this_month, active_users, todays_submissions, todays_users)
 
-    st.markdown("---")
+        st.markdown("---")
 
-    # Create the DataFrame here
-    df = pd.DataFrame(user_data)
+        display_active_users_table(user_data)
 
-    selected_user_id = st.selectbox("Select User ID to View Submission History", df['User ID'].tolist())
-    if selected_user_id:
-        display_submission_history(selected_user_id)
+        st.markdown("---")
 
-    st.markdown("---")
+        score_distribution_panel([organization['org_code']], key="org_scores")
 
-    if st.button("Logout", key="logout", help="Click to log out"):
-        logout_message = logout_org()
-        st.success(logout_message)
-        st.rerun()
\ No newline at end of file
+        st.markdown("---")
+
+        essay_search_panel(organization)
+
+        st.markdown("---")
+
+        submission_history_viewer([user['User ID'] for user in user_data])
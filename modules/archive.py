@@ -0,0 +1,167 @@
+import argparse
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from modules.resources import get_db
+from modules.shared_cache import get_shared_cache
+
+# Cold storage for old submission bodies. Archiving moves the large fields of
+# a submission (essay, feedback, per-paragraph feedback) into a zstd-compressed
+# blob in `submission_archive/{submission_id}`; the hot document keeps its
+# metadata and score plus `archived: true`. Scans that only need metadata
+# (dashboards, counts, scores) then never download the bodies, and
+# hydrate_submission() puts them back when one submission is opened.
+#
+# Blobs can be compressed with a shared dictionary trained on our own essays
+# (`archive_dictionaries/{id}`), which helps a lot with short Japanese texts.
+#
+#   python -m modules.archive --days 180 --train-dictionary
+
+ARCHIVED_FIELDS = ['submission_text', 'feedback_text', 'paragraphs']
+ARCHIVE_COLLECTION = 'submission_archive'
+DICTIONARY_COLLECTION = 'archive_dictionaries'
+DEFAULT_ARCHIVE_DAYS = 180
+ZSTD_LEVEL = 19
+DICTIONARY_SIZE = 64 * 1024
+DICTIONARY_SAMPLES = 2000
+# Two writes per submission, under Firestore's 500 writes per batch
+ARCHIVE_BATCH_SIZE = 200
+
+
+def encode_body(body):
+    return json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def train_dictionary(bodies, size=DICTIONARY_SIZE):
+    """A zstd dictionary trained on a sample of submission bodies."""
+    import zstandard
+
+    samples = [encode_body(body) for body in bodies]
+    return zstandard.train_dictionary(size, samples).as_bytes()
+
+
+def compress_body(body, dictionary=None):
+    import zstandard
+
+    options = {'dict_data': zstandard.ZstdCompressionDict(dictionary)} if dictionary else {}
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL, **options).compress(encode_body(body))
+
+
+def decompress_body(blob, dictionary=None):
+    import zstandard
+
+    options = {'dict_data': zstandard.ZstdCompressionDict(dictionary)} if dictionary else {}
+    return json.loads(zstandard.ZstdDecompressor(**options).decompress(blob))
+
+
+def load_dictionary(dictionary_id):
+    """Dictionary bytes by id; they never change, so they are cached for a long time."""
+    def fetch():
+        snapshot = get_db().collection(DICTIONARY_COLLECTION).document(dictionary_id).get()
+        return snapshot.to_dict()['data'] if snapshot.exists else None
+
+    return get_shared_cache().get_or_compute('archive', ('dictionary', dictionary_id), fetch)
+
+
+def save_dictionary(dictionary):
+    dictionary_id = datetime.now(timezone.utc).strftime('ja-%Y%m%d-%H%M%S')
+    get_db().collection(DICTIONARY_COLLECTION).document(dictionary_id).set({
+        'data': dictionary,
+        'created_at': datetime.now(timezone.utc),
+        'size': len(dictionary),
+    })
+    return dictionary_id
+
+
+def hydrate_submission(submission):
+    """The submission with its archived body restored; non-archived submissions are returned as they are."""
+    if not submission.get('archived'):
+        return submission
+
+    def fetch():
+        snapshot = get_db().collection(ARCHIVE_COLLECTION).document(submission['submission_id']).get()
+        if not snapshot.exists:
+            return {}
+        blob = snapshot.to_dict()
+        dictionary = load_dictionary(blob['dictionary_id']) if blob.get('dictionary_id') else None
+        return decompress_body(blob['data'], dictionary)
+
+    body = get_shared_cache().get_or_compute('archive', ('body', submission['submission_id']), fetch)
+    return {**submission, **body}
+
+
+def archive_old_submissions(days=DEFAULT_ARCHIVE_DAYS, dictionary_id=None, batch_size=ARCHIVE_BATCH_SIZE,
+                            on_progress=None):
+    """
+    Move the bodies of submissions older than `days` into compressed blobs.
+    Returns (submissions archived, body bytes before, blob bytes after).
+    """
+    from google.cloud.firestore import DELETE_FIELD
+
+    db = get_db()
+    dictionary = load_dictionary(dictionary_id) if dictionary_id else None
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    query = db.collection('submissions').where('submitAt', '<', cutoff)
+
+    archived = raw_bytes = blob_bytes = 0
+    batch, pending = db.batch(), 0
+    for snapshot in query.stream():
+        submission = snapshot.to_dict()
+        if submission.get('archived'):
+            continue
+        body = {field: submission[field] for field in ARCHIVED_FIELDS if field in submission}
+        blob = compress_body(body, dictionary)
+
+        batch.set(db.collection(ARCHIVE_COLLECTION).document(snapshot.id), {
+            'data': blob,
+            'dictionary_id': dictionary_id,
+            'archived_at': datetime.now(timezone.utc),
+        })
+        batch.update(snapshot.reference, {
+            'archived': True,
+            'body_chars': len(body.get('submission_text') or ''),
+            **{field: DELETE_FIELD for field in body},
+        })
+        archived += 1
+        raw_bytes += len(encode_body(body))
+        blob_bytes += len(blob)
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch, pending = db.batch(), 0
+            if on_progress:
+                on_progress(archived)
+    if pending:
+        batch.commit()
+    return archived, raw_bytes, blob_bytes
+
+
+def sample_bodies(limit=DICTIONARY_SAMPLES):
+    """Bodies of recent (still hot) submissions, to train a dictionary on."""
+    docs = get_db().collection('submissions').select(ARCHIVED_FIELDS).limit(limit * 2).stream()
+    bodies = [{k: v for k, v in doc.to_dict().items() if k in ARCHIVED_FIELDS} for doc in docs]
+    bodies = [body for body in bodies if body.get('submission_text')]
+    return random.sample(bodies, min(limit, len(bodies)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive the bodies of old submissions.")
+    parser.add_argument("--days", type=int, default=DEFAULT_ARCHIVE_DAYS)
+    parser.add_argument("--dictionary", help="ID of a dictionary in archive_dictionaries")
+    parser.add_argument("--train-dictionary", action="store_true", help="Train and store a new dictionary first")
+    args = parser.parse_args()
+
+    dictionary_id = args.dictionary
+    if args.train_dictionary:
+        dictionary_id = save_dictionary(train_dictionary(sample_bodies()))
+        print(f"Trained dictionary {dictionary_id}")
+
+    archived, raw_bytes, blob_bytes = archive_old_submissions(
+        args.days, dictionary_id, on_progress=lambda n: print(f"\r{n} archived", end="", flush=True)
+    )
+    ratio = raw_bytes / blob_bytes if blob_bytes else 0
+    print(f"\r{archived} submissions archived: {raw_bytes} -> {blob_bytes} bytes ({ratio:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
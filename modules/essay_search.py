@@ -0,0 +1,457 @@
+import streamlit as st
+import argparse
+import json
+import struct
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+from datetime import datetime, timezone
+from modules.resources import get_db
+from modules.profiler import profiled
+from modules.prefetch import get_prefetcher
+
+# Full-text search over an organization's essays. Japanese has no spaces to
+# split words on, so the index is over character bigrams: "夏休み" is found
+# through the documents containing both "夏休" and "休み", and the few
+# candidates shown are then checked against their text. Single characters
+# are indexed too, for one-character queries.
+#
+# Indexing is incremental. save_submission adds each essay to
+# `search_pending` (one small doc with its text); once an organization has
+# SEGMENT_DOCS pending essays they are sealed, in a transaction on the
+# prefetch pool, into an immutable segment in
+# `search_segments/{org_code}_{generation}_{n}`. A segment is one blob: a
+# table of its essays and, per gram, a posting list of essay numbers stored
+# as varint-encoded gaps. `search_index/{org_code}` counts segments and
+# pending essays.
+#
+# A rebuild writes a new generation of segments next to the current one and
+# then switches the index doc over in one transaction. Pending essays saved
+# before the rebuild started (`rebuilt_at`) are in the new segments and are
+# ignored; the ones saved since are counted afresh. No segment is sealed
+# while a rebuild is running.
+#
+# Each process keeps the segments it has read in memory and on every search
+# only reads what changed since: new segments, and the pending essays if
+# any were added. A new generation drops everything it had read.
+#
+# Pending essays are queried by org_code ordered by submitAt, which needs a
+# composite index on search_pending (org_code ASC, submitAt ASC).
+#
+#   python -m modules.essay_search ORG_CODE --rebuild   # index existing submissions
+
+INDEX_COLLECTION = 'search_index'
+SEGMENT_COLLECTION = 'search_segments'
+PENDING_COLLECTION = 'search_pending'
+# Under Firestore's 500 writes per transaction (one delete per pending essay)
+SEGMENT_DOCS = 400
+# Firestore documents are limited to 1 MiB; larger segments are split
+MAX_SEGMENT_BYTES = 900 * 1024
+MAX_RESULTS = 20
+# Candidates looked at per search; the count shown is capped there
+MAX_CANDIDATES = 200
+SNIPPET_CHARS = 30
+
+
+def normalize(text):
+    """NFKC (full-width ASCII and half-width kana folded) and lower case."""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def bigrams(text):
+    text = normalize(text)
+    return {text[i:i + 2] for i in range(len(text) - 1) if not (text[i].isspace() or text[i + 1].isspace())}
+
+
+def index_grams(text):
+    """What an essay is indexed under: its bigrams, and its characters for one-character queries."""
+    return bigrams(text) | {char for char in normalize(text) if not char.isspace()}
+
+
+def term_grams(term):
+    return {term} if len(term) == 1 else bigrams(term)
+
+
+def encode_postings(numbers):
+    """Sorted essay numbers as LEB128 varints of the gaps between them."""
+    out, previous = bytearray(), -1
+    for number in numbers:
+        gap = number - previous - 1
+        previous = number
+        while gap >= 0x80:
+            out.append(gap & 0x7f | 0x80)
+            gap >>= 7
+        out.append(gap)
+    return bytes(out)
+
+
+def decode_postings(data):
+    numbers, previous, gap, shift = [], -1, 0, 0
+    for byte in data:
+        gap |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += gap + 1
+        numbers.append(previous)
+        gap, shift = 0, 0
+    return numbers
+
+
+class Segment:
+    """
+    Essays with numbers 0..n-1 and the posting list of every gram in them.
+    The grams are one sorted string, two characters per gram (single
+    characters padded with NUL), with their offsets into the postings in an
+    array: far smaller in memory than a dict when a process holds hundreds
+    of segments.
+    """
+
+    def __init__(self, docs, grams, offsets, postings, texts=None):
+        self.docs = docs          # [[submission_id, user_id, submitAt ISO string], ...]
+        self.grams = grams
+        self.offsets = offsets    # array('I'); gram i's postings are postings[offsets[i]:offsets[i + 1]]
+        self.postings = postings
+        self.texts = texts        # normalized texts, kept only for pending essays
+
+    @classmethod
+    def build(cls, essays, keep_texts=False):
+        """`essays`: dicts with submission_id, user_id, submitAt and text."""
+        lists = {}
+        for number, essay in enumerate(essays):
+            for gram in index_grams(essay['text']):
+                lists.setdefault(gram.ljust(2, '\0'), []).append(number)
+        grams = sorted(lists)
+        offsets, postings = array('I', [0]), bytearray()
+        for gram in grams:
+            postings += encode_postings(lists[gram])
+            offsets.append(len(postings))
+        docs = [[e['submission_id'], e['user_id'], submit_iso(e.get('submitAt'))] for e in essays]
+        texts = [normalize(e['text']) for e in essays] if keep_texts else None
+        return cls(docs, "".join(grams), offsets, bytes(postings), texts)
+
+    def to_blob(self):
+        header = json.dumps({'docs': self.docs, 'grams': self.grams}, ensure_ascii=False).encode('utf-8')
+        offsets = array('I', self.offsets)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        offsets = offsets.tobytes()
+        return zlib.compress(struct.pack('<II', len(header), len(offsets)) + header + offsets + self.postings, 6)
+
+    @classmethod
+    def from_blob(cls, blob):
+        data = zlib.decompress(blob)
+        header_length, offsets_length = struct.unpack('<II', data[:8])
+        header = json.loads(data[8:8 + header_length])
+        offsets = array('I')
+        offsets.frombytes(data[8 + header_length:8 + header_length + offsets_length])
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        return cls(header['docs'], header['grams'], offsets, data[8 + header_length + offsets_length:])
+
+    def lookup(self, gram):
+        key = gram.ljust(2, '\0')
+        low, high = 0, len(self.grams) // 2
+        while low < high:
+            middle = (low + high) // 2
+            if self.grams[2 * middle:2 * middle + 2] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(self.grams) // 2 or self.grams[2 * low:2 * low + 2] != key:
+            return []
+        return decode_postings(self.postings[self.offsets[low]:self.offsets[low + 1]])
+
+    def search(self, terms):
+        """Numbers of the essays that have every gram of every term."""
+        lists = sorted((self.lookup(gram) for term in terms for gram in term_grams(term)), key=len)
+        if not lists or not lists[0]:
+            return []
+        # Shortest list first, so the intersection only ever shrinks
+        result = set(lists[0])
+        for numbers in lists[1:]:
+            result.intersection_update(numbers)
+            if not result:
+                break
+        return sorted(result)
+
+
+def submit_iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def query_terms(query):
+    return [term for term in normalize(query).split() if term]
+
+
+def segment_ref(org_code, generation, number):
+    return get_db().collection(SEGMENT_COLLECTION).document(f"{org_code}_{generation}_{number:06d}")
+
+
+def pending_query(org_code, rebuilt_at=None):
+    """The organization's pending essays, oldest first; those from before its last rebuild are in segments."""
+    query = get_db().collection(PENDING_COLLECTION).where('org_code', '==', org_code)
+    if rebuilt_at:
+        query = query.where('submitAt', '>=', rebuilt_at)
+    return query.order_by('submitAt')
+
+
+def index_submission(org_code, submission_id, user_id, text, submit_at=None):
+    """Queue one essay for its organization's index, sealing segments in the background when enough are queued."""
+    from google.cloud.firestore import Increment
+
+    db = get_db()
+    index_ref = db.collection(INDEX_COLLECTION).document(org_code)
+    batch = db.batch()
+    batch.set(db.collection(PENDING_COLLECTION).document(submission_id), {
+        'org_code': org_code,
+        'submission_id': submission_id,
+        'user_id': user_id,
+        'submitAt': submit_at or datetime.now(timezone.utc),
+        'text': text,
+    })
+    batch.set(index_ref, {'pending': Increment(1), 'version': Increment(1)}, merge=True)
+    batch.commit()
+
+    index = index_ref.get().to_dict() or {}
+    if index.get('pending', 0) >= SEGMENT_DOCS:
+        # Sealing reads and compresses a whole segment of essays; the student doesn't wait for it.
+        # Saves that see the same segment count join one job instead of each starting their own
+        get_prefetcher().submit(('seal_segments', org_code, index.get('segments', 0)), seal_pending, org_code)
+
+
+def seal_pending(org_code):
+    """Seal segments until fewer than SEGMENT_DOCS essays are pending. Returns how many were sealed."""
+    sealed = total = seal_segment(org_code)
+    while sealed:
+        sealed = seal_segment(org_code)
+        total += sealed
+    return total
+
+
+def seal_segment(org_code):
+    """Turn the oldest pending essays into a new segment. Returns how many were sealed."""
+    from google.cloud import firestore
+
+    db = get_db()
+    index_ref = db.collection(INDEX_COLLECTION).document(org_code)
+
+    @firestore.transactional
+    def seal(transaction):
+        index = index_ref.get(transaction=transaction).to_dict() or {}
+        if index.get('rebuilding') or index.get('pending', 0) < SEGMENT_DOCS:
+            return 0  # Another replica sealed them first, or a rebuild will index them
+        query = pending_query(org_code, index.get('rebuilt_at')).limit(SEGMENT_DOCS)
+        pending = list(query.stream(transaction=transaction))
+        essays = [doc.to_dict() for doc in pending]
+        blob = Segment.build(essays).to_blob()
+        while len(blob) > MAX_SEGMENT_BYTES and len(essays) > 1:
+            essays = essays[:len(essays) // 2]
+            blob = Segment.build(essays).to_blob()
+
+        number, generation = index.get('segments', 0), index.get('generation', 0)
+        transaction.set(segment_ref(org_code, generation, number), {
+            'org_code': org_code, 'generation': generation, 'data': blob, 'docs': len(essays),
+            'created_at': datetime.now(timezone.utc)
+        })
+        for doc in pending[:len(essays)]:
+            transaction.delete(doc.reference)
+        transaction.update(index_ref, {
+            'segments': number + 1,
+            'pending': index['pending'] - len(essays),
+            'version': index.get('version', 0) + 1,
+        })
+        return len(essays)
+
+    return seal(db.transaction())
+
+
+class OrgIndex:
+    """What one process has read of an organization's index."""
+
+    def __init__(self, org_code):
+        self.org_code = org_code
+        self.segments = []
+        self.pending = Segment([], '', array('I', [0]), b'', [])
+        self.version = None
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        index = get_db().collection(INDEX_COLLECTION).document(self.org_code).get().to_dict() or {}
+        generation = index.get('generation', 0)
+        if generation != self.generation:
+            self.segments, self.version, self.generation = [], None, generation
+        for number in range(len(self.segments), index.get('segments', 0)):
+            snapshot = segment_ref(self.org_code, generation, number).get()
+            if not snapshot.exists:
+                # Rebuilt since the index doc was read; start over from the new generation
+                self.generation = None
+                return self.refresh()
+            self.segments.append(Segment.from_blob(snapshot.to_dict()['data']))
+        if index.get('version') != self.version:
+            essays = [doc.to_dict() for doc in pending_query(self.org_code, index.get('rebuilt_at')).stream()]
+            self.pending = Segment.build(essays, keep_texts=True)
+            self.version = index.get('version')
+
+    def search(self, terms, limit=None):
+        """
+        Candidate essays, newest first, as [submission_id, user_id, submitAt]
+        rows. With a limit, older segments aren't searched once it is reached.
+        """
+        hits = []
+        for number in reversed(self.pending.search(terms)):
+            # Pending essays keep their text, so false positives are dropped right away
+            if all(term in self.pending.texts[number] for term in terms):
+                hits.append(self.pending.docs[number])
+        # An essay saved as a rebuild started can be both pending and in a segment
+        pending = {doc[0] for doc in self.pending.docs}
+        for segment in reversed(self.segments):
+            if limit and len(hits) >= limit:
+                return hits[:limit]
+            hits.extend(segment.docs[number] for number in reversed(segment.search(terms))
+                        if segment.docs[number][0] not in pending)
+        return hits[:limit] if limit else hits
+
+
+@st.cache_resource
+def get_org_indexes():
+    return {}, threading.Lock()
+
+
+def get_org_index(org_code):
+    indexes, lock = get_org_indexes()
+    with lock:
+        return indexes.setdefault(org_code, OrgIndex(org_code))
+
+
+@profiled("firestore: search_essays")
+def search_essays(org_code, query, limit=MAX_RESULTS):
+    """
+    Essays of the organization containing every term of `query`.
+    Returns (results, candidates, seconds): up to `limit` results, newest
+    first, each with a snippet; the number of index candidates, at most
+    MAX_CANDIDATES; and the time the in-memory query took.
+    """
+    from modules.archive import hydrate_submission
+
+    terms = query_terms(query)
+    if not terms:
+        return [], 0, 0.0
+    index = get_org_index(org_code)
+    with index.lock:
+        index.refresh()
+        start = time.perf_counter()
+        candidates = index.search(terms, MAX_CANDIDATES)
+        seconds = time.perf_counter() - start
+
+    # Bigrams can match where the term itself doesn't, so the candidates
+    # shown are checked against their text
+    results = []
+    db = get_db()
+    for first in range(0, len(candidates), limit):
+        refs = [db.collection('submissions').document(c[0]) for c in candidates[first:first + limit]]
+        snapshots = {s.id: s for s in db.get_all(refs)}
+        for submission_id, user_id, submit_at in candidates[first:first + limit]:
+            snapshot = snapshots.get(submission_id)
+            if snapshot is None or not snapshot.exists:
+                continue
+            text = hydrate_submission(snapshot.to_dict()).get('submission_text') or ''
+            normalized = normalize(text)
+            if all(term in normalized for term in terms):
+                results.append({'user_id': user_id, 'submitAt': submit_at,
+                                'snippet': snippet(text, normalized, terms[0]), 'submission_id': submission_id})
+                if len(results) == limit:
+                    return results, len(candidates), seconds
+    return results, len(candidates), seconds
+
+
+def snippet(text, normalized, term):
+    # NFKC rarely changes lengths for Japanese text, so positions line up closely enough
+    position = normalized.find(term)
+    start = max(0, position - SNIPPET_CHARS)
+    end = position + len(term) + SNIPPET_CHARS
+    return ('…' if start else '') + text[start:end].replace('\n', ' ') + ('…' if end < len(text) else '')
+
+
+def rebuild_index(org_code):
+    """
+    Index every existing submission of the organization from scratch, as a
+    new generation of segments. Saves can go on meanwhile. Returns (essays, segments).
+    """
+    from google.cloud import firestore
+    from modules.export import iter_submission_pages
+
+    db = get_db()
+    index_ref = db.collection(INDEX_COLLECTION).document(org_code)
+
+    @firestore.transactional
+    def start(transaction):
+        # Waits out (or makes retry) a seal in progress; none start until the switch
+        index = index_ref.get(transaction=transaction).to_dict() or {}
+        transaction.set(index_ref, {'rebuilding': True}, merge=True)
+        return index.get('generation', 0) + 1, datetime.now(timezone.utc)
+
+    generation, rebuilt_at = start(db.transaction())
+
+    # Essays saved from here on stay pending
+    essays = []
+    fields = ['submission_id', 'user_id', 'submitAt', 'submission_text']
+    for page in iter_submission_pages(org_code, end=rebuilt_at, fields=fields):
+        essays.extend({**s, 'text': s.get('submission_text') or ''} for s in page)
+    essays.sort(key=lambda e: submit_iso(e.get('submitAt')) or '')
+
+    number, first = 0, 0
+    while first < len(essays):
+        chunk = essays[first:first + SEGMENT_DOCS]
+        blob = Segment.build(chunk).to_blob()
+        while len(blob) > MAX_SEGMENT_BYTES and len(chunk) > 1:
+            chunk = chunk[:len(chunk) // 2]
+            blob = Segment.build(chunk).to_blob()
+        segment_ref(org_code, generation, number).set({
+            'org_code': org_code, 'generation': generation, 'data': blob, 'docs': len(chunk),
+            'created_at': datetime.now(timezone.utc)
+        })
+        number += 1
+        first += len(chunk)
+
+    @firestore.transactional
+    def switch(transaction):
+        # Reading the index doc makes a save committing meanwhile retry this count
+        index = index_ref.get(transaction=transaction).to_dict() or {}
+        pending = sum(1 for _ in pending_query(org_code, rebuilt_at).stream(transaction=transaction))
+        transaction.set(index_ref, {
+            'generation': generation, 'segments': number, 'pending': pending,
+            'version': index.get('version', 0) + 1, 'rebuilt_at': rebuilt_at,
+        })
+
+    switch(db.transaction())
+
+    # Other processes move to the new generation on their next search
+    for doc in db.collection(SEGMENT_COLLECTION).where('org_code', '==', org_code).select(['generation']).stream():
+        if (doc.to_dict() or {}).get('generation') != generation:
+            doc.reference.delete()
+    for doc in db.collection(PENDING_COLLECTION).where('org_code', '==', org_code).where('submitAt', '<', rebuilt_at).stream():
+        doc.reference.delete()
+
+    indexes, lock = get_org_indexes()
+    with lock:
+        indexes.pop(org_code, None)
+    return len(essays), number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text index of an organization's essays.")
+    parser.add_argument("org_code")
+    parser.add_argument("--rebuild", action="store_true", help="Index all existing submissions from scratch")
+    args = parser.parse_args()
+    if args.rebuild:
+        essays, segments = rebuild_index(args.org_code)
+        print(f"Indexed {essays} essays in {segments} segments")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import csv
+import json
+import time
+from datetime import datetime, date
+from modules.resources import get_db
+from modules.archive import ARCHIVED_FIELDS, hydrate_submission
+
+# Streaming export of an organization's submissions. Documents are read in
+# cursor-paginated pages and each page is written out before the next one is
+# fetched, so memory use depends on the page size, not on the organization.
+#
+# Filtering on user_id together with a submitAt range needs a composite index
+# on submissions (user_id ASC, submitAt ASC).
+
+EXPORT_FIELDS = ['submission_id', 'user_id', 'submitAt', 'score', 'submission_text', 'feedback_text']
+EXPORT_FORMATS = ['csv', 'parquet']
+EXPORT_PAGE_SIZE = 500
+# Firestore allows at most 30 values in an 'in' filter
+IN_QUERY_LIMIT = 30
+# Largest file the dashboard offers as a download; bigger exports go through the CLI below
+DEFAULT_MAX_DOWNLOAD_MB = 50
+
+
+def org_user_ids(org_code):
+    """IDs of every user in the organization, active or not."""
+    users = get_db().collection('users').where('org_code', '==', org_code).select([]).stream()
+    return [user.id for user in users]
+
+
+def iter_submission_pages(org_code, start=None, end=None, fields=EXPORT_FIELDS, page_size=EXPORT_PAGE_SIZE):
+    """Yield lists of submission dicts for the organization, one page at a time."""
+    from google.cloud.firestore import Query
+
+    submissions_ref = get_db().collection('submissions')
+    user_ids = org_user_ids(org_code)
+    # Archived submissions keep their bodies out of line; fetch them only when asked for
+    needs_bodies = bool(set(fields) & set(ARCHIVED_FIELDS))
+    projection = sorted(set(fields) | {'submitAt'} | ({'archived', 'submission_id'} if needs_bodies else set()))
+
+    for i in range(0, len(user_ids), IN_QUERY_LIMIT):
+        query = submissions_ref.where('user_id', 'in', user_ids[i:i + IN_QUERY_LIMIT])
+        if start:
+            query = query.where('submitAt', '>=', start)
+        if end:
+            query = query.where('submitAt', '<=', end)
+        query = query.order_by('submitAt', direction=Query.ASCENDING).select(projection).limit(page_size)
+
+        last = None
+        while True:
+            page_query = query.start_after(last) if last is not None else query
+            docs = list(page_query.stream())
+            if not docs:
+                break
+            rows = (doc.to_dict() for doc in docs)
+            if needs_bodies:
+                rows = (hydrate_submission(data) for data in rows)
+            yield [{field: data.get(field) for field in fields} for data in rows]
+            if len(docs) < page_size:
+                break
+            last = docs[-1]
+
+
+def to_cell(value):
+    """Flatten Firestore values into something CSV/Parquet can hold."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+class CsvSink:
+    def __init__(self, path, fields):
+        self.file = open(path, 'w', newline='', encoding='utf-8-sig')  # BOM so Excel reads Japanese
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(fields)
+        self.fields = fields
+
+    def write(self, rows):
+        for row in rows:
+            value = [to_cell(row[field]) for field in self.fields]
+            self.writer.writerow([v.isoformat() if isinstance(v, (datetime, date)) else v for v in value])
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """Writes each page as one Parquet row group."""
+
+    def __init__(self, path, fields):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {'submitAt': pa.timestamp('us', tz='UTC'), 'score': pa.float64()}
+        self.pa = pa
+        self.fields = fields
+        self.schema = pa.schema([(field, types.get(field, pa.string())) for field in fields])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        columns = {}
+        for field in self.fields:
+            values = [to_cell(row[field]) for row in rows]
+            if self.schema.field(field).type == self.pa.string():
+                values = [None if v is None else str(v) for v in values]
+            columns[field] = values
+        self.writer.write_table(self.pa.table(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def export_submissions(org_code, path, fmt='csv', start=None, end=None, fields=EXPORT_FIELDS,
+                       page_size=EXPORT_PAGE_SIZE, on_progress=None):
+    """
+    Stream the organization's submissions into a CSV or Parquet file at `path`.
+    Returns (rows, seconds, rows_per_second).
+    """
+    sink = (ParquetSink if fmt == 'parquet' else CsvSink)(path, list(fields))
+    rows = 0
+    started = time.perf_counter()
+    try:
+        for page in iter_submission_pages(org_code, start, end, fields, page_size):
+            sink.write(page)
+            rows += len(page)
+            if on_progress:
+                on_progress(rows)
+    finally:
+        sink.close()
+    seconds = time.perf_counter() - started
+    return rows, seconds, rows / seconds if seconds else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export an organization's submissions.")
+    parser.add_argument("org_code")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="e.g. 2024-09-01")
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    parser.add_argument("--fields", nargs="+", default=EXPORT_FIELDS)
+    parser.add_argument("--page-size", type=int, default=EXPORT_PAGE_SIZE)
+    args = parser.parse_args()
+
+    rows, seconds, rate = export_submissions(
+        args.org_code, args.out, args.format, args.start, args.end, args.fields, args.page_size,
+        on_progress=lambda n: print(f"\r{n} rows", end="", flush=True)
+    )
+    print(f"\r{rows} rows in {seconds:.1f}s ({rate:.0f} rows/sec) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import streamlit as st
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Runs independent Firestore queries concurrently, so a dashboard waits about
+# as long as its slowest query instead of the sum of all of them. Each call
+# gets its own bounded pool, and a process-wide semaphore caps how many
+# queries all sessions together have in flight, so one large organization
+# can't take every connection:
+#
+#   firestore_concurrency = 16     # per call
+#   firestore_max_in_flight = 64   # per process
+#
+# Failures are reported per query rather than stopping the others.
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_MAX_IN_FLIGHT = 64
+
+
+class FanOutError(Exception):
+    """Some of the queries of a fan-out failed; `errors` maps each query's name to its exception."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(f"{name}: {error}" for name, error in errors.items()))
+
+
+@st.cache_resource
+def get_in_flight_limit():
+    return threading.BoundedSemaphore(int(st.secrets.get('firestore_max_in_flight', DEFAULT_MAX_IN_FLIGHT)))
+
+
+def fan_out(queries, concurrency=None, in_flight=None):
+    """
+    Run `queries` (a dict of name -> zero-argument callable) concurrently.
+    Returns (results, errors), both dicts keyed by query name.
+    """
+    if not queries:
+        return {}, {}
+    concurrency = concurrency or int(st.secrets.get('firestore_concurrency', DEFAULT_CONCURRENCY))
+    in_flight = in_flight or get_in_flight_limit()
+
+    def run(query):
+        with in_flight:
+            return query()
+
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(queries)), thread_name_prefix="firestore") as pool:
+        futures = {pool.submit(run, query): name for name, query in queries.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+    return results, errors
+
+
+def fan_out_all(queries, concurrency=None, in_flight=None):
+    """Like fan_out, but every query must succeed: returns the results or raises FanOutError."""
+    results, errors = fan_out(queries, concurrency, in_flight)
+    if errors:
+        raise FanOutError(errors)
+    return results
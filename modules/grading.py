@@ -0,0 +1,300 @@
+import streamlit as st
+import hashlib
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from modules.resources import get_db
+from modules.profile_cache import get_user_doc
+from modules.modules import extract_score_from_feedback
+from modules.shared_cache import get_shared_cache
+from modules.run_supervisor import current_owner, get_run_supervisor
+from modules.archive import hydrate_submission
+
+# A first submission is graded in one request, as a whole. Resubmissions of
+# multi-paragraph essays are graded paragraph by paragraph, so only the
+# paragraphs that changed since the student's previous submission (plus a
+# short overall-score pass) go to the model; feedback for unchanged
+# paragraphs is reused from that submission. The first resubmission has no
+# paragraph feedback to reuse yet and grades every paragraph.
+#
+# Long essays are always graded by paragraph, concurrently, together with the
+# score pass. Requests have a fixed overhead, so short neighbouring
+# paragraphs are graded together in units of SEGMENT_MIN_CHARS to
+# SEGMENT_MAX_CHARS, and paragraphs over SEGMENT_MAX_CHARS are split at
+# sentence boundaries so no single request dominates the wall-clock time.
+LONG_ESSAY_CHARS = 2000
+SEGMENT_MIN_CHARS = 300
+SEGMENT_MAX_CHARS = 600
+DEFAULT_GRADING_PARALLELISM = 4
+
+UNIT_PROMPT = (
+    "次の文章は作文の一部（{label}）です。"
+    "この部分だけを添削してください。スコアは書かないでください。\n\n{text}"
+)
+# Any line with a score on it, in the forms extract_score_from_feedback accepts
+SCORE_LINE = re.compile(r'^.*スコア:?\s*\*?\*?\s*\d+(\.\d+)?.*(\n|$)', re.MULTILINE)
+SCORE_PROMPT = (
+    "次の作文全体を評価し、総合点だけを「スコア: <0〜100の数字>」の形式で一行で答えてください。"
+    "添削やコメントは不要です。\n\n{essay}"
+)
+
+
+def strip_score_lines(feedback):
+    """Feedback without any スコア line, so a section can't carry a score into the report."""
+    return SCORE_LINE.sub('', feedback).strip()
+
+
+def split_paragraphs(text):
+    """Split an essay into non-empty paragraphs (one per line block)."""
+    return [p.strip() for p in re.split(r'\n+', text) if p.strip()]
+
+
+def split_sentences(text):
+    """Split Japanese text after sentence-ending punctuation, keeping closing quotes."""
+    return [s for s in re.findall(r'.+?(?:[。！？!?][」』）)]*|$)', text) if s.strip()]
+
+
+def split_long_paragraph(paragraph, max_chars=SEGMENT_MAX_CHARS):
+    """Group the sentences of a paragraph into segments of at most `max_chars` (where possible)."""
+    segments, current = [], ""
+    for sentence in split_sentences(paragraph):
+        if current and len(current) + len(sentence) > max_chars:
+            segments.append(current)
+            current = ""
+        current += sentence
+    if current:
+        segments.append(current)
+    return segments
+
+
+def ends_unit(paragraph):
+    """
+    Whether a unit of at least SEGMENT_MIN_CHARS may end after this paragraph.
+    Decided by the paragraph's own text (about one in two), not by a running
+    length, so after an edit the grouping falls back into step at the next
+    such paragraph instead of shifting to the end of the essay.
+    """
+    return int(text_hash(paragraph)[:8], 16) % 2 == 0
+
+
+def unit_label(first, last):
+    return f"第{first}段落" if first == last else f"第{first}〜{last}段落"
+
+
+def split_units(text):
+    """
+    The pieces an essay is graded in, as (label, text) pairs. A paragraph over
+    SEGMENT_MAX_CHARS is split by its own sentences; shorter neighbouring
+    paragraphs are grouped up to SEGMENT_MAX_CHARS. Where a group ends only
+    depends on the paragraphs around it, so an edit regrades the unit it is
+    in and at most the few after it, whatever the essay's length.
+    """
+    units, group, first = [], [], None
+
+    def close(last):
+        if group:
+            units.append((unit_label(first, last), "\n".join(group)))
+            group.clear()
+
+    paragraphs = split_paragraphs(text)
+    for number, paragraph in enumerate(paragraphs, start=1):
+        if len(paragraph) > SEGMENT_MAX_CHARS:
+            close(number - 1)
+            segments = split_long_paragraph(paragraph)
+            for part, segment in enumerate(segments, start=1):
+                label = f"第{number}段落" if len(segments) == 1 else f"第{number}段落 {part}/{len(segments)}"
+                units.append((label, segment))
+            continue
+        if group and sum(map(len, group)) + len(paragraph) > SEGMENT_MAX_CHARS:
+            close(number - 1)
+        if not group:
+            first = number
+        group.append(paragraph)
+        if sum(map(len, group)) >= SEGMENT_MIN_CHARS and ends_unit(paragraph):
+            close(number)
+    close(len(paragraphs))
+    return units
+
+
+def result_or_first_failure(future, futures):
+    """The result of `future`, raising as soon as any of `futures` fails."""
+    while True:
+        failed = next((f for f in futures if f.done() and f.exception() is not None), None)
+        if failed is not None:
+            raise failed.exception()
+        if future.done():
+            return future.result()
+        wait([f for f in futures if not f.done()], return_when=FIRST_COMPLETED)
+
+
+def get_grading_parallelism():
+    return int(st.secrets.get("grading_parallelism", DEFAULT_GRADING_PARALLELISM))
+
+
+def text_hash(text):
+    return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()
+
+
+def load_previous_grading(user_id):
+    """
+    The grading record of the student's latest submission, or None.
+    Kept in session state after each grade; otherwise read from Firestore.
+    """
+    last_grading = st.session_state.get('last_grading')
+    if last_grading and last_grading['user_id'] == user_id:
+        return last_grading
+
+    user_doc = get_user_doc(user_id) or {}
+    submission_id = user_doc.get('last_submission_id')
+    if not submission_id:
+        return None
+
+    snapshot = get_db().collection('submissions').document(submission_id).get()
+    if not snapshot.exists:
+        return None
+    submission = hydrate_submission(snapshot.to_dict())
+    return {
+        'user_id': user_id,
+        'essay_hash': submission.get('essay_hash'),
+        'feedback': submission.get('feedback_text'),
+        'paragraphs': submission.get('paragraphs', []),
+    }
+
+
+class EssayGrading:
+    """
+    Grades one essay, reusing `previous` feedback where the text is unchanged.
+    Iterate `stream()` to get the report as it is produced; afterwards
+    `feedback` holds the full report, `score` the score of this grading and
+    `record()` what to store with it.
+    """
+
+    def __init__(self, backend, text, previous=None, parallelism=None):
+        self.backend = backend
+        self.text = text
+        self.essay_hash = text_hash(text)
+        self.units = split_units(text)
+        self.parallelism = parallelism or get_grading_parallelism()
+        self.previous = previous or {}
+        self.reused = {p['hash']: p['feedback'] for p in self.previous.get('paragraphs', [])}
+        self.paragraph_feedback = []
+        self.feedback = ""
+        self.score = None
+        self.model_calls = 0
+        # A new grading supersedes any of this session's runs still going
+        self.owner = current_owner('grading')
+        get_run_supervisor().supersede(self.owner)
+        # Replies to identical prompts are shared between sessions and replicas
+        self.cache = get_shared_cache() if backend.cache_key() is not None else None
+
+    def _cached(self, prompt):
+        """(found, reply) for a prompt this backend has already answered."""
+        if self.cache is None:
+            return False, None
+        return self.cache.get('feedback', (self.backend.cache_key(), prompt))
+
+    def _remember(self, prompt, reply):
+        if self.cache is not None:
+            self.cache.set('feedback', (self.backend.cache_key(), prompt), reply)
+
+    def _reply(self, prompt):
+        # Runs on worker threads; model_calls is counted by the caller
+        reply = self.backend.reply(self.backend.start_conversation(self.owner), prompt)
+        self._remember(prompt, reply)
+        return reply
+
+
+    def by_paragraph(self):
+        """Long essays, and resubmissions with more than one paragraph, are graded by paragraph."""
+        if len(self.units) <= 1:
+            return False
+        return len(self.text) >= LONG_ESSAY_CHARS or bool(self.previous.get('essay_hash'))
+
+    def stream(self):
+        # Nothing changed at all: reuse the whole previous report
+        if self.essay_hash == self.previous.get('essay_hash') and self.previous.get('feedback'):
+            self.feedback = self.previous['feedback']
+            self.paragraph_feedback = list(self.previous.get('paragraphs', []))
+            self.score = extract_score_from_feedback(self.feedback)
+            yield self.feedback
+            return
+
+        # First submissions and single-paragraph essays are graded in one request, as a whole
+        if not self.by_paragraph():
+            prompt = f"Writing: {self.text}"
+            found, self.feedback = self._cached(prompt)
+            if found:
+                yield self.feedback
+            else:
+                chunks = []
+                self.model_calls += 1
+                for chunk in self.backend.stream_reply(self.backend.start_conversation(self.owner), prompt):
+                    chunks.append(chunk)
+                    yield chunk
+                self.feedback = "".join(chunks)
+                self._remember(prompt, self.feedback)
+            self.score = extract_score_from_feedback(self.feedback)
+            # A whole-essay report has no paragraph sections to reuse, and its
+            # score line must never end up inside a later report
+            self.paragraph_feedback = []
+            return
+
+        sections = []
+        pool = ThreadPoolExecutor(max_workers=self.parallelism)
+        try:
+            # The score pass only needs the full text, so it runs alongside the units
+            score_prompt = SCORE_PROMPT.format(essay=self.text)
+            found, score_reply = self._cached(score_prompt)
+            futures = []
+            if not found:
+                score_future = pool.submit(self._reply, score_prompt)
+                futures.append(score_future)
+                self.model_calls += 1
+
+            pending = []
+            for label, unit in self.units:
+                key = text_hash(unit)
+                prompt = UNIT_PROMPT.format(label=label, text=unit)
+                if key in self.reused:
+                    pending.append((label, key, self.reused[key]))
+                    continue
+                unit_found, feedback = self._cached(prompt)
+                if unit_found:
+                    pending.append((label, key, feedback))
+                else:
+                    future = pool.submit(self._reply, prompt)
+                    futures.append(future)
+                    pending.append((label, key, future))
+                    self.model_calls += 1
+
+            # Emit sections in essay order, each as soon as it and those before it are done
+            for label, key, feedback in pending:
+                if not isinstance(feedback, str):
+                    feedback = result_or_first_failure(feedback, futures)
+                # The report's only score is the score pass below
+                feedback = strip_score_lines(feedback)
+                self.paragraph_feedback.append({'hash': key, 'feedback': feedback})
+                section = f"【{label}】\n\n{feedback}\n\n"
+                sections.append(section)
+                yield section
+
+            if not found:
+                score_reply = result_or_first_failure(score_future, futures)
+            self.score = extract_score_from_feedback(score_reply)
+            score_line = f"スコア: {self.score:g}" if self.score is not None else ""
+        except BaseException:
+            # One failed unit fails the grading: drop the units still queued and
+            # cancel the runs already started instead of waiting for them
+            pool.shutdown(wait=False, cancel_futures=True)
+            get_run_supervisor().supersede(self.owner)
+            raise
+        pool.shutdown()
+        sections.append(score_line)
+        yield score_line
+        self.feedback = "".join(sections)
+
+    def record(self):
+        """Fields stored with the submission so the next resubmission can reuse them."""
+        return {
+            'essay_hash': self.essay_hash,
+            'paragraphs': self.paragraph_feedback,
+        }
@@ -0,0 +1,306 @@
+import streamlit as st
+import hashlib
+import os
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+from modules.resources import get_openai_client
+from modules.modules import create_thread, ask_assistant
+
+# Each assistant (named by its key in secrets, e.g. "hinotama_id") can be
+# served by a different engine, configured in secrets:
+#
+#   [llm_backends.hinotama_id]
+#   engine = "chat"                         # "assistants" (default), "chat" or "fake"
+#   model = "gpt-4o-mini"
+#   prompt = "prompts/hinotama_rubric.md"
+#   hedge = true                            # optional, see HedgedBackend
+#   hedge_percentile = 95
+#   hedge_budget = 0.1
+#
+# A backend answers a message within a conversation. The conversation is a
+# plain dict owned by the caller (usually kept in session state); each engine
+# stores whatever it needs to continue it there.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CHAT_MODEL = "gpt-4o-mini"
+
+
+class LLMBackend:
+    name = "base"
+
+    def start_conversation(self, owner=None):
+        """`owner` identifies the session for run supervision; see run_supervisor.current_owner."""
+        return {}
+
+    def stream_reply(self, conversation, text):
+        """Yield the reply to `text` in chunks, continuing `conversation`."""
+        raise NotImplementedError
+
+    def reply(self, conversation, text):
+        return "".join(self.stream_reply(conversation, text))
+
+    def cache_key(self):
+        """What makes this backend's answers reusable across replicas, or None if they aren't."""
+        return None
+
+
+class AssistantsBackend(LLMBackend):
+    """The OpenAI Assistants API: thread, message, run, poll."""
+    name = "assistants"
+
+    def __init__(self, assistant_id, max_context_messages=None):
+        self.assistant_id = assistant_id
+        self.max_context_messages = max_context_messages
+
+    def start_conversation(self, owner=None):
+        return {"thread_id": None, "owner": owner}
+
+    def stream_reply(self, conversation, text):
+        if not conversation.get("thread_id"):
+            conversation["thread_id"] = create_thread()
+        # Runs don't stream, so the whole reply arrives as one chunk
+        yield ask_assistant(self.assistant_id, conversation["thread_id"], text, self.max_context_messages,
+                            owner=conversation.get("owner"), cancel_event=conversation.get("cancel"))
+
+    def cache_key(self):
+        return (self.name, self.assistant_id)
+
+
+class ChatCompletionsBackend(LLMBackend):
+    """A single streaming chat-completions request with a locally stored prompt."""
+    name = "chat"
+
+    def __init__(self, model, system_prompt, max_context_messages=None, max_tokens=None):
+        self.model = model
+        self.system_prompt = system_prompt
+        self.max_context_messages = max_context_messages
+        self.max_tokens = max_tokens
+
+    def start_conversation(self, owner=None):
+        return {"messages": []}
+
+    def stream_reply(self, conversation, text):
+        history = conversation.setdefault("messages", [])
+        if self.max_context_messages:
+            history = history[-self.max_context_messages:]
+        messages = [{"role": "system", "content": self.system_prompt}, *history, {"role": "user", "content": text}]
+
+        options = {"max_tokens": self.max_tokens} if self.max_tokens else {}
+        stream = get_openai_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            **options
+        )
+
+        chunks = []
+        cancel = conversation.get("cancel")
+        for chunk in stream:
+            if cancel is not None and cancel.is_set():
+                stream.close()
+                return
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+
+        conversation["messages"].extend([
+            {"role": "user", "content": text},
+            {"role": "assistant", "content": "".join(chunks)},
+        ])
+
+    def cache_key(self):
+        return (self.name, self.model, hashlib.sha256(self.system_prompt.encode("utf-8")).hexdigest(), self.max_tokens)
+
+
+class FakeBackend(LLMBackend):
+    """Local stand-in for tests and benchmarks. Replies after `latency` seconds."""
+    name = "fake"
+
+    def __init__(self, reply="良い作文です。\n\nスコア: 80", latency=0.0, chunk_size=20, chunk_delay=0.0):
+        self.reply_text = reply
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+
+    def start_conversation(self, owner=None):
+        return {"turns": 0}
+
+    def stream_reply(self, conversation, text):
+        cancel = conversation.get("cancel") or threading.Event()
+        if cancel.wait(self.latency):
+            return
+        reply = self.reply_text(text) if callable(self.reply_text) else self.reply_text
+        for i in range(0, len(reply), self.chunk_size):
+            if i and cancel.wait(self.chunk_delay):
+                return
+            yield reply[i:i + self.chunk_size]
+        conversation["turns"] = conversation.get("turns", 0) + 1
+
+    def cache_key(self):
+        return None if callable(self.reply_text) else (self.name, self.reply_text)
+
+
+class HedgedBackend(LLMBackend):
+    """
+    Wraps another backend to cut its latency tail. If a reply has produced no
+    output by the `percentile` of recent first-output times, the same request
+    is sent again on a fresh conversation; whichever answers first is used and
+    the other is cancelled. At most `max_hedge_fraction` of requests are hedged.
+
+    A hedge that wins moves the conversation to its own thread, so this suits
+    single-turn use like grading rather than follow-up chats.
+    """
+    name = "hedged"
+
+    def __init__(self, inner, percentile=95, max_hedge_fraction=0.1, history_size=200, min_history=20,
+                 min_delay=0.5):
+        self.inner = inner
+        self.percentile = percentile
+        self.max_hedge_fraction = max_hedge_fraction
+        self.min_history = min_history
+        self.min_delay = min_delay
+        self.history = deque(maxlen=history_size)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def start_conversation(self, owner=None):
+        return self.inner.start_conversation(owner)
+
+    def cache_key(self):
+        return self.inner.cache_key()
+
+    def hedge_delay(self):
+        """Seconds to wait for output before hedging, or None while there is too little history."""
+        with self._lock:
+            if len(self.history) < self.min_history:
+                return None
+            cut = statistics.quantiles(self.history, n=100)[self.percentile - 1]
+        return max(cut, self.min_delay)
+
+    def _take_budget(self):
+        with self._lock:
+            if self.hedged + 1 > self.max_hedge_fraction * self.requests:
+                return False
+            self.hedged += 1
+            return True
+
+    def _launch(self, index, conversation, text, events):
+        cancel = conversation["cancel"] = threading.Event()
+
+        def attempt():
+            try:
+                for chunk in self.inner.stream_reply(conversation, text):
+                    if cancel.is_set():
+                        return
+                    events.put(("chunk", index, chunk))
+                events.put(("done", index, None))
+            except Exception as e:
+                events.put(("error", index, e))
+
+        threading.Thread(target=attempt, daemon=True).start()
+        return cancel
+
+    def stream_reply(self, conversation, text):
+        started = time.monotonic()
+        events = queue.Queue()
+        with self._lock:
+            self.requests += 1
+        conversations = [conversation]
+        cancels = [self._launch(0, conversation, text, events)]
+        winner = None
+        try:
+            delay = self.hedge_delay()
+            failed = set()
+            while winner is None:
+                try:
+                    kind, index, payload = events.get(timeout=delay if len(cancels) == 1 else None)
+                except queue.Empty:
+                    delay = None
+                    if self._take_budget():
+                        conversations.append(self.inner.start_conversation(conversation.get("owner")))
+                        cancels.append(self._launch(1, conversations[1], text, events))
+                    continue
+                if kind == "error":
+                    failed.add(index)
+                    if len(failed) == len(cancels):
+                        raise payload
+                    continue
+                winner = index
+
+            # The first attempt to answer wins; the others are cancelled
+            for index, cancel in enumerate(cancels):
+                if index != winner:
+                    cancel.set()
+            with self._lock:
+                self.history.append(time.monotonic() - started)
+                self.hedge_wins += winner == 1
+
+            while kind != "done":
+                if kind == "error":
+                    raise payload
+                yield payload
+                kind, index, payload = events.get()
+                while index != winner:
+                    kind, index, payload = events.get()
+        finally:
+            for cancel in cancels:
+                cancel.set()
+            for attempt_conversation in conversations:
+                attempt_conversation.pop("cancel", None)
+            if winner:
+                # Continue on the conversation that answered
+                conversation.clear()
+                conversation.update(conversations[winner])
+
+    def stats(self):
+        delay = self.hedge_delay()
+        with self._lock:
+            return {'requests': self.requests, 'hedged': self.hedged, 'hedge_wins': self.hedge_wins,
+                    'hedge_delay': delay}
+
+
+def load_prompt(path):
+    with open(os.path.join(REPO_ROOT, path), encoding="utf-8") as f:
+        return f.read()
+
+
+def build_backend(assistant_key, config, max_context_messages=None):
+    backend = build_engine(assistant_key, config, max_context_messages)
+    if config.get("hedge"):
+        backend = HedgedBackend(
+            backend,
+            percentile=int(config.get("hedge_percentile", 95)),
+            max_hedge_fraction=float(config.get("hedge_budget", 0.1))
+        )
+    return backend
+
+
+def build_engine(assistant_key, config, max_context_messages=None):
+    engine = config.get("engine", "assistants")
+    if engine == "assistants":
+        return AssistantsBackend(st.secrets[assistant_key], max_context_messages=max_context_messages)
+    if engine == "chat":
+        return ChatCompletionsBackend(
+            model=config.get("model", DEFAULT_CHAT_MODEL),
+            system_prompt=load_prompt(config["prompt"]),
+            max_context_messages=max_context_messages,
+            max_tokens=config.get("max_tokens")
+        )
+    if engine == "fake":
+        return FakeBackend(
+            reply=config.get("reply", "良い作文です。\n\nスコア: 80"),
+            latency=float(config.get("latency", 0.0))
+        )
+    raise ValueError(f"Unknown LLM engine '{engine}' for {assistant_key}")
+
+
+@st.cache_resource
+def get_backend(assistant_key, max_context_messages=None):
+    """Backend for the assistant named `assistant_key` in secrets."""
+    config = dict(st.secrets.get("llm_backends", {}).get(assistant_key, {}))
+    return build_backend(assistant_key, config, max_context_messages=max_context_messages)
@@ -1,17 +1,14 @@
 import streamlit as st
-from openai import OpenAI
 import time
-from PIL import Image
 import base64
+import hashlib
+import io
 import requests
-import json
 import re
-
-# Fetch OpenAI API key from Streamlit secrets
-api = st.secrets.api_key
-
-# Initialize OpenAI client only once
-client = OpenAI(api_key=api)
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from modules.resources import get_openai_client, get_openai_base_url
+from modules.shared_cache import get_shared_cache
+from modules.run_supervisor import get_run_supervisor, RunError, RunCancelledError, RunTimeoutError
 
 def extract_score_from_feedback(feedback_text):
     """
@@ -27,80 +24,138 @@ def extract_score_from_feedback(feedback_text):
     # If no match found, return None
     return None
 
-def run_assistant(assistant_id, txt, return_content=False, display_chat=True):
-    # Check if client is already in session state
-    if 'client' not in st.session_state:
-        st.session_state.client = client  # Use globally initialized client
-
-    # Retrieve the assistant
-    st.session_state.assistant = st.session_state.client.beta.assistants.retrieve(assistant_id)
-
-    # Create a thread
-    st.session_state.thread = st.session_state.client.beta.threads.create()
-    content = ""
+# Polling starts fast and backs off, so short runs aren't rounded up to a full second
+POLL_INTERVAL_START = 0.25
+POLL_INTERVAL_MAX = 1.0
+# Run statuses after which no reply will come
+RUN_FAILED_STATUSES = ('failed', 'cancelled', 'expired', 'incomplete')
 
-    if txt:
-        # Add a message to the thread
-        st.session_state.client.beta.threads.messages.create(
-            thread_id=st.session_state.thread.id,
-            role="user",
-            content=txt
-        )
+def create_thread():
+    """Create an empty Assistants thread and return its ID."""
+    return get_openai_client().beta.threads.create().id
 
-        # Run the Assistant
-        run = st.session_state.client.beta.threads.runs.create(
-            thread_id=st.session_state.thread.id,
-            assistant_id=st.session_state.assistant.id
+def ask_assistant(assistant_id, thread_id, txt, max_context_messages=None, owner=None, timeout=None, cancel_event=None):
+    """
+    Add `txt` to an existing thread, run the assistant on it and return the reply.
+    With `max_context_messages`, the run only sees the most recent messages of the
+    thread, which keeps long conversations from growing without bound.
+
+    The run is registered with the run supervisor under `owner` (see
+    run_supervisor.current_owner) and given `timeout` seconds. Setting
+    `cancel_event` cancels it from another thread. Raises RunError if it
+    fails, expires, asks for tool output, times out or is cancelled.
+    """
+    client = get_openai_client()
+    supervisor = get_run_supervisor()
+
+    # Add a message to the thread
+    client.beta.threads.messages.create(
+        thread_id=thread_id,
+        role="user",
+        content=txt
+    )
+
+    # Run the Assistant
+    run_options = {}
+    if max_context_messages:
+        run_options['truncation_strategy'] = {"type": "last_messages", "last_messages": max_context_messages}
+    run = client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        **run_options
+    )
+    deadline = supervisor.register(thread_id, run.id, owner, timeout)
+
+    # No Streamlit calls in here: grading may run this on worker threads
+    interval = POLL_INTERVAL_START
+    while True:
+        # Cancelled by the caller, or by the supervisor: superseded, disconnected or past its deadline
+        if cancel_event is not None and cancel_event.is_set():
+            supervisor.cancel(run.id, 'abandoned')
+        reason = supervisor.cancel_reason(run.id)
+        if reason:
+            supervisor.finish(run.id, reason)
+            # A timeout is a RunTimeoutError whichever thread noticed it first
+            if reason == 'timed_out':
+                raise RunTimeoutError(timeout or supervisor.default_timeout)
+            raise RunCancelledError(reason)
+
+        # Retrieve the run status
+        run_status = client.beta.threads.runs.retrieve(
+            thread_id=thread_id,
+            run_id=run.id
         )
-
-        # Spinner for ongoing process
-        with st.spinner('One moment...'):
-            while True:
-                # Retrieve the run status
-                run_status = st.session_state.client.beta.threads.runs.retrieve(
-                    thread_id=st.session_state.thread.id,
-                    run_id=run.id
-                )
-
-                # If run is completed, process messages
-                if run_status.status == 'completed':
-                    messages = st.session_state.client.beta.threads.messages.list(
-                        thread_id=st.session_state.thread.id
-                    )
-
-                    # Loop through messages and display based on role
-                    for msg in reversed(messages.data):
-                        role = msg.role
-                        content = msg.content[0].text.value
-                        
-                        if display_chat:
-                            with st.chat_message(role):
-                                st.write(content)
-                    break
-
-                # Wait before checking status again
-                time.sleep(1)
-
-    if return_content:
-        return content
+        if run_status.status == 'completed':
+            supervisor.finish(run.id, 'completed')
+            break
+        if run_status.status in RUN_FAILED_STATUSES:
+            supervisor.finish(run.id, run_status.status)
+            error = getattr(run_status, 'last_error', None)
+            raise RunError(run_status.status, getattr(error, 'message', '') or '')
+        if run_status.status == 'requires_action':
+            # None of our assistants have tools, so nothing can answer the action
+            supervisor.cancel(run.id, 'requires_action')
+            supervisor.finish(run.id, 'requires_action')
+            raise RunError('requires_action', 'the assistant asked for a tool call')
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            supervisor.cancel(run.id, 'timed_out')
+            supervisor.finish(run.id, 'timed_out')
+            raise RunTimeoutError(timeout or supervisor.default_timeout)
+
+        # Wait before checking status again
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, POLL_INTERVAL_MAX)
+
+    # Only the messages produced by this run, newest first
+    messages = client.beta.threads.messages.list(thread_id=thread_id, run_id=run.id, order="desc")
+    for msg in messages.data:
+        if msg.role == "assistant":
+            return msg.content[0].text.value
+    return ""
 
 # ------------------ transcribe with GPT-4 vision -------------------------
-def convert_image_to_text(uploaded_file):
-    # Function to encode the image
-    def encode_image(image_file):
-        return base64.b64encode(image_file.read()).decode('utf-8')
-
-    # Encode the uploaded file
-    base64_image = encode_image(uploaded_file)
+# gpt-4 does not accept image input; gpt-4o does
+VISION_MODEL = "gpt-4o"
+# Files transcribed at the same time per upload
+TRANSCRIPTION_WORKERS = 6
+
+# Output budget per image: a page fits at most this many lines of legible
+# handwriting, each line at least MIN_LINE_PIXELS tall, with square characters
+MAX_LINES_PER_PAGE = 40
+MIN_LINE_PIXELS = 30
+TOKENS_PER_CHAR = 1.3
+MIN_TRANSCRIPTION_TOKENS = 300
+MAX_TRANSCRIPTION_TOKENS = 4096
+
+def estimate_transcription_tokens(image_bytes):
+    """How many output tokens a full transcription of this image could need."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        width, height = image.size
+    long_side, short_side = max(width, height), min(width, height)
+    lines = min(MAX_LINES_PER_PAGE, long_side // MIN_LINE_PIXELS)
+    chars_per_line = lines * short_side / long_side
+    tokens = int(lines * chars_per_line * TOKENS_PER_CHAR)
+    return max(MIN_TRANSCRIPTION_TOKENS, min(tokens, MAX_TRANSCRIPTION_TOKENS))
+
+def transcribe_image(image_bytes, mime_type="image/jpeg", max_tokens=None, model=None):
+    """Send one image to the vision model (VISION_MODEL unless `model` is given) and return its transcription."""
+    if max_tokens is None:
+        max_tokens = estimate_transcription_tokens(image_bytes)
+
+    base64_image = base64.b64encode(image_bytes).decode('utf-8')
 
     headers = {
         "Content-Type": "application/json",
-        "Authorization": f"Bearer {api}"
+        "Authorization": f"Bearer {st.secrets.api_key}"
     }
 
     # Modify the payload based on the specific API requirements
     payload = {
-        "model": "gpt-4",
+        "model": model or VISION_MODEL,
         "messages": [
             {
                 "role": "user",
@@ -112,18 +167,43 @@ def convert_image_to_text(uploaded_file):
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
+                            "url": f"data:{mime_type};base64,{base64_image}"
                         }
                     }
                 ]
             }
         ],
-        "max_tokens": 300
+        "max_tokens": max_tokens
     }
 
-    response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
+    response = requests.post(f"{get_openai_base_url()}/chat/completions", headers=headers, json=payload)
 
     if response.status_code == 200:
         return response.json()['choices'][0]['message']['content']
     else:
         raise Exception(f"Error in API call: {response.status_code} - {response.text}")
+
+def convert_image_to_text(uploaded_file, model=None):
+    uploaded_file.seek(0)
+    data = uploaded_file.read()
+
+    # PDFs use their embedded text layer; only scanned pages go to the vision model
+    if uploaded_file.type == "application/pdf" or uploaded_file.name.lower().endswith(".pdf"):
+        from modules.pdf_text import convert_pdf_to_text
+        convert = lambda: convert_pdf_to_text(data, model)  # noqa: E731
+    else:
+        convert = lambda: transcribe_image(data, uploaded_file.type or "image/jpeg", model=model)  # noqa: E731
+
+    # The same file uploaded again (by anyone, on any replica) is not transcribed twice
+    parts = (model or VISION_MODEL, hashlib.sha256(data).hexdigest())
+    return get_shared_cache().get_or_compute('transcription', parts, convert)
+
+def transcribe_files(uploaded_files, model=None):
+    """
+    Transcribe several uploads concurrently on a bounded pool.
+    Yields (index, text) for each file as soon as it is done.
+    """
+    with ThreadPoolExecutor(max_workers=min(TRANSCRIPTION_WORKERS, len(uploaded_files))) as pool:
+        futures = {pool.submit(convert_image_to_text, f, model): i for i, f in enumerate(uploaded_files)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -0,0 +1,90 @@
+import streamlit as st
+import math
+import pandas as pd
+
+# A table for lists of row dicts that can be long (e.g. every student of an
+# organization). Filtering, sorting and paging happen here on the server, and
+# only the visible page is turned into a DataFrame and styled, so what is sent
+# to the browser, and the time spent styling it, depends on the page size and
+# not on the number of rows.
+
+PAGE_SIZES = [25, 50, 100]
+HIGHLIGHT_COLOR = '#e6f3ff'
+
+
+def filter_rows(rows, column, query):
+    """Rows whose `column` contains `query`, ignoring case."""
+    query = (query or '').strip().lower()
+    if not query:
+        return rows
+    return [row for row in rows if query in str(row.get(column, '')).lower()]
+
+
+def sort_rows(rows, column, descending=False):
+    # Missing values go last whichever way the table is sorted
+    present = [row for row in rows if row.get(column) is not None]
+    missing = [row for row in rows if row.get(column) is None]
+    return sorted(present, key=lambda row: row[column], reverse=descending) + missing
+
+
+def page_of(rows, page, page_size):
+    """The rows of page `page` (1-based), clamped to the last page, and the number of pages."""
+    pages = max(1, math.ceil(len(rows) / page_size))
+    page = min(max(page, 1), pages)
+    return rows[(page - 1) * page_size:page * page_size], page, pages
+
+
+def style_page(df, highlight_max=None, max_values=None):
+    """
+    Style only the rows in `df`. `max_values` are the maxima of the
+    `highlight_max` columns over all matching rows, not just this page, so
+    the highlighted cells are the same as when the whole table was styled.
+    """
+    styler = df.style.set_properties(**{'text-align': 'left'})
+    for column in highlight_max or []:
+        if column in df and max_values.get(column) is not None:
+            styler = styler.map(
+                lambda value, top=max_values[column]: f'background-color: {HIGHLIGHT_COLOR}' if value == top else '',
+                subset=[column]
+            )
+    return styler
+
+
+@st.fragment
+def paged_table(rows, key, filter_column, sort_columns=None, highlight_max=None, default_sort=None,
+                empty_message="No rows found."):
+    """
+    Filter by `filter_column`, sort by one of `sort_columns` and page through
+    `rows`. Runs as a fragment, so paging doesn't rerun the page around it.
+    """
+    columns = list(rows[0].keys()) if rows else []
+    sort_columns = sort_columns or columns
+
+    col1, col2, col3 = st.columns([3, 2, 1])
+    query = col1.text_input(f"Filter by {filter_column}", key=f"{key}_filter")
+    sort_by = col2.selectbox("Sort by", sort_columns, key=f"{key}_sort",
+                             index=sort_columns.index(default_sort) if default_sort in sort_columns else 0)
+    descending = col3.toggle("Descending", key=f"{key}_descending")
+
+    matching = sort_rows(filter_rows(rows, filter_column, query), sort_by, descending)
+    if not matching:
+        st.info(empty_message if not query else f"Nothing matches '{query}'.")
+        return
+
+    max_values = {}
+    for column in highlight_max or []:
+        values = [row[column] for row in matching if row.get(column) is not None]
+        max_values[column] = max(values) if values else None
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+    page_size = col1.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+    pages = max(1, math.ceil(len(matching) / page_size))
+    # A narrower filter or bigger pages can leave the current page past the end
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = col2.number_input("Page", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    visible, page, pages = page_of(matching, page, page_size)
+    col3.caption(f"{(page - 1) * page_size + 1}–{(page - 1) * page_size + len(visible)} of {len(matching)}")
+
+    df = pd.DataFrame(visible, columns=columns)
+    st.dataframe(style_page(df, highlight_max, max_values), use_container_width=True, hide_index=True)
@@ -0,0 +1,106 @@
+import streamlit as st
+import bcrypt
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Password hashing is CPU-bound, so it runs on a small process pool instead of
+# the script thread. The work factor and pool size can be tuned from secrets:
+#   bcrypt_rounds = 12
+#   password_hash_workers = 2
+DEFAULT_BCRYPT_ROUNDS = 12
+DEFAULT_HASH_WORKERS = max(1, min(4, (os.cpu_count() or 1) // 2))
+
+# Per-ID throttle: at most this many password checks per window
+LOGIN_ATTEMPT_LIMIT = 5
+LOGIN_ATTEMPT_WINDOW_SECONDS = 300
+# IDs tracked at once; the least recently tried are dropped first
+LOGIN_THROTTLE_MAX_IDS = 5000
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode()
+
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def get_bcrypt_rounds():
+    return int(st.secrets.get("bcrypt_rounds", DEFAULT_BCRYPT_ROUNDS))
+
+
+@st.cache_resource
+def get_hash_pool():
+    """Process pool shared by every session for bcrypt work."""
+    workers = int(st.secrets.get("password_hash_workers", DEFAULT_HASH_WORKERS))
+    # Spawned workers avoid forking a process that is running server threads
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def hash_password(password):
+    """Hash a password at the configured work factor."""
+    return get_hash_pool().submit(_hashpw, password.encode(), get_bcrypt_rounds()).result()
+
+
+def verify_password(password, hashed):
+    """Check a password against a stored bcrypt hash."""
+    return get_hash_pool().submit(_checkpw, password.encode(), hashed.encode()).result()
+
+
+def needs_rehash(hashed):
+    """True if the stored hash was made with a different work factor than configured."""
+    try:
+        # bcrypt hashes look like $2b$12$<salt+hash>
+        return int(hashed.split('$')[2]) != get_bcrypt_rounds()
+    except (IndexError, ValueError):
+        return True
+
+
+class LoginThrottle:
+    """
+    Sliding-window limit on password checks per user ID. IDs are kept in
+    least-recently-tried order: those with no attempt left in the window are
+    dropped, and past `max_ids` the oldest go, so made-up IDs can't grow it.
+    """
+
+    def __init__(self, limit, window_seconds, max_ids=LOGIN_THROTTLE_MAX_IDS):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_ids = max_ids
+        self._attempts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._attempts:
+            key, attempts = next(iter(self._attempts.items()))
+            if len(self._attempts) < self.max_ids and now - attempts[-1] <= self.window_seconds:
+                break
+            del self._attempts[key]
+
+    def allow(self, key):
+        """Record an attempt for `key`. Returns (allowed, seconds_until_retry)."""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.pop(key, deque())
+            while attempts and now - attempts[0] > self.window_seconds:
+                attempts.popleft()
+            self._prune(now)
+            # Re-inserted as the most recently tried; an ID whose attempts all expired starts afresh
+            self._attempts[key] = attempts
+            if len(attempts) >= self.limit:
+                return False, int(self.window_seconds - (now - attempts[0])) + 1
+            attempts.append(now)
+            return True, 0
+
+    def reset(self, key):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+
+@st.cache_resource
+def get_login_throttle():
+    return LoginThrottle(LOGIN_ATTEMPT_LIMIT, LOGIN_ATTEMPT_WINDOW_SECONDS)
@@ -0,0 +1,60 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from modules.modules import transcribe_image
+
+# Pages whose text layer has fewer characters than this are treated as scans
+PDF_MIN_PAGE_TEXT_CHARS = 20
+# Render scanned pages at 2x (144 dpi), enough for handwriting
+PDF_RENDER_SCALE = 2
+PDF_TRANSCRIPTION_WORKERS = 4
+
+# pdfium is not thread-safe anywhere in the process, and uploads are
+# transcribed on several threads at once, so every document is opened,
+# rendered and closed under this lock; only the vision calls run in parallel
+_pdfium_lock = threading.Lock()
+
+
+def extract_text_layer(data):
+    """Text of each page from the PDF's embedded text layer ("" for pages without one)."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    return [(page.extract_text() or "").strip() for page in reader.pages]
+
+
+def render_pages(data, page_numbers):
+    """Rasterize the given pages to PNG bytes."""
+    import pypdfium2 as pdfium
+
+    images = {}
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(data)
+        try:
+            for number in page_numbers:
+                bitmap = pdf[number].render(scale=PDF_RENDER_SCALE)
+                buffer = io.BytesIO()
+                bitmap.to_pil().save(buffer, format="PNG")
+                images[number] = buffer.getvalue()
+        finally:
+            pdf.close()
+    return images
+
+
+def convert_pdf_to_text(data, model=None):
+    """
+    Transcribe a PDF. Typed pages are read locally from the text layer; only
+    pages without text are rendered and sent to the vision model, concurrently.
+    Pages are joined in their original order.
+    """
+    pages = extract_text_layer(data)
+    scanned = [i for i, text in enumerate(pages) if len(text) < PDF_MIN_PAGE_TEXT_CHARS]
+
+    if scanned:
+        images = render_pages(data, scanned)
+        with ThreadPoolExecutor(max_workers=min(PDF_TRANSCRIPTION_WORKERS, len(scanned))) as pool:
+            futures = {i: pool.submit(transcribe_image, images[i], "image/png", model=model) for i in scanned}
+            for i, future in futures.items():
+                pages[i] = future.result().strip()
+
+    return "\n\n".join(page for page in pages if page)
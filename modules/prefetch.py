@@ -0,0 +1,60 @@
+import streamlit as st
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Background loading of slow page data, started before the page that needs
+# it (e.g. at login). Work is keyed: asking for a key that is already being
+# fetched joins the running job instead of starting another one, and a
+# finished result is handed out for a short while before it is dropped (the
+# functions behind it cache their results in the shared cache anyway).
+
+DEFAULT_PREFETCH_WORKERS = 4
+RESULT_TTL = 120
+
+
+class Prefetcher:
+    def __init__(self, workers=DEFAULT_PREFETCH_WORKERS, result_ttl=RESULT_TTL):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.result_ttl = result_ttl
+        self._jobs = {}  # key -> (future, finished_at or None)
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        """Start fn(*args) in the background unless `key` is already running or fresh; returns its future."""
+        now = time.monotonic()
+        with self._lock:
+            self._drop_stale(now)
+            job = self._jobs.get(key)
+            if job is not None:
+                return job[0]
+            future = self.pool.submit(fn, *args)
+            self._jobs[key] = (future, None)
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return future
+
+    def get(self, key):
+        """The future for `key` if it is running or recently finished, else None."""
+        with self._lock:
+            self._drop_stale(time.monotonic())
+            job = self._jobs.get(key)
+        return job[0] if job else None
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self._jobs.get(key, (None,))[0] is future:
+                # Failures are not kept, so the next request retries
+                if future.exception() is not None:
+                    del self._jobs[key]
+                else:
+                    self._jobs[key] = (future, time.monotonic())
+
+    def _drop_stale(self, now):
+        stale = [k for k, (_f, finished) in self._jobs.items() if finished and now - finished > self.result_ttl]
+        for key in stale:
+            del self._jobs[key]
+
+
+@st.cache_resource
+def get_prefetcher():
+    return Prefetcher(int(st.secrets.get('prefetch_workers', DEFAULT_PREFETCH_WORKERS)))
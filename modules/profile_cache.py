@@ -0,0 +1,123 @@
+import streamlit as st
+import threading
+import time
+from collections import OrderedDict
+from modules.resources import get_db
+
+# Read-through cache for users/{id} and organizations/{code}. Entries expire
+# after a short TTL and are kept up to date by our own writes, which go through
+# the helpers below. Set `profile_cache_listen = true` in secrets to also keep
+# cached documents in sync with edits made outside the app (e.g. the Firebase
+# console) through Firestore snapshot listeners.
+PROFILE_CACHE_TTL_SECONDS = 60
+PROFILE_CACHE_MAX_ENTRIES = 5000
+
+
+class ProfileCache:
+    """Process-wide TTL cache over the documents of one Firestore collection."""
+
+    def __init__(self, collection, ttl_seconds, max_entries, listen=False):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.listen = listen
+        self._entries = OrderedDict()  # doc_id -> (expires_at, data)
+        self._watches = {}             # doc_id -> snapshot listener
+        self._lock = threading.RLock()
+
+    def _doc_ref(self, doc_id):
+        return get_db().collection(self.collection).document(doc_id)
+
+    def _store(self, doc_id, data):
+        # Listened documents are pushed to us, so they don't need to expire
+        expires_at = float('inf') if doc_id in self._watches else time.monotonic() + self.ttl_seconds
+        self._entries[doc_id] = (expires_at, data)
+        self._entries.move_to_end(doc_id)
+        while len(self._entries) > self.max_entries:
+            evicted_id, _ = self._entries.popitem(last=False)
+            self._unwatch(evicted_id)
+
+    def _unwatch(self, doc_id):
+        watch = self._watches.pop(doc_id, None)
+        if watch is not None:
+            watch.unsubscribe()
+
+    def _watch(self, doc_id):
+        def on_snapshot(snapshots, changes, read_time):
+            with self._lock:
+                for snapshot in snapshots:
+                    if snapshot.exists:
+                        self._store(doc_id, snapshot.to_dict())
+                    else:
+                        self._entries.pop(doc_id, None)
+
+        self._watches[doc_id] = self._doc_ref(doc_id).on_snapshot(on_snapshot)
+
+    def get(self, doc_id):
+        """Return a copy of the document as a dict, or None if it doesn't exist."""
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(doc_id)
+                return dict(entry[1])
+
+        snapshot = self._doc_ref(doc_id).get()
+        if not snapshot.exists:
+            return None
+
+        data = snapshot.to_dict()
+        with self._lock:
+            if self.listen and doc_id not in self._watches:
+                self._watch(doc_id)
+            self._store(doc_id, data)
+        return dict(data)
+
+    def set(self, doc_id, data):
+        self._doc_ref(doc_id).set(data)
+        with self._lock:
+            self._store(doc_id, dict(data))
+
+    def update(self, doc_id, fields):
+        self._doc_ref(doc_id).update(fields)
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry:
+                self._store(doc_id, {**entry[1], **fields})
+
+    def invalidate(self, doc_id):
+        with self._lock:
+            self._entries.pop(doc_id, None)
+
+
+def _listen_enabled():
+    return bool(st.secrets.get("profile_cache_listen", False))
+
+
+@st.cache_resource
+def get_user_cache():
+    return ProfileCache('users', PROFILE_CACHE_TTL_SECONDS, PROFILE_CACHE_MAX_ENTRIES, listen=_listen_enabled())
+
+
+@st.cache_resource
+def get_org_cache():
+    return ProfileCache('organizations', PROFILE_CACHE_TTL_SECONDS, PROFILE_CACHE_MAX_ENTRIES, listen=_listen_enabled())
+
+
+def get_user_doc(user_id):
+    return get_user_cache().get(user_id)
+
+
+def set_user_doc(user_id, data):
+    get_user_cache().set(user_id, data)
+
+
+def update_user_doc(user_id, fields):
+    get_user_cache().update(user_id, fields)
+
+
+def invalidate_user_doc(user_id):
+    get_user_cache().invalidate(user_id)
+
+
+def get_org_doc(org_code):
+    return get_org_cache().get(org_code)
@@ -0,0 +1,190 @@
+import streamlit as st
+import functools
+import html
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Opt-in timing of whole reruns. Turned on per session with ?profile=1 in the
+# URL, or for everyone/some users with secrets:
+#
+#   profiling = true                 # every rerun
+#   profiler_users = ["teacher01"]   # users or org codes that always get it
+#   profile_slow_seconds = 2.0       # reruns slower than this go to the log
+#
+# profile_rerun() wraps a page's main(); span() and @profiled mark the parts
+# inside it (Firestore queries, model calls, rendering). When profiling is off
+# there is no active profile and a span costs one ContextVar lookup.
+#
+# Spans opened on worker threads (grading fan-out, transcription) are not
+# recorded; the span around the pool covers their wall time.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SLOW_RERUN_LOG = os.path.join(REPO_ROOT, "profiles", "slow_reruns.jsonl")
+DEFAULT_SLOW_SECONDS = 2.0
+SLOW_RERUNS_KEPT = 50
+SPAN_COLORS = {'firestore': '#f4a261', 'openai': '#2a9d8f', 'render': '#8ab17d', 'auth': '#e76f51'}
+DEFAULT_SPAN_COLOR = '#9aa5b1'
+
+_current_span = ContextVar('profiler_span', default=None)
+_log_lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def kind(self):
+        return self.name.split(':', 1)[0] if ':' in self.name else 'function'
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'seconds': round(self.duration, 4),
+            'children': [child.to_dict() for child in self.children],
+        }
+
+
+def profiling_enabled():
+    if st.query_params.get('profile') == '1' or st.secrets.get('profiling', False):
+        return True
+    allowed = st.secrets.get('profiler_users', [])
+    if not allowed:
+        return False
+    user = st.session_state.get('user') or {}
+    organization = st.session_state.get('organization') or {}
+    return user.get('id') in allowed or organization.get('org_code') in allowed
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as a child of the current span, if profiling."""
+    parent = _current_span.get()
+    if parent is None:
+        yield
+        return
+    current = Span(name, parent)
+    parent.children.append(current)
+    token = _current_span.set(current)
+    try:
+        yield
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def profiled(name=None):
+    """Decorator form of span(); `name` defaults to the function's name."""
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profile_rerun(name):
+    """Profile one rerun of a page and show the breakdown at the bottom of it."""
+    if not profiling_enabled():
+        yield
+        return
+    root = Span(name)
+    token = _current_span.set(root)
+    try:
+        yield
+    finally:
+        root.end = time.perf_counter()
+        _current_span.reset(token)
+    # Not reached when the rerun was cut short by st.rerun() or st.stop()
+    record_slow_rerun(root)
+    display_profile(root)
+
+
+def self_times(root):
+    """Seconds spent in each span name outside of its child spans, largest first."""
+    totals = {}
+
+    def visit(node):
+        own = node.duration - sum(child.duration for child in node.children)
+        totals[node.name] = totals.get(node.name, 0.0) + own
+        for child in node.children:
+            visit(child)
+
+    visit(root)
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def flame_html(root):
+    """Icicle chart: one row per depth, each span as wide as its share of the rerun."""
+    total = root.duration or 1e-9
+    bars = []
+
+    def visit(node, depth):
+        left = (node.start - root.start) / total * 100
+        width = max(node.duration / total * 100, 0.2)
+        label = f"{node.name} {node.duration * 1000:.0f}ms"
+        color = SPAN_COLORS.get(node.kind, DEFAULT_SPAN_COLOR)
+        bars.append(
+            f'<div title="{html.escape(label)}" style="position:absolute; top:{depth * 22}px; left:{left:.2f}%; '
+            f'width:{width:.2f}%; height:20px; background:{color}; border:1px solid #fff; overflow:hidden; '
+            f'white-space:nowrap; font-size:11px; line-height:20px; padding-left:3px; box-sizing:border-box;">'
+            f'{html.escape(label)}</div>'
+        )
+        for child in node.children:
+            visit(child, depth + 1)
+
+    visit(root, 0)
+    depth = max_depth(root)
+    return f'<div style="position:relative; width:100%; height:{(depth + 1) * 22}px;">{"".join(bars)}</div>'
+
+
+def max_depth(node):
+    return 1 + max((max_depth(child) for child in node.children), default=-1)
+
+
+def display_profile(root):
+    st.divider()
+    with st.expander(f"⏱ Profile: {root.name} {root.duration * 1000:.0f} ms", expanded=True):
+        st.html(flame_html(root))
+        rows = [
+            {'span': name, 'self ms': round(seconds * 1000, 1), 'share': f"{seconds / root.duration:.0%}"}
+            for name, seconds in self_times(root)
+        ]
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+
+
+def record_slow_rerun(root):
+    """Keep the slowest reruns (above the threshold) in a local JSON-lines log."""
+    threshold = float(st.secrets.get('profile_slow_seconds', DEFAULT_SLOW_SECONDS))
+    if root.duration < threshold:
+        return
+    entry = {'at': time.strftime('%Y-%m-%dT%H:%M:%S'), **root.to_dict()}
+    with _log_lock:
+        os.makedirs(os.path.dirname(SLOW_RERUN_LOG), exist_ok=True)
+        entries = []
+        if os.path.exists(SLOW_RERUN_LOG):
+            with open(SLOW_RERUN_LOG, encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        entries.append(entry)
+        entries.sort(key=lambda e: -e['seconds'])
+        with open(SLOW_RERUN_LOG, 'w', encoding='utf-8') as f:
+            for e in entries[:SLOW_RERUNS_KEPT]:
+                f.write(json.dumps(e, ensure_ascii=False) + '\n')
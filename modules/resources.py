@@ -0,0 +1,55 @@
+import streamlit as st
+import os
+
+# Process-wide clients shared by every session. Each one is created lazily on
+# first use (st.cache_resource), so pages that never touch Firestore or OpenAI,
+# like the login page, don't pay for importing or connecting to them.
+
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+
+@st.cache_resource
+def get_db():
+    """Return the Firestore client, initializing the Firebase app on first use."""
+    # Against the Firestore emulator (local runs, load tests) no credentials are needed
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore as cloud_firestore
+        project_id = st.secrets.get("firebase", {}).get("project_id") or os.environ.get("GCLOUD_PROJECT", "hinotama-local")
+        return cloud_firestore.Client(project=project_id)
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    # Load Firebase credentials from Streamlit secrets
+    firebase_creds = {
+        "type": st.secrets["firebase"]["type"],
+        "project_id": st.secrets["firebase"]["project_id"],
+        "private_key_id": st.secrets["firebase"]["private_key_id"],
+        "private_key": st.secrets["firebase"]["private_key"],
+        "client_email": st.secrets["firebase"]["client_email"],
+        "client_id": st.secrets["firebase"]["client_id"],
+        "auth_uri": st.secrets["firebase"]["auth_uri"],
+        "token_uri": st.secrets["firebase"]["token_uri"],
+        "auth_provider_x509_cert_url": st.secrets["firebase"]["auth_provider_x509_cert_url"],
+        "client_x509_cert_url": st.secrets["firebase"]["client_x509_cert_url"]
+    }
+
+    # Check if the default Firebase app already exists
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(firebase_creds)
+        firebase_admin.initialize_app(cred)
+
+    return firestore.client()
+
+
+@st.cache_resource
+def get_openai_client():
+    """Return the OpenAI client, created once per process."""
+    from openai import OpenAI
+
+    return OpenAI(api_key=st.secrets.api_key, base_url=get_openai_base_url())
+
+
+def get_openai_base_url():
+    """The OpenAI API root; `openai_base_url` in secrets points it at a proxy or mock server."""
+    return st.secrets.get("openai_base_url", DEFAULT_OPENAI_BASE_URL)
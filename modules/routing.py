@@ -0,0 +1,171 @@
+import streamlit as st
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from modules.modules import VISION_MODEL, TOKENS_PER_CHAR, estimate_transcription_tokens
+from modules.profile_cache import get_org_doc
+
+# Picks the backend (grading) or vision model (transcription) for each
+# request. Routes are tried in order and the first whose conditions all hold
+# is used; a route without conditions matches everything. In secrets:
+#
+#   [routing.slo_seconds]
+#   grading = 40
+#
+#   [[routing.grading]]
+#   name = "long-essay"
+#   backend = "hinotama_long"      # a key configured under [llm_backends]
+#   min_chars = 2000
+#   plans = ["premium"]
+#   fallback = "fast"              # used while this route misses its SLO
+#
+#   [[routing.grading]]
+#   name = "fast"
+#   backend = "hinotama_fast"
+#
+# Conditions: min_chars, max_chars, min_tokens, max_tokens, hints (["typed",
+# "handwritten"]), plans, max_backlog (requests of this kind in flight on this
+# replica). Without [routing] every request takes the default route below.
+#
+# While a route is on its fallback, one request every PROBE_SECONDS still goes
+# to it, and latencies older than LATENCY_MAX_AGE no longer count, so a route
+# that has recovered passes its SLO again and gets its traffic back. Both can
+# be set as routing.probe_seconds and routing.latency_max_age.
+
+DEFAULT_ROUTES = {
+    'grading': [{'name': 'default', 'backend': 'hinotama_id'}],
+    'transcription': [{'name': 'default', 'model': VISION_MODEL}],
+}
+DEFAULT_PLAN = 'standard'
+# Recent latencies kept per route, and the share of them that must be within the SLO
+LATENCY_WINDOW = 50
+SLO_PERCENTILE = 0.9
+# Seconds a latency sample counts for, and between probes of a route on its fallback
+LATENCY_MAX_AGE = 300
+PROBE_SECONDS = 30
+
+
+def route_matches(route, context):
+    """Whether every condition on the route holds for the request context."""
+    checks = [
+        ('min_chars', lambda limit: context['chars'] >= limit),
+        ('max_chars', lambda limit: context['chars'] <= limit),
+        ('min_tokens', lambda limit: context['tokens'] >= limit),
+        ('max_tokens', lambda limit: context['tokens'] <= limit),
+        ('hints', lambda hints: context['hint'] in hints),
+        ('plans', lambda plans: context['plan'] in plans),
+        ('max_backlog', lambda limit: context['backlog'] <= limit),
+    ]
+    return all(check(route[key]) for key, check in checks if key in route)
+
+
+class Router:
+    def __init__(self, routes=None, slo_seconds=None, max_age=LATENCY_MAX_AGE, probe_seconds=PROBE_SECONDS):
+        self.routes = {kind: [dict(r) for r in rules] for kind, rules in (routes or DEFAULT_ROUTES).items()}
+        for kind, rules in DEFAULT_ROUTES.items():
+            self.routes.setdefault(kind, rules)
+        self.slo_seconds = dict(slo_seconds or {})
+        self.max_age = max_age
+        self.probe_seconds = probe_seconds
+        self.in_flight = Counter()
+        self.latencies = {}
+        self.last_probe = {}
+        self._lock = threading.Lock()
+
+    def find(self, kind, name):
+        return next((r for r in self.routes[kind] if r['name'] == name), None)
+
+    def missing_slo(self, kind, route):
+        """True when the route's recent latency percentile is over the SLO for its kind."""
+        slo = self.slo_seconds.get(kind)
+        oldest = time.monotonic() - self.max_age
+        with self._lock:
+            samples = sorted(seconds for at, seconds in self.latencies.get(route['name'], ()) if at >= oldest)
+        if not slo or len(samples) < 5:
+            return False
+        return samples[int(SLO_PERCENTILE * (len(samples) - 1))] > slo
+
+    def choose(self, kind, chars=0, tokens=0, hint=None, plan=DEFAULT_PLAN):
+        """The route decision for one request, as a dict that can be stored with it."""
+        with self._lock:
+            backlog = self.in_flight[kind]
+        context = {'chars': chars, 'tokens': tokens, 'hint': hint, 'plan': plan, 'backlog': backlog}
+
+        route = next((r for r in self.routes[kind] if route_matches(r, context)), self.routes[kind][-1])
+        fallback_from = None
+        probe = False
+        if route.get('fallback') and self.missing_slo(kind, route):
+            probe = self._probe_due(kind, route['name'])
+            if not probe:
+                fallback_from = route['name']
+                route = self.find(kind, route['fallback']) or route
+        else:
+            with self._lock:
+                self.last_probe.pop((kind, route['name']), None)
+
+        return {
+            'kind': kind,
+            'route': route['name'],
+            'backend': route.get('backend'),
+            'model': route.get('model'),
+            'fallback_from': fallback_from,
+            'probe': probe,
+            'context': context,
+        }
+
+    def _probe_due(self, kind, name):
+        """Whether this request should probe a route that is on its fallback."""
+        now = time.monotonic()
+        with self._lock:
+            # The first request after a route misses its SLO falls back; probes start one interval later
+            last = self.last_probe.setdefault((kind, name), now)
+            if now - last < self.probe_seconds:
+                return False
+            self.last_probe[(kind, name)] = now
+            return True
+
+    @contextmanager
+    def track(self, decision):
+        """Count the request as in flight and record its latency under its route."""
+        kind, name = decision['kind'], decision['route']
+        with self._lock:
+            self.in_flight[kind] += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight[kind] -= 1
+                now = time.monotonic()
+                self.latencies.setdefault(name, deque(maxlen=LATENCY_WINDOW)).append((now, now - start))
+
+
+@st.cache_resource
+def get_router():
+    config = st.secrets.get('routing', {})
+    routes = {kind: list(config[kind]) for kind in DEFAULT_ROUTES if kind in config}
+    return Router(routes, dict(config.get('slo_seconds', {})), float(config.get('latency_max_age', LATENCY_MAX_AGE)),
+                  float(config.get('probe_seconds', PROBE_SECONDS)))
+
+
+def get_plan(user):
+    """The plan of the user's organization; individual users are on the default plan."""
+    org_code = (user or {}).get('org_code')
+    if not org_code:
+        return DEFAULT_PLAN
+    org = get_org_doc(org_code) or {}
+    return org.get('plan', DEFAULT_PLAN)
+
+
+def choose_grading_route(text, hint, plan):
+    return get_router().choose('grading', chars=len(text), tokens=int(len(text) * TOKENS_PER_CHAR),
+                               hint=hint, plan=plan)
+
+
+def choose_transcription_route(uploaded_files, plan):
+    """One route for a batch of uploads. PDFs count as typed, photos as handwritten."""
+    images = [f for f in uploaded_files if not f.name.lower().endswith('.pdf')]
+    tokens = sum(estimate_transcription_tokens(f.getvalue()) for f in images)
+    hint = 'handwritten' if images else 'typed'
+    return get_router().choose('transcription', tokens=tokens, hint=hint, plan=plan)
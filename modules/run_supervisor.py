@@ -0,0 +1,155 @@
+import streamlit as st
+import threading
+import time
+from collections import Counter
+
+# Keeps track of every Assistants run in flight in this process, so runs
+# that nobody is waiting for anymore are cancelled on the server instead of
+# running (and billing tokens) to completion:
+#
+#   - superseded: the same session started a newer grading
+#   - disconnected: the session's browser tab is gone
+#   - timed out: the run is past its deadline
+#
+# ask_assistant registers each run here and checks it while polling; a
+# background sweeper handles runs whose polling thread has stopped waiting.
+
+DEFAULT_RUN_TIMEOUT = 120
+SWEEP_INTERVAL = 5.0
+
+
+class RunError(Exception):
+    """An Assistants run ended without a reply."""
+
+    def __init__(self, status, message=""):
+        super().__init__(f"Assistant run {status}" + (f": {message}" if message else ""))
+        self.status = status
+
+
+class RunTimeoutError(RunError):
+    def __init__(self, timeout):
+        super().__init__("timed_out", f"no reply after {timeout:g}s")
+
+
+class RunCancelledError(RunError):
+    def __init__(self, reason):
+        super().__init__("cancelled", reason)
+
+
+class RunRecord:
+    def __init__(self, thread_id, run_id, owner, deadline):
+        self.thread_id = thread_id
+        self.run_id = run_id
+        self.owner = owner
+        self.deadline = deadline
+        self.cancel_reason = None
+
+
+def current_owner(group):
+    """(session id, group) for runs started by the current session, or None outside a session."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return (ctx.session_id, group) if ctx else None
+
+
+def session_is_active(session_id):
+    from streamlit import runtime
+
+    if not runtime.exists():
+        return True
+    return runtime.get_instance().is_active_session(session_id)
+
+
+class RunSupervisor:
+    def __init__(self, cancel_run, default_timeout=DEFAULT_RUN_TIMEOUT, sweep_interval=SWEEP_INTERVAL):
+        self.cancel_run = cancel_run  # (thread_id, run_id) -> None
+        self.default_timeout = default_timeout
+        self.metrics = Counter()
+        self._runs = {}
+        self._lock = threading.Lock()
+        if sweep_interval:
+            threading.Thread(target=self._sweep_forever, args=(sweep_interval,), daemon=True).start()
+
+    def register(self, thread_id, run_id, owner=None, timeout=None):
+        deadline = time.monotonic() + (timeout or self.default_timeout)
+        with self._lock:
+            self._runs[run_id] = RunRecord(thread_id, run_id, owner, deadline)
+            self.metrics['started'] += 1
+        return deadline
+
+    def finish(self, run_id, status):
+        """Forget a run that reached `status` ('completed', 'failed', 'timed_out', ...)."""
+        with self._lock:
+            record = self._runs.pop(run_id, None)
+            # Runs cancelled here were already counted under the reason
+            if record is not None and record.cancel_reason is None:
+                self.metrics[status] += 1
+
+    def cancel_reason(self, run_id):
+        """Why the run was cancelled from outside its polling thread, or None."""
+        record = self._runs.get(run_id)
+        return record.cancel_reason if record else None
+
+    def cancel(self, run_id, reason):
+        record = self._runs.get(run_id)
+        if record is not None:
+            self._cancel(record, reason)
+
+    def supersede(self, owner):
+        """Cancel the runs of `owner`: its session has started newer work."""
+        if owner is None:
+            return
+        with self._lock:
+            stale = [r for r in self._runs.values() if r.owner == owner and r.cancel_reason is None]
+        for record in stale:
+            self._cancel(record, 'superseded')
+
+    def sweep(self):
+        """Cancel runs past their deadline or whose session has disconnected."""
+        now = time.monotonic()
+        with self._lock:
+            # Cancelled runs no polling thread has picked up by their deadline
+            for run_id in [r.run_id for r in self._runs.values() if r.cancel_reason and now > r.deadline]:
+                del self._runs[run_id]
+            records = [r for r in self._runs.values() if r.cancel_reason is None]
+        for record in records:
+            if now > record.deadline:
+                self._cancel(record, 'timed_out')
+            elif record.owner and not session_is_active(record.owner[0]):
+                self._cancel(record, 'disconnected')
+
+    def _cancel(self, record, reason):
+        with self._lock:
+            if record.cancel_reason is not None:
+                return
+            record.cancel_reason = reason
+            self.metrics[reason] += 1
+        try:
+            self.cancel_run(record.thread_id, record.run_id)
+        except Exception:
+            pass  # Already finished on the server
+        # The polling thread, if any, raises RunCancelledError at its next check
+
+    def _sweep_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._lock:
+            in_flight = sum(1 for r in self._runs.values() if r.cancel_reason is None)
+            return {'in_flight': in_flight, **self.metrics}
+
+
+@st.cache_resource
+def get_run_supervisor():
+    from modules.resources import get_openai_client
+
+    def cancel_run(thread_id, run_id):
+        get_openai_client().beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+
+    return RunSupervisor(cancel_run, default_timeout=float(st.secrets.get('assistant_run_timeout', DEFAULT_RUN_TIMEOUT)))
@@ -0,0 +1,342 @@
+import streamlit as st
+import argparse
+import logging
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from modules.resources import get_db
+from modules.shared_cache import cached
+from modules.profiler import profiled
+
+# Score distributions per organization and ISO week, kept as KLL quantile
+# sketches in `score_sketches/{org_code}_{year}-W{week}_{shard}`.
+# save_submission adds each score to one randomly chosen shard of its week's
+# sketch; a dashboard reads the few shards covering the weeks and
+# organizations it shows and merges them, instead of scanning submissions. A
+# sketch answers quantiles within about 1-2% rank error and never holds more
+# than a few hundred values, however many scores went in.
+#
+# Every score is a read-modify-write transaction on its shard, so shards keep
+# a whole class submitting at once from contending on one document. A score
+# that can't be recorded after RECORD_ATTEMPTS shards is counted in
+# `score_sketch_losses/{org_code}_{year}-W{week}` and logged.
+#
+# Students without an organization are kept under INDIVIDUAL_ORG, which has
+# more shards because it takes every individual student's scores.
+#
+#   python -m modules.score_sketch --backfill   # build sketches from existing submissions
+
+SKETCH_COLLECTION = 'score_sketches'
+LOSS_COLLECTION = 'score_sketch_losses'
+INDIVIDUAL_ORG = '_individual'
+SKETCH_SHARDS = 8
+INDIVIDUAL_SHARDS = 32
+# Shards tried per score, each with one transaction retry
+RECORD_ATTEMPTS = 3
+DEFAULT_K = 128
+# Each compactor level holds 2/3 as many values as the one above it
+CAPACITY_RATIO = 2 / 3
+HISTOGRAM_BINS = list(range(0, 101, 10))
+DEFAULT_WEEKS = 8
+
+logger = logging.getLogger(__name__)
+
+
+class KLLSketch:
+    """
+    A KLL sketch (Karnin, Lang, Liberty 2016). Values enter level 0; a full
+    level is sorted and every other value, chosen with a random offset, moves
+    up a level with twice the weight. Sketches merge by concatenating levels.
+    """
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.levels = [[]]
+        self.n = 0
+        self.min = None
+        self.max = None
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * CAPACITY_RATIO ** depth))
+
+    def size(self):
+        return sum(len(items) for items in self.levels)
+
+    def max_size(self):
+        return sum(self.capacity(level) for level in range(len(self.levels)))
+
+    def update(self, value):
+        self.levels[0].append(value)
+        self.n += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        for bound, pick in (('min', min), ('max', max)):
+            values = [v for v in (getattr(self, bound), getattr(other, bound)) if v is not None]
+            setattr(self, bound, pick(values) if values else None)
+        self._compress()
+        return self
+
+    def _compress(self):
+        while self.size() >= self.max_size():
+            for level, items in enumerate(self.levels):
+                if len(items) >= self.capacity(level):
+                    if level + 1 == len(self.levels):
+                        self.levels.append([])
+                    items.sort()
+                    # An odd value out stays at this level
+                    keep = [items.pop()] if len(items) % 2 else []
+                    self.levels[level + 1].extend(items[random.randint(0, 1)::2])
+                    self.levels[level] = keep
+                    break
+
+    def weighted(self):
+        """(value, weight) pairs in value order."""
+        return sorted((value, 2 ** level) for level, items in enumerate(self.levels) for value in items)
+
+    def quantile(self, q):
+        if not self.n:
+            return None
+        items = self.weighted()
+        total = sum(weight for _, weight in items)
+        cumulative = 0
+        for value, weight in items:
+            cumulative += weight
+            if cumulative >= q * total:
+                return value
+        return items[-1][0]
+
+    def rank(self, value):
+        """Estimated share of values below `value`."""
+        items = self.weighted()
+        total = sum(weight for _, weight in items)
+        return sum(weight for v, weight in items if v < value) / total if total else 0.0
+
+    def histogram(self, edges=HISTOGRAM_BINS):
+        """Estimated counts between consecutive edges; the last bin includes its upper edge."""
+        items = self.weighted()
+        total = sum(weight for _, weight in items) or 1
+        counts = []
+        for i, (low, high) in enumerate(zip(edges, edges[1:])):
+            last = i == len(edges) - 2
+            weight = sum(w for v, w in items if low <= v < high or (last and v == high))
+            counts.append(round(weight * self.n / total))
+        return counts
+
+    def summary(self):
+        return {
+            'count': self.n,
+            'min': self.min,
+            'q1': self.quantile(0.25),
+            'median': self.quantile(0.5),
+            'q3': self.quantile(0.75),
+            'max': self.max,
+        }
+
+    def to_dict(self):
+        # Firestore has no nested arrays, so levels are a map
+        return {
+            'k': self.k, 'n': self.n, 'min': self.min, 'max': self.max,
+            'levels': {str(level): items for level, items in enumerate(self.levels) if items},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get('k', DEFAULT_K))
+        levels = data.get('levels', {})
+        height = max((int(level) for level in levels), default=0) + 1
+        sketch.levels = [list(levels.get(str(level), [])) for level in range(height)]
+        sketch.n, sketch.min, sketch.max = data.get('n', 0), data.get('min'), data.get('max')
+        return sketch
+
+
+def week_id(day):
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def weeks_between(start, end):
+    """Week ids of every ISO week touching the range, oldest first."""
+    weeks, day = [], week_start(start)
+    while day <= end:
+        weeks.append(week_id(day))
+        day += timedelta(days=7)
+    return weeks
+
+
+def shard_count(org_code):
+    return INDIVIDUAL_SHARDS if (org_code or INDIVIDUAL_ORG) == INDIVIDUAL_ORG else SKETCH_SHARDS
+
+
+def sketch_ref(org_code, week, shard):
+    return get_db().collection(SKETCH_COLLECTION).document(f"{org_code or INDIVIDUAL_ORG}_{week}_{shard}")
+
+
+def sketch_refs(org_code, week):
+    """Every shard of the organization's sketch for the week."""
+    return [sketch_ref(org_code, week, shard) for shard in range(shard_count(org_code))]
+
+
+def record_score(org_code, score, submitted_at=None):
+    """
+    Add one score to a random shard of its organization's sketch for the week,
+    in a transaction. A contended shard is retried on another one; if every
+    attempt fails the loss is counted and the last error raised.
+    """
+    from google.cloud import firestore
+
+    day = (submitted_at or datetime.now(timezone.utc)).date()
+    week = week_id(day)
+
+    @firestore.transactional
+    def update(transaction, ref):
+        snapshot = ref.get(transaction=transaction)
+        sketch = KLLSketch.from_dict(snapshot.to_dict()) if snapshot.exists else KLLSketch()
+        sketch.update(score)
+        transaction.set(ref, {
+            **sketch.to_dict(),
+            'org_code': org_code or INDIVIDUAL_ORG,
+            'week': week,
+            'week_start': datetime.combine(week_start(day), datetime.min.time(), timezone.utc),
+        })
+
+    db = get_db()
+    shards = random.sample(range(shard_count(org_code)), min(RECORD_ATTEMPTS, shard_count(org_code)))
+    for attempt, shard in enumerate(shards, start=1):
+        try:
+            update(db.transaction(max_attempts=2), sketch_ref(org_code, week, shard))
+            return
+        except Exception:
+            if attempt == len(shards):
+                record_loss(org_code, week)
+                raise
+            logger.warning("Score sketch shard %s of %s %s contended, trying another",
+                           shard, org_code or INDIVIDUAL_ORG, week)
+
+
+def record_loss(org_code, week):
+    """Count a score that never reached its sketch, so gaps in a distribution are visible."""
+    from google.cloud import firestore
+
+    logger.error("Score lost from the %s sketch for %s", org_code or INDIVIDUAL_ORG, week)
+    try:
+        # A blind increment, so it doesn't contend like the sketch transactions
+        get_db().collection(LOSS_COLLECTION).document(f"{org_code or INDIVIDUAL_ORG}_{week}").set(
+            {'org_code': org_code or INDIVIDUAL_ORG, 'week': week, 'lost': firestore.Increment(1)}, merge=True
+        )
+    except Exception:
+        logger.exception("Could not count the lost score")
+
+
+def merge_sketches(documents):
+    merged = KLLSketch()
+    for data in documents:
+        merged.merge(KLLSketch.from_dict(data))
+    return merged
+
+
+@profiled("firestore: load_score_sketch")
+@cached('org_dashboard')
+def load_score_sketch(org_codes, start, end):
+    """
+    The merged sketch for `org_codes` (None for every organization) over the
+    ISO weeks from `start` to `end`.
+    """
+    db = get_db()
+    if org_codes is None:
+        first = datetime.combine(week_start(start), datetime.min.time(), timezone.utc)
+        last = datetime.combine(week_start(end), datetime.min.time(), timezone.utc)
+        docs = db.collection(SKETCH_COLLECTION).where('week_start', '>=', first).where('week_start', '<=', last).stream()
+    else:
+        # One batched read of the exact documents
+        docs = db.get_all([ref for org in org_codes for week in weeks_between(start, end) for ref in sketch_refs(org, week)])
+    return merge_sketches(doc.to_dict() for doc in docs if doc.exists)
+
+
+@st.fragment
+def score_distribution_panel(org_codes, key, weeks=DEFAULT_WEEKS):
+    """Median, quartiles and a histogram of scores for whole ISO weeks in a chosen range."""
+    import pandas as pd
+
+    st.subheader("Score Distribution")
+    today = datetime.now(timezone.utc).date()
+    col1, col2 = st.columns(2)
+    start = col1.date_input("From week of", today - timedelta(weeks=weeks - 1), key=f"{key}_start")
+    end = col2.date_input("To week of", today, key=f"{key}_end")
+    if start > end:
+        st.warning("The start date must be before the end date.")
+        return
+
+    sketch = load_score_sketch(tuple(org_codes) if org_codes is not None else None, start, end)
+    if not sketch.n:
+        st.info("No scores in these weeks.")
+        return
+
+    summary = sketch.summary()
+    cols = st.columns(5)
+    for col, (label, field) in zip(cols, [("Scores", 'count'), ("Q1", 'q1'), ("Median", 'median'),
+                                          ("Q3", 'q3'), ("Range", None)]):
+        col.metric(label, f"{summary['min']}–{summary['max']}" if field is None else summary[field])
+
+    labels = [f"{low}–{high}" for low, high in zip(HISTOGRAM_BINS, HISTOGRAM_BINS[1:])]
+    st.bar_chart(pd.DataFrame({'Students': sketch.histogram()}, index=labels))
+    st.caption(f"ISO weeks {week_id(start)} to {week_id(end)}. Quantiles are estimates within about 2%.")
+
+
+def backfill():
+    """
+    Rebuild every sketch from the submissions collection. Replaces existing
+    sketches: each week's sketch goes into shard 0 and its other shards are deleted.
+    """
+    db = get_db()
+    orgs = {user.id: user.to_dict().get('org_code') for user in db.collection('users').select(['org_code']).stream()}
+    sketches = {}
+    for doc in db.collection('submissions').select(['user_id', 'submitAt', 'score']).stream():
+        submission = doc.to_dict()
+        if submission.get('score') is None or not submission.get('submitAt'):
+            continue
+        day = submission['submitAt'].date()
+        org_code = orgs.get(submission.get('user_id')) or INDIVIDUAL_ORG
+        sketch = sketches.setdefault((org_code, week_id(day), week_start(day)), KLLSketch())
+        sketch.update(submission['score'])
+
+    batch, pending = db.batch(), 0
+    for (org_code, week, start), sketch in sketches.items():
+        first, *others = sketch_refs(org_code, week)
+        batch.set(first, {
+            **sketch.to_dict(), 'org_code': org_code, 'week': week,
+            'week_start': datetime.combine(start, datetime.min.time(), timezone.utc),
+        })
+        for ref in others:
+            batch.delete(ref)
+        pending += 1 + len(others)
+        if pending >= 400:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+    return len(sketches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score distribution sketches.")
+    parser.add_argument("--backfill", action="store_true", help="Rebuild all sketches from submissions")
+    args = parser.parse_args()
+    if args.backfill:
+        print(f"{backfill()} sketches written")
+
+
+if __name__ == "__main__":
+    main()
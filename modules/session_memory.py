@@ -0,0 +1,198 @@
+import streamlit as st
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from modules.run_supervisor import session_is_active
+from modules.shared_cache import SharedCache, SQLiteBackend
+
+# Per-session memory accounting, and reclamation of what idle sessions hold.
+# Shared objects (the OpenAI client, Firestore client, backends, caches) are
+# cache_resource singletons and never belong in session state; what remains
+# per session is the student's own data. Each rerun measures it, and a
+# background sweeper handles sessions that have been idle for a while:
+#
+#   - spilled fields are written to a local SQLite file and removed from the
+#     session; the next rerun of that session puts them back
+#   - widget-bound keys (the essay text area's `txt`) are never touched: the
+#     sweeper runs on its own thread, and Streamlit updates widget state from
+#     the session's script thread
+#   - evicted fields are dropped, because they are rebuilt on demand
+#     (last_grading is read back from Firestore by load_previous_grading)
+#
+# Sessions whose browser tab is gone are forgotten. In secrets:
+#
+#   [session_memory]
+#   idle_seconds = 600
+#   spill_path = "/var/cache/hinotama_sessions.db"
+
+SPILL_FIELDS = ['feedback', 'vocabvan_history', 'vocabvan_conversation']
+EVICT_FIELDS = ['last_grading']
+# Smaller fields aren't worth a round trip to disk
+SPILL_MIN_BYTES = 2048
+DEFAULT_IDLE_SECONDS = 600
+SWEEP_INTERVAL = 60.0
+SPILL_NAMESPACE = 'session_spill'
+SPILL_TTL = 24 * 3600
+
+logger = logging.getLogger(__name__)
+
+
+def deep_size(obj, seen=None):
+    """Approximate bytes held by `obj` and everything it contains."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+class SessionRecord:
+    def __init__(self, session_id, state):
+        self.session_id = session_id
+        self.state = state
+        self.last_seen = time.monotonic()
+        self.sizes = {}
+        self.spilled = set()
+
+
+class SessionMemory:
+    def __init__(self, spill_store, idle_seconds=DEFAULT_IDLE_SECONDS, sweep_interval=SWEEP_INTERVAL,
+                 is_active=session_is_active):
+        self.spill_store = spill_store
+        self.idle_seconds = idle_seconds
+        self.is_active = is_active
+        self.metrics = Counter()
+        self._sessions = {}
+        self._lock = threading.Lock()
+        if sweep_interval:
+            threading.Thread(target=self._sweep_forever, args=(sweep_interval,), daemon=True).start()
+
+    def touch(self, session_id, state, values=None):
+        """
+        Mark the session as active, restoring anything spilled while it was
+        idle, and account for `values` (its session state as a dict).
+        """
+        with self._lock:
+            record = self._sessions.get(session_id)
+            if record is None:
+                record = self._sessions[session_id] = SessionRecord(session_id, state)
+            record.state = state
+            record.last_seen = time.monotonic()
+            spilled, record.spilled = record.spilled, set()
+
+        for field in spilled:
+            found, value = self.spill_store.get(SPILL_NAMESPACE, (session_id, field))
+            if found and field not in state:
+                state[field] = value
+                self.metrics['restored'] += 1
+            elif not found:
+                self.metrics['lost'] += 1
+            self.spill_store.delete(SPILL_NAMESPACE, (session_id, field))
+
+        if values is not None:
+            sizes = {key: deep_size(value) for key, value in values.items()}
+            with self._lock:
+                record.sizes = sizes
+
+    def reclaim(self, record):
+        """
+        Spill and evict the large fields of one idle session; returns the bytes
+        released. Called with the lock held, so a rerun that starts meanwhile
+        waits in touch() and then restores everything spilled here.
+        """
+        released = 0
+        for field in SPILL_FIELDS + EVICT_FIELDS:
+            size = record.sizes.get(field, 0)
+            if size < SPILL_MIN_BYTES or field not in record.state:
+                continue
+            value = record.state[field]
+            if field in SPILL_FIELDS:
+                self.spill_store.set(SPILL_NAMESPACE, (record.session_id, field), value)
+                record.spilled.add(field)
+                self.metrics['spilled'] += 1
+            else:
+                self.metrics['evicted'] += 1
+            del record.state[field]
+            record.sizes[field] = 0
+            released += size
+        self.metrics['bytes_released'] += released
+        return released
+
+    def sweep(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            records = list(self._sessions.values())
+        for record in records:
+            if not self.is_active(record.session_id):
+                with self._lock:
+                    self._sessions.pop(record.session_id, None)
+                for field in record.spilled:
+                    self.spill_store.delete(SPILL_NAMESPACE, (record.session_id, field))
+                self.metrics['closed'] += 1
+            elif now - record.last_seen > self.idle_seconds:
+                with self._lock:
+                    # Skip sessions that came back while we were getting here
+                    if now - record.last_seen <= self.idle_seconds:
+                        continue
+                    self.reclaim(record)
+
+    def _sweep_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Session memory sweep failed")
+
+    def report(self, top=20):
+        """Memory held per session, largest first, with totals."""
+        now = time.monotonic()
+        with self._lock:
+            sessions = [
+                {
+                    'session': record.session_id[:8],
+                    'bytes': sum(record.sizes.values()),
+                    'idle_seconds': round(now - record.last_seen),
+                    'largest': max(record.sizes, key=record.sizes.get) if record.sizes else None,
+                    'spilled': sorted(record.spilled),
+                }
+                for record in self._sessions.values()
+            ]
+        sessions.sort(key=lambda s: s['bytes'], reverse=True)
+        total = sum(s['bytes'] for s in sessions)
+        return {
+            'sessions': len(sessions),
+            'total_bytes': total,
+            'mean_bytes': total // len(sessions) if sessions else 0,
+            'metrics': dict(self.metrics),
+            'largest_sessions': sessions[:top],
+        }
+
+
+@st.cache_resource
+def get_session_memory():
+    config = st.secrets.get('session_memory', {})
+    path = config.get('spill_path', os.path.join(tempfile.gettempdir(), 'hinotama_sessions.db'))
+    store = SharedCache(SQLiteBackend(path), ttls={SPILL_NAMESPACE: SPILL_TTL})
+    return SessionMemory(store, idle_seconds=float(config.get('idle_seconds', DEFAULT_IDLE_SECONDS)))
+
+
+def track_session():
+    """Call before reading session state, at the top of a page and of each fragment."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return
+    get_session_memory().touch(ctx.session_id, ctx.session_state, st.session_state.to_dict())
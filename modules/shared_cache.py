@@ -0,0 +1,226 @@
+import streamlit as st
+import functools
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+# Cache for expensive results (dashboard aggregates, feedback, transcriptions)
+# that can be shared by every replica of the app. The backend is chosen in
+# secrets:
+#
+#   [shared_cache]
+#   backend = "sqlite"              # "memory" (default), "sqlite" or "redis"
+#   path = "/var/cache/hinotama.db" # sqlite
+#   url = "redis://cache:6379/0"    # redis
+#   max_entries = 10000             # memory/sqlite; Redis evicts by its own maxmemory policy
+#
+#   [shared_cache.ttl]              # seconds per namespace
+#   dashboard = 600
+#
+# Values are pickled, so every backend hands out independent copies.
+
+DEFAULT_NAMESPACE_TTLS = {
+    'dashboard': 600,
+    'org_dashboard': 60,
+    'feedback': 7 * 24 * 3600,
+    'transcription': 7 * 24 * 3600,
+    'archive': 7 * 24 * 3600,
+}
+DEFAULT_TTL = 3600
+DEFAULT_MAX_ENTRIES = 10000
+KEY_PREFIX = "hinotama"
+
+
+class MemoryBackend:
+    """In-process LRU. Not shared between replicas; the default for a single one."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteBackend:
+    """A cache file that replicas on the same host (or a shared volume) can all use."""
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value BLOB, expires_at REAL, accessed_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            self._writes += 1
+            # Evict every so often rather than on every write
+            if self._writes % 100 == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            " SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+
+class RedisBackend:
+    """Any server speaking the Redis protocol (Redis, Valkey, KeyDB, fakeredis in tests)."""
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+class SharedCache:
+    """Namespaced cache with per-namespace TTLs and hit-rate counters."""
+
+    def __init__(self, backend, ttls=None):
+        self.backend = backend
+        self.ttls = {**DEFAULT_NAMESPACE_TTLS, **(ttls or {})}
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    @staticmethod
+    def make_key(namespace, parts):
+        digest = hashlib.sha256(pickle.dumps(parts)).hexdigest()
+        return f"{KEY_PREFIX}:{namespace}:{digest}"
+
+    def get(self, namespace, parts):
+        """Returns (found, value)."""
+        raw = self.backend.get(self.make_key(namespace, parts))
+        if raw is None:
+            self.misses[namespace] += 1
+            return False, None
+        self.hits[namespace] += 1
+        return True, pickle.loads(raw)
+
+    def set(self, namespace, parts, value):
+        ttl = self.ttls.get(namespace, DEFAULT_TTL)
+        self.backend.set(self.make_key(namespace, parts), pickle.dumps(value), ttl)
+
+    def delete(self, namespace, parts):
+        self.backend.delete(self.make_key(namespace, parts))
+
+    def get_or_compute(self, namespace, parts, compute):
+        found, value = self.get(namespace, parts)
+        if not found:
+            value = compute()
+            self.set(namespace, parts, value)
+        return value
+
+    def stats(self):
+        """Hits, misses and hit rate per namespace seen by this process."""
+        namespaces = sorted(set(self.hits) | set(self.misses))
+        return {
+            ns: {
+                'hits': self.hits[ns],
+                'misses': self.misses[ns],
+                'hit_rate': self.hits[ns] / (self.hits[ns] + self.misses[ns]),
+            }
+            for ns in namespaces
+        }
+
+
+def build_shared_cache(config):
+    backend_name = config.get('backend', 'memory')
+    max_entries = int(config.get('max_entries', DEFAULT_MAX_ENTRIES))
+    if backend_name == 'sqlite':
+        backend = SQLiteBackend(config.get('path', 'hinotama_cache.db'), max_entries)
+    elif backend_name == 'redis':
+        backend = RedisBackend.from_url(config['url'])
+    elif backend_name == 'memory':
+        backend = MemoryBackend(max_entries)
+    else:
+        raise ValueError(f"Unknown shared_cache backend '{backend_name}'")
+    ttls = {ns: int(seconds) for ns, seconds in dict(config.get('ttl', {})).items()}
+    return SharedCache(backend, ttls)
+
+
+@st.cache_resource
+def get_shared_cache():
+    return build_shared_cache(dict(st.secrets.get('shared_cache', {})))
+
+
+def cached(namespace):
+    """Decorator: cache a function's result in the shared cache, keyed by its arguments."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parts = (func.__module__, func.__qualname__, args, sorted(kwargs.items()))
+            return get_shared_cache().get_or_compute(namespace, parts, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
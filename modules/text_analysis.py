@@ -0,0 +1,206 @@
+import streamlit as st
+import os
+import re
+import statistics
+from collections import Counter
+
+# Local, instant analysis of a Japanese essay. Everything here is plain string
+# processing over the text, so it runs in milliseconds on every rerun and is
+# shown while the model's feedback is still on its way.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JLPT_VOCAB_PATH = os.path.join(REPO_ROOT, "data", "jlpt_vocab.tsv")
+JLPT_LEVELS = ["N5", "N4", "N3", "N2", "N1"]
+
+LONG_SENTENCE_CHARS = 60
+REPEATED_PHRASE_MIN_CHARS = 4
+REPEATED_PHRASE_MAX_CHARS = 12
+
+KANJI = re.compile(r'[㐀-䶿一-鿿々〆]')
+HIRAGANA = re.compile(r'[ぁ-ゟ]')
+KATAKANA = re.compile(r'[゠-ヿーｦ-ﾟ]')
+LATIN = re.compile(r'[A-Za-z0-9Ａ-Ｚａ-ｚ０-９]')
+SENTENCE = re.compile(r'[^。！？!?\n]+[。！？!?」』）)]*')
+PHRASE_BREAK = re.compile(r'[\s、。，．・「」『』（）()！？!?,.]')
+
+POLITE_ENDING = re.compile(r'(です|ます|でした|ました|ません|ませんでした|でしょう|ましょう|ください)[かねよ]*[。！？!?」』）)]*$')
+PLAIN_ENDING = re.compile(r'(だ|である|だった|であった|ではない|じゃない|だろう|[うくぐすつぬぶむるたいなよ])[。！？!?」』）)]*$')
+
+
+class VocabularyTable:
+    """
+    JLPT level lookup over the sample list in data/jlpt_vocab.tsv. Words are
+    kept in one dict of word -> level index; inflecting words are stored by
+    stem and only match when followed by kana.
+    """
+
+    def __init__(self, path):
+        self.words = {}
+        self.stems = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                level, words = line.rstrip("\n").split("\t")
+                index = JLPT_LEVELS.index(level)
+                for word in words.split():
+                    if HIRAGANA.match(word[-1]) and (KANJI.search(word) or KATAKANA.search(word)):
+                        self.stems.setdefault(word[:-1], index)
+                    else:
+                        self.words.setdefault(word, index)
+        self.max_len = max(len(w) for w in [*self.words, *self.stems])
+
+    def levels_in(self, text):
+        """Greedy longest-match scan; returns (level index, length) of each word found."""
+        found = []
+        i = 0
+        while i < len(text):
+            for length in range(min(self.max_len, len(text) - i), 0, -1):
+                candidate = text[i:i + length]
+                if candidate in self.words:
+                    found.append((self.words[candidate], length))
+                    break
+                if candidate in self.stems and i + length < len(text) and HIRAGANA.match(text[i + length]):
+                    found.append((self.stems[candidate], length))
+                    break
+            else:
+                i += 1
+                continue
+            i += length
+        return found
+
+
+@st.cache_resource
+def get_vocabulary_table():
+    return VocabularyTable(JLPT_VOCAB_PATH)
+
+
+def script_mix(text):
+    counts = {
+        'kanji': len(KANJI.findall(text)),
+        'hiragana': len(HIRAGANA.findall(text)),
+        'katakana': len(KATAKANA.findall(text)),
+        'latin': len(LATIN.findall(text)),
+    }
+    total = sum(counts.values()) or 1
+    return {script: round(count / total, 3) for script, count in counts.items()}
+
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE.findall(text) if s.strip()]
+
+
+def sentence_stats(sentences):
+    lengths = [len(s) for s in sentences]
+    if not lengths:
+        return {'count': 0, 'mean': 0, 'median': 0, 'max': 0, 'long': 0}
+    return {
+        'count': len(lengths),
+        'mean': round(statistics.mean(lengths), 1),
+        'median': statistics.median(lengths),
+        'max': max(lengths),
+        'long': sum(1 for n in lengths if n > LONG_SENTENCE_CHARS),
+    }
+
+
+def style_consistency(sentences):
+    """Counts of です/ます vs だ/である sentence endings and the share of the dominant style."""
+    polite = plain = 0
+    for sentence in sentences:
+        if POLITE_ENDING.search(sentence):
+            polite += 1
+        elif PLAIN_ENDING.search(sentence):
+            plain += 1
+    classified = polite + plain
+    return {
+        'polite': polite,
+        'plain': plain,
+        'dominant': 'です・ます' if polite >= plain else 'だ・である',
+        'consistency': round(max(polite, plain) / classified, 3) if classified else 1.0,
+    }
+
+
+def repeated_phrases(text, limit=5):
+    """Phrases of 4+ characters used at least twice, longest first, without overlapping repeats."""
+    counts = Counter()
+    for chunk in PHRASE_BREAK.split(text):
+        for n in range(REPEATED_PHRASE_MIN_CHARS, min(REPEATED_PHRASE_MAX_CHARS, len(chunk)) + 1):
+            for i in range(len(chunk) - n + 1):
+                counts[chunk[i:i + n]] += 1
+
+    phrases = []
+    for phrase, count in sorted(counts.items(), key=lambda item: (-len(item[0]), -item[1])):
+        # Skip pure-hiragana runs (mostly grammar) and pieces of a longer repeated phrase
+        if count < 2 or not HIRAGANA.sub('', phrase):
+            continue
+        if any(phrase in longer and count <= longer_count for longer, longer_count in phrases):
+            continue
+        phrases.append((phrase, count))
+    phrases.sort(key=lambda item: (-item[1], -len(item[0])))
+    return [{'phrase': phrase, 'count': count} for phrase, count in phrases[:limit]]
+
+
+def vocabulary_levels(text):
+    """
+    Levels of the essay's words found in the sample JLPT list. The list holds a
+    few hundred common words, so most of an essay's vocabulary is not in it and
+    this is no estimate of the writer's level; `coverage` is the share of the
+    essay's Japanese characters that fall inside listed words.
+    """
+    found = get_vocabulary_table().levels_in(text)
+    counts = Counter(level for level, _ in found)
+    distribution = {level: counts.get(i, 0) for i, level in enumerate(JLPT_LEVELS)}
+    japanese = len(KANJI.findall(text)) + len(HIRAGANA.findall(text)) + len(KATAKANA.findall(text))
+    coverage = sum(length for _, length in found) / japanese if japanese else 0.0
+    return {'distribution': distribution, 'recognized': len(found), 'coverage': coverage}
+
+
+def analyze_text(text):
+    """All local statistics for an essay, as a small JSON-friendly dict."""
+    sentences = split_sentences(text)
+    return {
+        'characters': len(text),
+        'script_mix': script_mix(text),
+        'sentences': sentence_stats(sentences),
+        'style': style_consistency(sentences),
+        'repeated_phrases': repeated_phrases(text),
+        'vocabulary': vocabulary_levels(text),
+    }
+
+
+def display_analysis(analysis):
+    """Show the analysis under the essay input."""
+    mix = analysis['script_mix']
+    sentences = analysis['sentences']
+    style = analysis['style']
+    vocabulary = analysis['vocabulary']
+
+    with st.expander("📊 クイック分析（AI採点の前に）", expanded=False):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("漢字", f"{mix['kanji']:.0%}")
+        col2.metric("ひらがな", f"{mix['hiragana']:.0%}")
+        col3.metric("カタカナ", f"{mix['katakana']:.0%}")
+        col4.metric("語彙リスト一致", f"{vocabulary['coverage']:.0%}",
+                    help="本文のうち、JLPTサンプル語彙リスト（約400語）に含まれる語の文字の割合です。語彙レベルの推定ではありません。")
+
+        st.write(
+            f"**文の数:** {sentences['count']}　**平均の長さ:** {sentences['mean']} 文字　"
+            f"**最長:** {sentences['max']} 文字"
+        )
+        if sentences['long']:
+            st.warning(f"{LONG_SENTENCE_CHARS}文字を超える長い文が{sentences['long']}文あります。")
+
+        if style['polite'] and style['plain']:
+            st.warning(
+                f"文体が混在しています（です・ます: {style['polite']}文、だ・である: {style['plain']}文）。"
+                f"{style['dominant']}に統一しましょう。"
+            )
+        else:
+            st.write(f"**文体:** {style['dominant']}（一貫しています）")
+
+        if analysis['repeated_phrases']:
+            repeated = "、".join(f"「{p['phrase']}」×{p['count']}" for p in analysis['repeated_phrases'])
+            st.write(f"**繰り返し表現:** {repeated}")
+
+        distribution = "　".join(f"{level}: {count}" for level, count in vocabulary['distribution'].items())
+        st.write(f"**JLPTサンプル語彙リストと一致した語:** {distribution}")
@@ -1,15 +1,19 @@
 import streamlit as st
-from modules.modules import run_assistant
+from modules.llm_backends import get_backend
+from modules.profiler import span
+from modules.run_supervisor import current_owner, RunError
 
-def vocabvan_interface():
-    assistant = st.secrets.vocabvan_JP
-
-    user_input = st.chat_input("質問を入力してください。言いたいことや状況を含めて、自然な日本語表現を提案します。")
+# The model only sees this many recent messages of the conversation on each reply
+VOCABVAN_CONTEXT_MESSAGES = 20
+# How many messages of the conversation are kept in session state for display
+VOCABVAN_HISTORY_LIMIT = 40
 
-    temporary = st.empty()
-    t = temporary.container()
+def reset_conversation():
+    st.session_state.vocabvan_conversation = None
+    st.session_state.vocabvan_history = []
 
-    with t:
+def show_examples():
+    with st.container():
         st.write("の作文練習をサポートするために、正確で自然な日本語表現を提案します。")
         m1 = st.chat_message("user")
         a1 = st.chat_message("assistant")
@@ -36,15 +40,40 @@ def vocabvan_interface():
 2. "昨日は快晴で、とても過ごしやすい一日でした。" – 少し詳しく状況を説明した表現。
 3. "昨日の天気は素晴らしく、気持ちの良い日でした。" – 感情を強調した表現。""")
 
+def vocabvan_interface():
+    backend = get_backend("vocabvan_JP", max_context_messages=VOCABVAN_CONTEXT_MESSAGES)
+
+    user_input = st.chat_input("質問を入力してください。言いたいことや状況を含めて、自然な日本語表現を提案します。")
+
+    # Initialized here rather than at import, since this module is imported once per process
+    history = st.session_state.setdefault('vocabvan_history', [])
+    if history:
+        st.button("新しい会話を始める", on_click=reset_conversation)
+        for message in history:
+            with st.chat_message(message["role"]):
+                st.write(message["content"])
+    elif not user_input:
+        show_examples()
+
     if user_input:
-        # Clear client, assistant, and thread from session state to ensure a new thread is created
-        if 'client' in st.session_state:
-            del st.session_state.client
-        if 'assistant' in st.session_state:
-            del st.session_state.assistant
-        if 'thread' in st.session_state:
-            del st.session_state.thread
-        temporary.empty()
-        run_assistant(assistant_id=assistant, txt=user_input)
-
-    return user_input
\ No newline at end of file
+        with st.chat_message("user"):
+            st.write(user_input)
+
+        # One conversation per session, so follow-up questions keep their context
+        if st.session_state.get('vocabvan_conversation') is None:
+            st.session_state.vocabvan_conversation = backend.start_conversation(current_owner('vocabvan'))
+
+        with st.chat_message("assistant"), st.spinner('One moment...'), span("openai: vocabvan"):
+            try:
+                reply = st.write_stream(backend.stream_reply(st.session_state.vocabvan_conversation, user_input))
+            except RunError as e:
+                st.error(f"回答を取得できませんでした。もう一度お試しください。({e})")
+                return user_input
+
+        history.extend([
+            {"role": "user", "content": user_input},
+            {"role": "assistant", "content": reply},
+        ])
+        del history[:-VOCABVAN_HISTORY_LIMIT]
+
+    return user_input
@@ -1,14 +1,13 @@
 import streamlit as st
 import pytz
-from firebase_setup import db
+from modules.profile_cache import get_user_doc, update_user_doc
 from modules.menu import menu
 
 if 'user' not in st.session_state:
     st.session_state.user = None
 
 def update_user_settings(user_id, timezone):
-    user_ref = db.collection('users').document(user_id)
-    user_ref.update({
+    update_user_doc(user_id, {
         'timezone': timezone
     })
     st.session_state.user['timezone'] = timezone
@@ -24,7 +23,7 @@ def settings_page():
         return
 
     user_id = st.session_state.user['id']
-    user_data = db.collection('users').document(user_id).get().to_dict()
+    user_data = get_user_doc(user_id)  # Served from the profile cache on reruns
 
     with st.form("settings_form"):
         st.subheader("タイムゾーン")
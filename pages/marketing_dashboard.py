@@ -1,46 +1,21 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from firebase_setup import db
+from modules.shared_cache import get_shared_cache
+from modules.profiler import profile_rerun
+from modules.run_supervisor import get_run_supervisor
+from modules.session_memory import get_session_memory
+from modules.firestore_fanout import FanOutError
+from modules.score_sketch import score_distribution_panel, INDIVIDUAL_ORG
+from modules.prefetch import get_prefetcher
+from modules.archive import hydrate_submission
+from modules.marketing_data import (
+    query_firestore, query_filtered_firestore, north_star_range, default_north_star_dates
+)
 from datetime import datetime, timedelta
 import pytz
-from google.cloud.firestore import Query
 
 # Streamlit page config
 st.set_page_config(page_title="Hinotama Marketing Dashboard", layout="wide")
 
-# Cache Firestore queries
-@st.cache_data(ttl=600)
-def query_firestore(limit=1000):
-    users_ref = db.collection('users')
-    submissions_ref = db.collection('submissions')
-    login_events_ref = db.collection('login_events')
-
-    users = list(users_ref.limit(limit).stream())
-    submissions = list(submissions_ref.limit(limit).stream())
-    login_events = list(login_events_ref.limit(limit).stream())
-
-    # Convert document snapshots to a combination of dict and id for ease of use
-    users_data = [{"id": user.id, **user.to_dict()} for user in users]
-    submissions_data = [doc.to_dict() for doc in submissions]
-    login_events_data = [doc.to_dict() for doc in login_events]
-
-    return users_data, submissions_data, login_events_data
-
-@st.cache_data(ttl=600)
-def query_filtered_firestore(start_date, end_date, limit=1000):
-    submissions_ref = db.collection('submissions')
-    login_events_ref = db.collection('login_events')
-
-    submissions = list(submissions_ref.where('submitAt', '>=', start_date).where('submitAt', '<=', end_date).limit(limit).stream())
-    login_events = list(login_events_ref.where('timestamp', '>=', start_date).where('timestamp', '<=', end_date).limit(limit).stream())
-
-    # Convert document snapshots to dict for ease of use
-    submissions_data = [doc.to_dict() for doc in submissions]
-    login_events_data = [doc.to_dict() for doc in login_events]
-
-    return submissions_data, login_events_data
-
 # Helper functions
 def get_active_user_count(users):
     return sum(1 for user in users if user.get('status') == 'Active')
@@ -113,9 +88,19 @@ def calculate_score_improvement(submissions):
 def main():
     st.title("Hinotama Marketing Dashboard")
 
+    # Heavy analytics libraries are imported only once the title has been sent
+    import pandas as pd
+    import plotly.express as px
+
     # Load data for Signpost Metrics (without date filters)
-    with st.spinner("Loading data for Signpost Metrics..."):
-        users, submissions, login_events = query_firestore()
+    # Joins the load started at login, if it is still running
+    try:
+        with st.spinner("Loading data for Signpost Metrics..."):
+            users, submissions, login_events = get_prefetcher().submit(('marketing', 'all'), query_firestore).result()
+    except FanOutError as e:
+        for collection, error in e.errors.items():
+            st.error(f"Error fetching {collection}: {str(error)}")
+        return
 
     # Tabs for different sections of the dashboard
     tab1, tab2, tab3 = st.tabs(["サインポスト指標 (Signpost Metrics)", "ノーススターメトリック (North Star Metrics)", "個々のユーザー詳細 (Individual User Details)"])
@@ -135,21 +120,28 @@ def main():
         col3.metric("1日内の複数回提出率 (Daily Multiple Submission Rate)", f"{daily_multiple_submission_rate:.2f}%")
         col4.metric("継続利用率 (Retention Rate)", f"{retention_rate:.2f}%")
 
+        # Merged from the weekly per-organization sketches, not from `submissions`
+        org_codes = sorted({user['org_code'] for user in users if user.get('org_code')} | {INDIVIDUAL_ORG})
+        selected_orgs = st.multiselect("組織 (Organizations) - 空欄で全て", org_codes, key="score_orgs")
+        score_distribution_panel(selected_orgs or None, key="marketing_scores")
+
     # -- ノーススターメトリック (North Star Metrics) --
     with tab2:
         st.header("ノーススターメトリック (North Star Metrics)")
 
         # Date range selector for North Star Metrics
         col1, col2 = st.columns(2)
-        start_date = col1.date_input("Start Date", datetime.now(pytz.utc) - timedelta(days=30))
-        end_date = col2.date_input("End Date", datetime.now(pytz.utc))
+        default_start, default_end = default_north_star_dates()
+        start_date = col1.date_input("Start Date", default_start)
+        end_date = col2.date_input("End Date", default_end)
 
         if start_date <= end_date:
-            start_datetime = datetime.combine(start_date, datetime.min.time()).replace(tzinfo=pytz.utc)
-            end_datetime = datetime.combine(end_date, datetime.max.time()).replace(tzinfo=pytz.utc)
+            date_range = north_star_range(start_date, end_date)
 
             with st.spinner("Loading data for North Star Metrics..."):
-                filtered_submissions, filtered_login_events = query_filtered_firestore(start_datetime, end_datetime)
+                filtered_submissions, filtered_login_events = get_prefetcher().submit(
+                    ('marketing', date_range), query_filtered_firestore, *date_range
+                ).result()
 
             average_submissions_per_user = calculate_average_submissions(filtered_submissions, active_user_count)
             score_improvement = calculate_score_improvement(filtered_submissions)
@@ -189,7 +181,19 @@ def main():
                 if not submission_df.empty:
                     submission_df['submitAt'] = pd.to_datetime(submission_df['submitAt'])
                     submission_df = submission_df.sort_values('submitAt', ascending=False)
-                    st.dataframe(submission_df[['submitAt', 'score', 'submission_text']])
+                    st.dataframe(submission_df[['submitAt', 'score']])
+
+                    # Bodies of old submissions are archived; they are loaded only when opened
+                    opened = st.selectbox(
+                        "提出を開く (Open Submission)",
+                        options=submission_df.index,
+                        format_func=lambda i: f"{submission_df.at[i, 'submitAt']:%Y-%m-%d %H:%M} (score {submission_df.at[i, 'score']})",
+                        index=None
+                    )
+                    if opened is not None:
+                        submission = hydrate_submission(user_submissions[opened])
+                        st.text_area("作文 (Essay)", submission.get('submission_text', ''), height=200, disabled=True)
+                        st.markdown(submission.get('feedback_text') or '')
                 else:
                     st.write("このユーザーの提出履歴はありません。")
 
@@ -204,5 +208,15 @@ def main():
                 else:
                     st.write("このユーザーのログイン履歴はありません。")
 
+    with st.expander("キャッシュ統計 (Cache Stats)"):
+        st.json(get_shared_cache().stats())
+
+    with st.expander("アシスタント実行統計 (Assistant Run Stats)"):
+        st.json(get_run_supervisor().stats())
+
+    with st.expander("セッションメモリ (Memory per Session)"):
+        st.json(get_session_memory().report())
+
 if __name__ == "__main__":
-    main()
+    with profile_rerun("marketing_dashboard.main"):
+        main()